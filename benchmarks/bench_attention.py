@@ -0,0 +1,95 @@
+"""
+Micro-benchmark of Attention on CPU
+    - scaled_dot_product_attention vs the eager matmul / masked softmax formulation, for
+      MHA, GQA and MQA head layouts
+    - KV cache size and decode tokens/s at a long context per layout
+    - Timing only: tests/test_attention.py checks the SDPA path against the eager formulation
+"""
+
+import argparse
+import math
+import time
+
+import torch
+
+from src.arch.attention import Attention
+from src.arch.kv_cache import LayerKVCache
+from src.utils.logger import Logger
+
+
+def eager_attention(attention: Attention, x: torch.Tensor, cache=None, start_position=0):
+    """Attention.forward with a materialized mask, softmax and repeated key / value heads."""
+    batch_size, sequence_length, hidden_dim = x.shape
+    qkv = attention.qkv(x).view(batch_size, sequence_length, -1, attention.head_dim)
+    q, k, v = qkv.transpose(1, 2).split(
+        [attention.num_heads, attention.num_kv_heads, attention.num_kv_heads], dim=1
+    )
+    q, k = attention.rope(q, k, start_position=start_position)
+    if cache is not None:
+        k, v = cache.update(k, v, start_position)
+
+    group = attention.num_heads // attention.num_kv_heads
+    k = k.repeat_interleave(group, dim=1)
+    v = v.repeat_interleave(group, dim=1)
+    scores = q @ k.transpose(-2, -1) / math.sqrt(attention.head_dim)
+    key_length = k.shape[-2]
+    mask = torch.ones(sequence_length, key_length, dtype=torch.bool).triu(
+        key_length - sequence_length + 1
+    )
+    weights = torch.softmax(scores.masked_fill(mask, float("-inf")), dim=-1)
+    output = (weights @ v).transpose(1, 2).reshape(batch_size, sequence_length, hidden_dim)
+    return attention.out(output)
+
+
+def make_cache(attention: Attention, max_length: int) -> LayerKVCache:
+    return LayerKVCache(1, attention.num_kv_heads, attention.head_dim, max_length)
+
+
+def best_ms(func, repeat: int) -> float:
+    func()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+@torch.no_grad()
+def run(hidden_dim: int, num_heads: int, context: int, decode_steps: int, repeat: int) -> None:
+    logger = Logger(path="bench_attention")
+
+    head_dim = hidden_dim // num_heads
+    for num_kv_heads in (num_heads, num_heads // 4, 1):
+        layout = {num_heads: "MHA", 1: "MQA"}.get(num_kv_heads, "GQA")
+        attention = Attention(hidden_dim, num_heads, num_kv_heads, max_sequence_length=context)
+        x = torch.randn(1, context, hidden_dim)
+
+        sdpa = best_ms(lambda: attention(x), repeat)
+        eager = best_ms(lambda: eager_attention(attention, x), repeat)
+
+        cache = make_cache(attention, context)
+        attention(x[:, : context - decode_steps], cache, 0)
+        start = time.perf_counter()
+        for position in range(context - decode_steps, context):
+            attention(x[:, position : position + 1], cache, position)
+        decode = decode_steps / (time.perf_counter() - start)
+
+        logger.log(
+            f"{layout} heads={num_heads} kv_heads={num_kv_heads} T={context}: "
+            f"prefill sdpa {sdpa:7.1f} ms, eager {eager:7.1f} ms | decode {decode:7.1f} tok/s | "
+            f"KV cache {cache.nbytes() / 1024**2:5.1f} MB/layer "
+            f"({2 * num_kv_heads * head_dim * 4} B/token)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1].strip())
+    parser.add_argument("--hidden-dim", type=int, default=1024)
+    parser.add_argument("--num-heads", type=int, default=16)
+    parser.add_argument("--context", type=int, default=4096)
+    parser.add_argument("--decode-steps", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    run(args.hidden_dim, args.num_heads, args.context, args.decode_steps, args.repeat)
@@ -0,0 +1,76 @@
+"""
+Micro-benchmark of checkpoint saving and loading on CPU
+    - torch.save / torch.load of a model state dict vs the sharded .safetensors files of
+      src.training.checkpoint: save, open (lazy), load into a model (copy) and assign the
+      mapped tensors (zero copy)
+    - AsyncCheckpointWriter: time training is blocked (CPU snapshot) vs total write time
+    - Files are read from the page cache (just written), so this times the formats, not the disk
+    - Timing only: tests/test_checkpoint.py checks what is loaded back
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import torch
+
+from src.arch.model import Transformer
+from src.training.checkpoint import AsyncCheckpointWriter, CheckpointReader, load_model
+from src.utils.logger import Logger
+
+
+def timed(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def create_model(hidden_dim: int, num_layers: int) -> Transformer:
+    return Transformer(
+        vocab_size=32000,
+        hidden_dim=hidden_dim,
+        num_layers=num_layers,
+        num_heads=hidden_dim // 64,
+        num_kv_heads=max(1, hidden_dim // 256),
+        ffn_dim=hidden_dim * 8 // 3,
+    )
+
+
+def run(hidden_dim: int, num_layers: int, shard_mb: int) -> None:
+    logger = Logger(path="bench_checkpoint")
+    torch.manual_seed(0)
+    state = create_model(hidden_dim, num_layers).state_dict()
+    size_mb = sum(t.numel() * t.element_size() for t in state.values()) / 1024**2
+    target = create_model(hidden_dim, num_layers)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pt_path = os.path.join(tmp_dir, "model.pt")
+        directory = os.path.join(tmp_dir, "step")
+        results = {
+            "torch.save": timed(lambda: torch.save(state, pt_path)),
+            "torch.load": timed(lambda: target.load_state_dict(torch.load(pt_path))),
+        }
+
+        writer = AsyncCheckpointWriter(background=True, max_shard_bytes=shard_mb * 1024**2)
+        writer_blocked = timed(lambda: writer.save(directory, {"model": state}, {}))
+        results["async save"] = writer_blocked + timed(writer.wait)
+        results["async save (blocking)"] = writer_blocked
+        results["open (lazy)"] = timed(lambda: CheckpointReader(directory).keys())
+        results["load (copy)"] = timed(lambda: load_model(target, directory))
+        results["load (assign)"] = timed(lambda: load_model(target, directory, assign=True))
+
+    logger.log(
+        f"{size_mb:.0f} MB state dict, {shard_mb} MB shards | "
+        + ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in results.items())
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1].strip())
+    parser.add_argument("--hidden-dim", type=int, default=1024)
+    parser.add_argument("--num-layers", type=int, default=8)
+    parser.add_argument("--shard-mb", type=int, default=256)
+    args = parser.parse_args()
+
+    run(args.hidden_dim, args.num_layers, args.shard_mb)
@@ -0,0 +1,68 @@
+"""
+Micro-benchmark of process_data.clean_text
+    - Compares the previous three-pass re.sub implementation with the TextCleaner engine
+    - Synthetic corpus: mostly plain articles, some with HTML tags and [[...]] markup
+    - Timing only: tests/test_text_cleaner.py checks the output against the re.sub chain
+"""
+
+import argparse
+import random
+import re
+import time
+
+from src.data.process_data import clean_text
+from src.utils.logger import Logger
+
+
+def clean_text_regex(text: str) -> str:
+    """clean_text as it used to be: three uncompiled re.sub passes."""
+    text = re.sub(r"<[^>]+>", "", text)
+    text = re.sub(r"\[\[.*?\]\]", "", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+def make_corpus(num_articles: int, markup_fraction: float, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(5000)] + ["café", "naïve", "Straße", "東京"]
+    markup = ["<ref>cite</ref>", "<br />", "[[Category:Foo]]", "[[File:x.png|thumb]]"]
+    separators = [" "] * 20 + ["  ", "\n", "\t", "\xa0"]
+
+    corpus = []
+    for _ in range(num_articles):
+        with_markup = rng.random() < markup_fraction
+        tokens = []
+        for _ in range(rng.randint(100, 2000)):
+            tokens.append(rng.choice(markup) if with_markup and rng.random() < 0.02 else rng.choice(words))
+            tokens.append(rng.choice(separators))
+        corpus.append("".join(tokens))
+    return corpus
+
+
+def run(num_articles: int, markup_fraction: float, repeat: int) -> None:
+    logger = Logger(path="bench_clean_text")
+    corpus = make_corpus(num_articles, markup_fraction)
+    megabytes = sum(len(text.encode("utf-8")) for text in corpus) / (1024 * 1024)
+
+    results = {}
+    for name, func in [("regex_3_pass", clean_text_regex), ("text_cleaner", clean_text)]:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for text in corpus:
+                func(text)
+            best = min(best, time.perf_counter() - start)
+        results[name] = best
+        logger.log(f"{name}: {megabytes / best:.1f} MB/s ({num_articles / best:.0f} articles/sec)")
+
+    logger.log(f"Speedup: {results['regex_3_pass'] / results['text_cleaner']:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1].strip())
+    parser.add_argument("--articles", type=int, default=5000)
+    parser.add_argument("--markup-fraction", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    run(args.articles, args.markup_fraction, args.repeat)
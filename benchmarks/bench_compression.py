@@ -0,0 +1,67 @@
+"""
+Benchmark of shard compression codecs
+    - Writes the same synthetic articles with every codec through open_text
+    - Reports write and read throughput (uncompressed MB/s) and compression ratio
+    - Checks every codec reads back exactly the articles that were written
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from src.data.process_data import ARTICLE_DELIMITER, iter_articles
+from src.utils.compression import CODECS, open_text, with_codec
+from src.utils.logger import Logger
+
+
+def make_articles(num_articles: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(20000)]
+    return [
+        " ".join(rng.choices(words, k=rng.randint(50, 800))) for _ in range(num_articles)
+    ]
+
+
+def run(num_articles: int) -> None:
+    logger = Logger(path="bench_compression")
+    articles = make_articles(num_articles)
+    text_bytes = len(ARTICLE_DELIMITER.join(articles).encode("utf-8"))
+    text_mb = text_bytes / (1024 * 1024)
+    logger.log(f"{num_articles} articles, {text_mb:.1f} MB of text")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec in [None, *CODECS]:
+            path = with_codec(os.path.join(tmp, "shard_0000.txt"), codec)
+
+            start = time.perf_counter()
+            with open_text(path, "w") as f:
+                for i, article in enumerate(articles):
+                    if i:
+                        f.write(ARTICLE_DELIMITER)
+                    f.write(article)
+            write_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            read_back = list(iter_articles(path))
+            read_seconds = time.perf_counter() - start
+
+            if read_back != articles:
+                raise AssertionError(f"{codec or 'none'} did not round-trip")
+
+            disk_bytes = os.path.getsize(path)
+            logger.log(
+                f"{codec or 'none':>5}: write {text_mb / write_seconds:7.1f} MB/s, "
+                f"read {text_mb / read_seconds:7.1f} MB/s, "
+                f"{disk_bytes / (1024 * 1024):6.1f} MB on disk "
+                f"(ratio {text_bytes / disk_bytes:.2f}x)"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1].strip())
+    parser.add_argument("--articles", type=int, default=20000)
+    args = parser.parse_args()
+
+    run(args.articles)
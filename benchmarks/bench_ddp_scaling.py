@@ -0,0 +1,158 @@
+"""
+Data-parallel scaling benchmark on CPU
+    - Trains a small Transformer on synthetic token shards with 1, 2, 4, 8... gloo processes
+      on this machine, each with an equal share of the cores
+    - Records global tokens/s and scaling efficiency (tokens/s of N ranks / N x 1 rank) as JSON
+    - Ranks get their own shards (rank_shards), the same split a torchrun launch uses
+"""
+
+import argparse
+import json
+import os
+import socket
+import tempfile
+import time
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from src.arch.model import Transformer
+from src.config.config import TrainingConfig
+from src.tokenization.token_shards import TokenShardWriter
+from src.training.train import Trainer, create_data, init_distributed
+from src.utils import logger as logging_module
+from src.utils.logger import Logger
+
+VOCAB_SIZE = 2048
+
+
+def write_shards(directory: str, num_shards: int, tokens_per_shard: int) -> list:
+    rng = np.random.default_rng(0)
+    paths = []
+    for index in range(num_shards):
+        writer = TokenShardWriter(index, VOCAB_SIZE, directory)
+        tokens = rng.integers(0, VOCAB_SIZE, tokens_per_shard, dtype=np.uint16)
+        writer.append(tokens, [tokens_per_shard])
+        writer.close()
+        paths.append(writer.bin_path)
+    return paths
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def worker(rank: int, world_size: int, port: int, args, shard_paths: list, results) -> None:
+    os.environ.update(
+        RANK=str(rank),
+        WORLD_SIZE=str(world_size),
+        LOCAL_WORLD_SIZE=str(world_size),
+        MASTER_ADDR="127.0.0.1",
+        MASTER_PORT=str(port),
+    )
+    logging_module.configure(level="WARNING")
+    TrainingConfig.num_workers = 0
+    init_distributed()
+
+    torch.manual_seed(0)
+    dataset, sampler = create_data(args.sequence_length, rank, world_size, shard_paths)
+    model = Transformer(
+        vocab_size=VOCAB_SIZE,
+        hidden_dim=args.hidden_dim,
+        num_layers=args.num_layers,
+        num_heads=args.hidden_dim // 64,
+        num_kv_heads=max(1, args.hidden_dim // 256),
+        ffn_dim=args.hidden_dim * 8 // 3,
+        max_sequence_length=args.sequence_length,
+    )
+    trainer = Trainer(
+        model,
+        dataset,
+        sampler=sampler,
+        micro_batch_size=args.micro_batch_size,
+        gradient_accumulation_steps=args.gradient_accumulation_steps,
+        autocast_dtype="bfloat16",
+        activation_checkpointing=False,
+    )
+
+    batches = trainer.batches()
+    steps = []
+    for _ in range(args.steps + 1):  # the first step warms up
+        micro_batches = [next(batches) for _ in range(args.gradient_accumulation_steps)]
+        start = time.perf_counter()
+        trainer.optimizer_step(micro_batches)
+        steps.append(time.perf_counter() - start)
+
+    if world_size > 1:
+        # A step is as slow as its slowest rank
+        slowest = torch.tensor(steps[1:])
+        torch.distributed.all_reduce(slowest, op=torch.distributed.ReduceOp.MAX)
+        steps[1:] = slowest.tolist()
+        torch.distributed.destroy_process_group()
+    if rank == 0:
+        tokens = (
+            args.micro_batch_size
+            * args.gradient_accumulation_steps
+            * args.sequence_length
+            * world_size
+        )
+        results.put(tokens / float(np.median(steps[1:])))
+
+
+def run(args) -> None:
+    logger = Logger(path="bench_ddp_scaling")
+    cores = os.cpu_count()
+    with tempfile.TemporaryDirectory() as tmp:
+        shard_paths = write_shards(
+            tmp, max(args.processes), args.sequence_length * args.micro_batch_size * 64
+        )
+
+        report = {"cores": cores, "config": vars(args), "runs": {}}
+        context = mp.get_context("spawn")
+        for world_size in args.processes:
+            results = context.SimpleQueue()
+            mp.spawn(
+                worker,
+                args=(world_size, free_port(), args, shard_paths, results),
+                nprocs=world_size,
+                join=True,
+            )
+            tokens_per_second = results.get()
+            baseline = report["runs"].get(1, {}).get("tokens_per_second", tokens_per_second)
+            efficiency = tokens_per_second / (world_size * baseline)
+            report["runs"][world_size] = {
+                "tokens_per_second": tokens_per_second,
+                "speedup": tokens_per_second / baseline,
+                "efficiency": efficiency,
+            }
+            logger.log(
+                f"{world_size} process(es): {tokens_per_second:,.0f} tokens/s, "
+                f"speedup {tokens_per_second / baseline:.2f}x, efficiency {efficiency:.0%}"
+            )
+
+    if cores is not None and max(args.processes) > cores:
+        logger.log(
+            f"Only {cores} core(s): runs with more processes than cores can't scale",
+            level="WARNING",
+        )
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logger.log(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1].strip())
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--sequence-length", type=int, default=256)
+    parser.add_argument("--micro-batch-size", type=int, default=2)
+    parser.add_argument("--gradient-accumulation-steps", type=int, default=2)
+    parser.add_argument("--hidden-dim", type=int, default=256)
+    parser.add_argument("--num-layers", type=int, default=4)
+    parser.add_argument("--output", default="ddp_scaling.json")
+    args = parser.parse_args()
+
+    run(args)
@@ -0,0 +1,90 @@
+"""
+Micro-benchmark of incremental decoding on CPU
+    - Greedy generation from a random small model: full-prefix recompute at every step (no
+      cache) vs Generator with its preallocated KVCache, at several prompt lengths
+    - Second request sharing the prompt prefix: prefill time with and without the PrefixCache
+    - Checks that cached and uncached generation produce the same tokens first
+"""
+
+import argparse
+import sys
+import time
+
+import torch
+
+from src.arch.generation import Generator
+from src.arch.kv_cache import PrefixCache
+from src.arch.model import Transformer
+from src.utils.logger import Logger
+
+
+@torch.no_grad()
+def generate_without_cache(model: Transformer, prompt: list, max_new_tokens: int) -> list:
+    """Decoding as it would be without a cache: the whole sequence is re-run at every step."""
+    sequence = list(prompt)
+    for _ in range(max_new_tokens):
+        logits = model(torch.tensor([sequence]), last_token_only=True)
+        sequence.append(int(logits[0, -1].argmax()))
+    return sequence[len(prompt) :]
+
+
+def run(
+    prompt_lengths: list, new_tokens: int, hidden_dim: int, num_layers: int, num_kv_heads: int
+) -> int:
+    logger = Logger(path="bench_decode")
+    torch.manual_seed(0)
+    model = Transformer(
+        vocab_size=8000,
+        hidden_dim=hidden_dim,
+        num_layers=num_layers,
+        num_heads=hidden_dim // 64,
+        num_kv_heads=num_kv_heads,
+        ffn_dim=hidden_dim * 8 // 3,
+        max_sequence_length=max(prompt_lengths) + new_tokens,
+    ).eval()
+
+    for prompt_length in prompt_lengths:
+        prompt = torch.randint(0, 8000, (prompt_length,)).tolist()
+
+        start = time.perf_counter()
+        expected = generate_without_cache(model, prompt, new_tokens)
+        uncached = new_tokens / (time.perf_counter() - start)
+
+        generator = Generator(model, prefix_cache=PrefixCache())
+        tokens = generator.generate(prompt, max_new_tokens=new_tokens)
+        if tokens != expected:
+            logger.log(f"Cached generation differs at prompt length {prompt_length}", "ERROR")
+            return 1
+        cold_prefill = generator.stats["prefill_seconds"]
+
+        # Same document, new question: all but the last 16 prompt tokens are shared
+        follow_up = prompt[:-16] + torch.randint(0, 8000, (16,)).tolist()
+        cached = generator.stats["tokens_per_second"]
+        generator.generate(follow_up, max_new_tokens=new_tokens)
+        stats = generator.stats
+        logger.log(
+            f"prompt {prompt_length:>5}: no cache {uncached:7.1f} tok/s, KV cache {cached:7.1f} "
+            f"tok/s | prefill {cold_prefill * 1000:7.1f} ms, shared prefix "
+            f"{stats['prefill_seconds'] * 1000:6.1f} ms ({stats['reused_tokens']} tokens reused)"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1].strip())
+    parser.add_argument("--prompt-lengths", type=int, nargs="+", default=[128, 512, 2048])
+    parser.add_argument("--new-tokens", type=int, default=32)
+    parser.add_argument("--hidden-dim", type=int, default=256)
+    parser.add_argument("--num-layers", type=int, default=4)
+    parser.add_argument("--num-kv-heads", type=int, default=2)
+    args = parser.parse_args()
+
+    sys.exit(
+        run(
+            args.prompt_lengths,
+            args.new_tokens,
+            args.hidden_dim,
+            args.num_layers,
+            args.num_kv_heads,
+        )
+    )
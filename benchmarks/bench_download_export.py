@@ -0,0 +1,105 @@
+"""
+Offline benchmark of download_data.process_batched
+    - Builds a local datasets.Dataset shaped like wikimedia/wikipedia (id, url, title, text)
+    - Compares the old row-by-row export against the Arrow-sliced export with 1..N writers
+    - Checks every variant writes byte-identical chunk files
+"""
+
+import argparse
+import filecmp
+import os
+import random
+import tempfile
+import time
+
+from datasets import Dataset
+
+from src.config.config import DownloadConfig, Paths
+from src.data.download_data import process_batched
+from src.utils.logger import Logger
+
+
+def make_dataset(num_articles: int, seed: int = 0) -> Dataset:
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(5000)]
+    texts = []
+    for i in range(num_articles):
+        if i % 50 == 0:
+            texts.append("   ")  # empty articles are skipped by the export
+            continue
+        paragraphs = [
+            " ".join(rng.choices(words, k=rng.randint(20, 120)))
+            for _ in range(rng.randint(1, 8))
+        ]
+        texts.append("\n".join(paragraphs))
+
+    return Dataset.from_dict(
+        {
+            "id": [str(i) for i in range(num_articles)],
+            "url": [f"https://en.wikipedia.org/wiki?curid={i}" for i in range(num_articles)],
+            "title": [f"Article {i}" for i in range(num_articles)],
+            "text": texts,
+        }
+    )
+
+
+def export_row_by_row(dataset: Dataset, chunk_size: int) -> None:
+    """The export as it used to be: one dataset[idx] dict per article."""
+    num_chunks = (len(dataset) + chunk_size - 1) // chunk_size
+    for chunk_idx in range(num_chunks):
+        start_idx = chunk_idx * chunk_size
+        end_idx = min((chunk_idx + 1) * chunk_size, len(dataset))
+        output_file = os.path.join(Paths.RAW_DATA_DIR, f"wiki_chunk_{chunk_idx:04d}.txt")
+        with open(output_file, "w", encoding="utf-8") as f:
+            for idx in range(start_idx, end_idx):
+                text = dataset[idx].get("text", "")
+                if text.strip():
+                    f.write(text + "\n\n")
+
+
+def run(num_articles: int, chunk_size: int, max_writers: int) -> None:
+    logger = Logger(path="bench_download_export")
+    dataset = make_dataset(num_articles)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        variants = [("row_by_row", lambda: export_row_by_row(dataset, chunk_size))]
+        writers = 1
+        while writers <= max_writers:
+            variants.append(
+                (
+                    f"arrow_writers_{writers}",
+                    lambda w=writers: process_batched(dataset, Logger("quiet"), chunk_size, w),
+                )
+            )
+            writers *= 2
+
+        reference_dir = None
+        for name, export in variants:
+            Paths.RAW_DATA_DIR = os.path.join(tmp, name)
+            os.makedirs(Paths.RAW_DATA_DIR)
+
+            start = time.perf_counter()
+            export()
+            elapsed = time.perf_counter() - start
+
+            if reference_dir is None:
+                reference_dir = Paths.RAW_DATA_DIR
+            else:
+                files = sorted(os.listdir(reference_dir))
+                _, mismatch, errors = filecmp.cmpfiles(
+                    reference_dir, Paths.RAW_DATA_DIR, files, shallow=False
+                )
+                if mismatch or errors:
+                    raise AssertionError(f"{name} output differs: {mismatch + errors}")
+
+            logger.log(f"{name}: {num_articles / elapsed:.0f} articles/sec ({elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1].strip())
+    parser.add_argument("--articles", type=int, default=50000)
+    parser.add_argument("--chunk-size", type=int, default=DownloadConfig.chunk_size)
+    parser.add_argument("--max-writers", type=int, default=DownloadConfig.writers)
+    args = parser.parse_args()
+
+    run(args.articles, args.chunk_size, args.max_writers)
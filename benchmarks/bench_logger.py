@@ -0,0 +1,66 @@
+"""
+Micro-benchmark of Logger.log overhead
+    - Disabled calls (below the level threshold), eager f-string vs lazy arguments
+    - Enabled calls to a file sink, synchronous vs background thread
+    - The previous logger (strftime + print on every call) for reference
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from src.utils import logger as logging_module
+from src.utils.logger import Logger
+
+
+def old_log(path: str, message: str, file) -> None:
+    """Logger.log as it used to be: timestamp and a synchronous print per call."""
+    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} [INFO] [{path}] {message}", file=file)
+
+
+def per_call_ns(func, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def run(calls: int) -> None:
+    bench = Logger(path="bench_logger")
+    log = Logger(path="hot_loop")
+    results = {}
+
+    logging_module.configure(level="INFO", console=False)
+    results["disabled, f-string"] = per_call_ns(lambda i: log.log(f"item {i}", "DEBUG"), calls)
+    results["disabled, lazy args"] = per_call_ns(lambda i: log.log("item %d", "DEBUG", i), calls)
+    results["disabled, is_enabled guard"] = per_call_ns(
+        lambda i: log.is_enabled("DEBUG") and log.log(f"item {i}", "DEBUG"), calls
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.devnull, "w") as devnull:
+            results["old logger, print"] = per_call_ns(
+                lambda i: old_log("hot_loop", f"item {i}", devnull), calls
+            )
+
+        for background in (False, True):
+            logging_module.configure(
+                level="INFO", console=False, file=os.path.join(tmp, "bench.log"), background=background
+            )
+            name = f"enabled, file sink, {'background' if background else 'synchronous'}"
+            results[name] = per_call_ns(lambda i: log.log("item %d", "INFO", i), calls)
+            logging_module.flush()
+
+    logging_module.configure()
+    for name, ns in results.items():
+        bench.log(f"{name:>40}: {ns:8.0f} ns/call")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1].strip())
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    run(args.calls)
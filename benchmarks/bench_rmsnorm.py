@@ -0,0 +1,103 @@
+"""
+Micro-benchmark of RMSNorm on CPU
+    - Compares the original formula with the eager, custom autograd and torch.compile paths,
+      forward only and forward + backward, at fp32 and bf16
+    - Reports the activation memory autograd saves for backward per implementation
+    - Timing only: outputs and gradients are checked against the original formula by
+      tests/test_rmsnorm.py
+"""
+
+import argparse
+import time
+
+import torch
+
+from src.arch.layers import NORM_IMPLS, RMSNorm, rms_norm_, rms_norm_reference
+from src.utils.logger import Logger
+
+EPSILON = 1e-6
+
+
+class ReferenceRMSNorm(RMSNorm):
+    def forward(self, x):
+        return rms_norm_reference(x, self.weight, self.epsilon)
+
+
+def make_norms(hidden_dim: int) -> dict:
+    weight = torch.rand(hidden_dim) + 0.5
+    norms = {"reference": ReferenceRMSNorm(hidden_dim, EPSILON, impl="eager")}
+    for impl in NORM_IMPLS:
+        norms[impl] = RMSNorm(hidden_dim, EPSILON, impl=impl)
+    for norm in norms.values():
+        norm.weight.data.copy_(weight)
+    return norms
+
+
+def saved_bytes(norm: RMSNorm, x: torch.Tensor) -> int:
+    """Bytes of the tensors autograd keeps for backward, the input excluded."""
+    total = 0
+
+    def pack(tensor):
+        nonlocal total
+        if tensor.data_ptr() != x.data_ptr():
+            total += tensor.numel() * tensor.element_size()
+        return tensor
+
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+        norm(x)
+    return total
+
+
+def best_ms(func, repeat: int) -> float:
+    func()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run(batch_size: int, sequence_length: int, hidden_dims: list, repeat: int) -> None:
+    logger = Logger(path="bench_rmsnorm")
+    for hidden_dim in hidden_dims:
+        norms = make_norms(hidden_dim)
+        for dtype in (torch.float32, torch.bfloat16):
+            x = torch.randn(batch_size, sequence_length, hidden_dim, dtype=dtype)
+            grad_output = torch.randn_like(x)
+            for name, norm in norms.items():
+                norm.to(dtype if name == "reference" else torch.float32)
+
+                def forward():
+                    with torch.no_grad():
+                        norm(x)
+
+                def forward_backward():
+                    xi = x.detach().requires_grad_(True)
+                    norm(xi).backward(grad_output)
+
+                xi = x.detach().requires_grad_(True)
+                logger.log(
+                    f"d={hidden_dim:<5} {str(dtype)[6:]:<8} {name:<9} "
+                    f"fwd {best_ms(forward, repeat):7.2f} ms  "
+                    f"fwd+bwd {best_ms(forward_backward, repeat):7.2f} ms  "
+                    f"saved {saved_bytes(norm, xi) / 1024**2:6.1f} MB"
+                )
+
+        x = torch.randn(batch_size, sequence_length, hidden_dim)
+        weight = norms["eager"].weight.detach()
+        logger.log(
+            f"d={hidden_dim:<5} float32  in-place  "
+            f"fwd {best_ms(lambda: rms_norm_(x, weight, EPSILON), repeat):7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1].strip())
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--sequence-length", type=int, default=1024)
+    parser.add_argument("--hidden-dims", type=int, nargs="+", default=[256, 1024, 4096])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    run(args.batch_size, args.sequence_length, args.hidden_dims, args.repeat)
@@ -0,0 +1,376 @@
+"""
+Offline benchmark suite with regression tracking
+    - Hot paths of the data pipeline and the model on synthetic data: clean_text,
+      StreamingShardWriter.add_text, BPETokenizer encode / train, RMSNorm and RoPE
+    - Writes machine-readable JSON results and compares them with a stored baseline,
+      exiting with status 1 when a case is slower than --max-slowdown allows
+    - Timings only compare on the same machine: results carry a machine fingerprint and
+      the comparison warns when it differs from the baseline's
+    - Cases whose code can't run in this tree (ImportError, CaseUnavailable) are reported as
+      skipped; any other error in a case fails the run, and so does a baseline case that
+      produced no result
+
+    python -m benchmarks.suite                       # run, compare with benchmarks/baseline.json
+    python -m benchmarks.suite --save-baseline       # run and store the results as the baseline
+    python -m benchmarks.suite --filter rope --repeat 10
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.bench_clean_text import make_corpus
+from src.utils import logger as logging_module
+from src.utils.logger import Logger
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+RESULTS_VERSION = 1
+
+# setup(tmp_dir) -> (run, units processed per run)
+Setup = Callable[[str], Tuple[Callable[[], None], int]]
+CASES: List[Tuple[str, str, Setup]] = []
+
+
+class CaseUnavailable(Exception):
+    """Raised by a case setup when what it times can't run here (missing module, device...)."""
+
+
+def case(name: str, unit: str):
+    """Register a benchmark case; unit names what run() processes (articles, tokens...)."""
+
+    def register(setup: Setup) -> Setup:
+        CASES.append((name, unit, setup))
+        return setup
+
+    return register
+
+
+def synthetic_articles(num_articles: int, duplicate_fraction: float = 0.0) -> List[str]:
+    """Cleaned-looking articles, duplicate_fraction of them repeated."""
+    from src.data.process_data import clean_text
+
+    articles = [clean_text(text) for text in make_corpus(num_articles, markup_fraction=0.0)]
+    rng = random.Random(1)
+    for i in rng.sample(range(1, num_articles), int(num_articles * duplicate_fraction)):
+        articles[i] = articles[rng.randrange(i)]
+    return articles
+
+
+@case("clean_text", "articles")
+def clean_text_case(tmp_dir: str):
+    from src.data.process_data import clean_text
+
+    corpus = make_corpus(2000, markup_fraction=0.1)
+
+    def run() -> None:
+        for text in corpus:
+            clean_text(text)
+
+    return run, len(corpus)
+
+
+@case("shard_writer.add_text", "articles")
+def add_text_case(tmp_dir: str):
+    from src.data.process_data import StreamingShardWriter
+
+    articles = synthetic_articles(2000, duplicate_fraction=0.2)
+    runs = iter(range(1_000_000))
+
+    def run() -> None:
+        output_dir = os.path.join(tmp_dir, f"shards_{next(runs)}")
+        with StreamingShardWriter(shard_size=2 * 1024 * 1024, output_dir=output_dir) as writer:
+            for article in articles:
+                writer.add_text(article)
+
+    return run, len(articles)
+
+
+def train_tokenizer(tmp_dir: str, vocab_size: int = 4000):
+    from src.tokenization.tokenizing import BPETokenizer
+
+    corpus_path = os.path.join(tmp_dir, "tokenizer_corpus.txt")
+    if not os.path.exists(corpus_path):
+        with open(corpus_path, "w", encoding="utf-8") as f:
+            f.write("\n\n".join(synthetic_articles(1000)))
+
+    tokenizer = BPETokenizer()
+    tokenizer.train(files=[corpus_path], vocab_size=vocab_size)
+    return tokenizer
+
+
+@case("tokenizer.train", "runs")
+def tokenizer_train_case(tmp_dir: str):
+    train_tokenizer(tmp_dir)  # writes the corpus outside the timed runs
+    return lambda: train_tokenizer(tmp_dir), 1
+
+
+@case("tokenizer.encode_batch", "tokens")
+def tokenizer_encode_batch_case(tmp_dir: str):
+    tokenizer = train_tokenizer(tmp_dir)
+    tokenizer.tokenizer.no_truncation()
+    texts = synthetic_articles(1000)
+    tokens = sum(len(ids) for ids in tokenizer.encode_batch(texts))
+    return lambda: tokenizer.encode_batch(texts), tokens
+
+
+@case("tokenizer.encode", "tokens")
+def tokenizer_encode_case(tmp_dir: str):
+    tokenizer = train_tokenizer(tmp_dir)
+    tokenizer.tokenizer.no_truncation()
+    texts = synthetic_articles(200)
+    tokens = sum(len(tokenizer.encode(text)) for text in texts)
+
+    def run() -> None:
+        tokenizer.cache.clear()  # time the tokenizer, not the LRU cache
+        for text in texts:
+            tokenizer.encode(text)
+
+    return run, tokens
+
+
+BATCH_SIZE = 4
+SEQUENCE_LENGTHS = [128, 1024]
+ROPE_SEQUENCE_LENGTHS = [128, 1024, 4096]
+HIDDEN_DIMS = [256, 1024]
+HEAD_DIMS = [64, 128]
+NUM_HEADS = 8
+
+
+def register_rmsnorm_case(hidden_dim: int, sequence_length: int) -> None:
+    @case(f"rmsnorm.forward[d={hidden_dim},t={sequence_length}]", "tokens")
+    def rmsnorm_case(tmp_dir: str):
+        import torch
+
+        from src.arch.layers import RMSNorm
+
+        norm = RMSNorm(hidden_dim=hidden_dim)
+        x = torch.randn(BATCH_SIZE, sequence_length, hidden_dim)
+
+        def run() -> None:
+            with torch.no_grad():
+                norm(x)
+
+        run()
+        return run, BATCH_SIZE * sequence_length
+
+
+def register_rope_case(head_dim: int, sequence_length: int) -> None:
+    @case(f"rope.forward[d={head_dim},t={sequence_length}]", "tokens")
+    def rope_case(tmp_dir: str):
+        import torch
+
+        from src.arch.positionel_embedding import RoPE
+
+        rope = RoPE(hidden_dim=head_dim, max_sequence_length=max(ROPE_SEQUENCE_LENGTHS))
+        q = torch.randn(BATCH_SIZE, NUM_HEADS, sequence_length, head_dim)
+        k = torch.randn(BATCH_SIZE, NUM_HEADS, sequence_length, head_dim)
+
+        def run() -> None:
+            with torch.no_grad():
+                rope(q, k, sequence_length)
+
+        run()
+        return run, BATCH_SIZE * sequence_length
+
+
+for _dim in HIDDEN_DIMS:
+    for _length in SEQUENCE_LENGTHS:
+        register_rmsnorm_case(_dim, _length)
+for _dim in HEAD_DIMS:
+    for _length in ROPE_SEQUENCE_LENGTHS:
+        register_rope_case(_dim, _length)
+
+
+def machine_info() -> Dict[str, str]:
+    info = {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": str(os.cpu_count()),
+        "python": platform.python_version(),
+    }
+    try:
+        import torch
+
+        info["torch"] = torch.__version__
+        info["torch_threads"] = str(torch.get_num_threads())
+    except ImportError:
+        pass
+    return info
+
+
+def run_case(setup: Setup, tmp_dir: str, repeat: int) -> dict:
+    run, units = setup(tmp_dir)
+    run()  # warm up: caches, lazy imports, allocator
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    median = statistics.median(times)
+    return {
+        "median_s": median,
+        "min_s": min(times),
+        "repeat": repeat,
+        "units": units,
+        "throughput": units / median if median > 0 else float("inf"),
+    }
+
+
+def run_suite(repeat: int, name_filter: Optional[str]) -> dict:
+    results = {"version": RESULTS_VERSION, "machine": machine_info(), "time": time.time()}
+    cases = {}
+    skipped = {}
+    failed = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, unit, setup in CASES:
+            if name_filter and name_filter not in name:
+                continue
+            try:
+                result = run_case(setup, tmp_dir, repeat)
+            except (ImportError, CaseUnavailable) as e:
+                skipped[name] = f"{type(e).__name__}: {e}"
+                continue
+            except Exception as e:
+                failed[name] = f"{type(e).__name__}: {e}"
+                continue
+
+            result["unit"] = unit
+            cases[name] = result
+
+    results["cases"] = cases
+    results["skipped"] = skipped
+    results["failed"] = failed
+    return results
+
+
+def log_results(results: dict, logger: Logger) -> None:
+    for name, result in results["cases"].items():
+        logger.log(
+            f"{name}: {result['median_s'] * 1000:.2f} ms median, "
+            f"{result['throughput']:,.0f} {result['unit']}/s"
+        )
+    for name, reason in results["skipped"].items():
+        logger.log(f"{name}: skipped ({reason})", level="WARNING")
+    for name, reason in results["failed"].items():
+        logger.log(f"{name}: failed ({reason})", level="ERROR")
+
+
+def compare(
+    results: dict,
+    baseline: dict,
+    max_slowdown: float,
+    logger: Logger,
+    name_filter: Optional[str] = None,
+) -> List[str]:
+    """
+    Return the cases slower than baseline median * max_slowdown, and the baseline cases
+    (selected by name_filter) that no longer produce a result.
+    """
+    if baseline.get("machine") != results["machine"]:
+        logger.log(
+            "Baseline was recorded on a different machine or setup, timings may not compare",
+            level="WARNING",
+        )
+
+    regressions = []
+    for name, result in results["cases"].items():
+        reference = baseline.get("cases", {}).get(name)
+        if reference is None:
+            logger.log(f"{name}: no baseline")
+            continue
+
+        ratio = result["median_s"] / reference["median_s"]
+        change = (
+            f"{name}: {ratio:.2f}x baseline time "
+            f"({reference['median_s'] * 1000:.2f} ms -> {result['median_s'] * 1000:.2f} ms)"
+        )
+        if ratio > max_slowdown:
+            regressions.append(name)
+            logger.log(change + f" exceeds {max_slowdown:.2f}x", level="ERROR")
+        else:
+            logger.log(change, level="SUCCESS" if ratio < 1 else "INFO")
+
+    for name in baseline.get("cases", {}):
+        if name in results["cases"] or (name_filter and name_filter not in name):
+            continue
+        reason = results["skipped"].get(name) or results["failed"].get(name)
+        if reason is None and not any(name == n for n, _, _ in CASES):
+            reason = "no longer a case, re-save the baseline"
+        regressions.append(name)
+        logger.log(f"{name}: in baseline but has no result ({reason})", level="ERROR")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1].strip())
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--filter", default=None, help="only run cases whose name contains this")
+    parser.add_argument("--output", default="benchmark_results.json", help="results JSON path")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="store results as baseline")
+    parser.add_argument(
+        "--max-slowdown",
+        type=float,
+        default=1.25,
+        help="fail when a case takes more than this times its baseline median",
+    )
+    args = parser.parse_args()
+
+    # Stage logs would drown the results, keep errors only
+    logging_module.configure(level="ERROR")
+    results = run_suite(args.repeat, args.filter)
+    logging_module.configure()
+    logger = Logger(path="benchmarks.suite")
+    log_results(results, logger)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    logger.log(f"Wrote {len(results['cases'])} results to {args.output}")
+
+    if args.save_baseline:
+        baseline = {"cases": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        # Merge, so a filtered run only updates its own cases
+        baseline.update(
+            {k: v for k, v in results.items() if k not in ("cases", "skipped", "failed")}
+        )
+        names = {name for name, _, _ in CASES}
+        baseline["cases"] = {
+            name: result
+            for name, result in {**baseline.get("cases", {}), **results["cases"]}.items()
+            if name in names
+        }
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+        logger.log(f"Saved baseline to {args.baseline}", level="SUCCESS")
+        return 1 if results["failed"] else 0
+
+    if not os.path.exists(args.baseline):
+        logger.log(f"No baseline at {args.baseline}, run with --save-baseline", level="WARNING")
+        return 1 if results["failed"] else 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.max_slowdown, logger, args.filter)
+    if regressions:
+        logger.log(f"{len(regressions)} case(s) regressed: {', '.join(regressions)}", level="ERROR")
+    failures = sorted(set(results["failed"]) - set(regressions))
+    if failures:
+        logger.log(f"{len(failures)} case(s) failed: {', '.join(failures)}", level="ERROR")
+    return 1 if regressions or failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
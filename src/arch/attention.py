@@ -0,0 +1,93 @@
+"""
+Causal self-attention
+    - Grouped-query attention: num_heads query heads share num_kv_heads key / value heads
+      (num_kv_heads == num_heads is MHA, 1 is MQA), so the KV cache shrinks by the group size
+    - RoPE on queries and keys, with the model's context scaling (rope_scaling)
+    - torch.nn.functional.scaled_dot_product_attention (fused / flash kernels, enable_gqa so
+      key / value heads are never repeated in memory)
+    - No mask is built for plain causal attention or single-token decode steps; only a
+      multi-token chunk after cached positions (prefill after a reused prefix) needs one,
+      of chunk x context size
+    - With a LayerKVCache, only the new tokens are projected: their keys / values are appended
+      to the cache and attend to every cached position (incremental decoding)
+"""
+
+from typing import Optional
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from src.arch.kv_cache import LayerKVCache
+from src.arch.positionel_embedding import RoPE
+from src.config.config import ModelConfig
+
+
+class Attention(nn.Module):
+    """
+    Causal grouped-query self-attention.
+        - forward(x, cache, start_position): x holds the tokens at positions
+          start_position, start_position + 1, ... of the sequence
+    """
+
+    def __init__(
+        self,
+        hidden_dim: int = ModelConfig.hidden_dim,
+        num_heads: int = ModelConfig.num_heads,
+        num_kv_heads: int = ModelConfig.num_kv_heads,
+        max_sequence_length: int = ModelConfig.max_sequence_length,
+        base: float = ModelConfig.base,
+        rope_scaling: Optional[str] = ModelConfig.rope_scaling,
+        rope_scaling_factor: float = ModelConfig.rope_scaling_factor,
+    ):
+        super().__init__()
+        if hidden_dim % num_heads:
+            raise ValueError(f"hidden_dim {hidden_dim} is not divisible by {num_heads} heads")
+        if num_heads % num_kv_heads:
+            raise ValueError(f"{num_heads} heads can't be grouped over {num_kv_heads} KV heads")
+
+        self.num_heads = num_heads
+        self.num_kv_heads = num_kv_heads
+        self.head_dim = hidden_dim // num_heads
+        qkv_dim = (num_heads + 2 * num_kv_heads) * self.head_dim
+        self.qkv = nn.Linear(hidden_dim, qkv_dim, bias=False)
+        self.out = nn.Linear(hidden_dim, hidden_dim, bias=False)
+        self.rope = RoPE(
+            self.head_dim, max_sequence_length, base, rope_scaling, rope_scaling_factor
+        )
+
+    def forward(
+        self,
+        x: torch.Tensor,
+        cache: Optional[LayerKVCache] = None,
+        start_position: int = 0,
+    ) -> torch.Tensor:
+        batch_size, sequence_length, hidden_dim = x.shape
+        qkv = self.qkv(x).view(
+            batch_size, sequence_length, self.num_heads + 2 * self.num_kv_heads, self.head_dim
+        )
+        q, k, v = qkv.transpose(1, 2).split(
+            [self.num_heads, self.num_kv_heads, self.num_kv_heads], dim=1
+        )  # [batch, heads, sequence, head_dim]
+
+        q, k = self.rope(q, k, start_position=start_position)
+        if cache is not None:
+            k, v = cache.update(k, v, start_position)
+
+        key_length = k.shape[-2]
+        mask = None
+        if 1 < sequence_length < key_length:
+            # SDPA's is_causal aligns the top-left corner, queries here end at the last key
+            mask = torch.ones(
+                sequence_length, key_length, dtype=torch.bool, device=x.device
+            ).tril(key_length - sequence_length)
+
+        output = F.scaled_dot_product_attention(
+            q,
+            k,
+            v,
+            attn_mask=mask,
+            is_causal=mask is None and sequence_length > 1,
+            enable_gqa=self.num_kv_heads != self.num_heads,
+        )
+        return self.out(output.transpose(1, 2).reshape(batch_size, sequence_length, hidden_dim))
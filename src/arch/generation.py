@@ -0,0 +1,131 @@
+"""
+Incremental text generation
+    - The prompt is run once (prefill) into a KVCache, then each step feeds only the newly
+      sampled token at the next RoPE position: a step costs O(context), not O(context^2)
+    - The cache is allocated once per Generator and reused by every request
+    - With a PrefixCache, the part of a prompt shared with an earlier one is copied from the
+      stored keys / values instead of being recomputed
+"""
+
+import time
+from typing import List, Optional
+
+import torch
+
+from src.arch.kv_cache import PrefixCache
+from src.arch.model import Transformer
+from src.config.config import GenerationConfig
+from src.utils.logger import Logger
+
+
+def sample(
+    logits: torch.Tensor,
+    temperature: float = GenerationConfig.temperature,
+    top_k: Optional[int] = GenerationConfig.top_k,
+    generator: Optional[torch.Generator] = None,
+) -> torch.Tensor:
+    """Next token ids [batch] from logits [batch, vocab_size]; greedy if temperature is 0."""
+    if temperature <= 0:
+        return logits.argmax(dim=-1)
+
+    logits = logits.float() / temperature
+    if top_k is not None and top_k < logits.shape[-1]:
+        threshold = torch.topk(logits, top_k, dim=-1).values[:, -1:]
+        logits = logits.masked_fill(logits < threshold, float("-inf"))
+    probabilities = torch.softmax(logits, dim=-1)
+    return torch.multinomial(probabilities, 1, generator=generator).squeeze(-1)
+
+
+class Generator:
+    """
+    Generates continuations of single prompts with one preallocated KVCache.
+        - max_length bounds prompt + generated tokens (defaults to the model's context, scaled
+          by its RoPE scaling; a default-sized cache follows set_rope_scaling)
+        - stats of the last request: prefill / reused / generated tokens and their timings
+    """
+
+    def __init__(
+        self,
+        model: Transformer,
+        max_length: Optional[int] = None,
+        prefix_cache: Optional[PrefixCache] = None,
+    ):
+        self.logger = Logger(path="generation.Generator")
+        self.model = model
+        self.max_length = max_length
+        self.cache = model.new_cache(batch_size=1, max_length=max_length)
+        self.rope_scaling = model.rope_scaling
+        self.prefix_cache = prefix_cache
+        self.stats = {}
+
+    @torch.no_grad()
+    def generate(
+        self,
+        prompt: List[int],
+        max_new_tokens: int = GenerationConfig.max_new_tokens,
+        temperature: float = GenerationConfig.temperature,
+        top_k: Optional[int] = GenerationConfig.top_k,
+        eos_id: Optional[int] = None,
+        generator: Optional[torch.Generator] = None,
+    ) -> List[int]:
+        """Generated token ids (the prompt excluded)."""
+        if not prompt:
+            raise ValueError("Prompt must contain at least one token")
+        if self.model.rope_scaling != self.rope_scaling:
+            # Cached keys were rotated with the previous scaling
+            self.rope_scaling = self.model.rope_scaling
+            if self.max_length is None:
+                self.cache = self.model.new_cache(batch_size=1)
+            if self.prefix_cache is not None:
+                self.prefix_cache.clear()
+        if len(prompt) >= self.cache.max_length:
+            raise ValueError(
+                f"Prompt of {len(prompt)} tokens fills the {self.cache.max_length} position cache"
+            )
+
+        device = self.cache[0].keys.device
+        start = time.perf_counter()
+
+        # The last prompt token is always run: its logits give the first new token
+        self.cache.reset()
+        reused = 0
+        if self.prefix_cache is not None:
+            entry, reused = self.prefix_cache.lookup(prompt)
+            reused = min(reused, len(prompt) - 1)
+            if reused:
+                self.cache.copy_prefix(entry, reused)
+
+        input_ids = torch.tensor([prompt[reused:]], dtype=torch.long, device=device)
+        logits = self.model(input_ids, self.cache, last_token_only=True)
+        if self.prefix_cache is not None:
+            self.prefix_cache.store(self.cache.snapshot(prompt))
+        prefill_seconds = time.perf_counter() - start
+
+        tokens = []
+        start = time.perf_counter()
+        while len(tokens) < max_new_tokens:
+            token = sample(logits[:, -1], temperature, top_k, generator)
+            tokens.append(int(token))
+            if tokens[-1] == eos_id or self.cache.length >= self.cache.max_length:
+                break
+            logits = self.model(token.view(1, 1), self.cache, last_token_only=True)
+        decode_seconds = time.perf_counter() - start
+
+        self.stats = {
+            "prompt_tokens": len(prompt),
+            "reused_tokens": reused,
+            "prefill_seconds": prefill_seconds,
+            "generated_tokens": len(tokens),
+            "decode_seconds": decode_seconds,
+            "tokens_per_second": len(tokens) / decode_seconds if decode_seconds > 0 else 0.0,
+        }
+        self.logger.log(
+            "Prefilled %d tokens (%d reused) in %.3fs, generated %d tokens at %.1f tokens/s",
+            "DEBUG",
+            len(prompt) - reused,
+            reused,
+            prefill_seconds,
+            len(tokens),
+            self.stats["tokens_per_second"],
+        )
+        return tokens
@@ -0,0 +1,160 @@
+"""
+Key / value cache for incremental decoding
+    - LayerKVCache: one preallocated contiguous [batch, kv_heads, max_length, head_dim] buffer
+      per layer for keys and one for values; new tokens are copied in, attention reads a view
+    - KVCache: the caches of every layer plus the number of cached positions, which is the
+      RoPE start_position of the next tokens
+    - PrefixCache: cached keys / values of earlier prompts, so a request sharing a prompt prefix
+      with one of them only prefills the tokens after the shared part
+"""
+
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+import torch
+
+from src.config.config import GenerationConfig, ModelConfig
+
+
+class LayerKVCache:
+    """Keys and values of one attention layer."""
+
+    def __init__(
+        self,
+        batch_size: int,
+        num_heads: int,
+        head_dim: int,
+        max_length: int,
+        dtype: torch.dtype = torch.float32,
+        device: Optional[torch.device] = None,
+    ):
+        shape = (batch_size, num_heads, max_length, head_dim)
+        self.keys = torch.empty(shape, dtype=dtype, device=device)
+        self.values = torch.empty(shape, dtype=dtype, device=device)
+        self.max_length = max_length
+
+    def update(
+        self, keys: torch.Tensor, values: torch.Tensor, start_position: int
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Store keys / values of positions [start, start + n), return those of [0, start + n)."""
+        end = start_position + keys.shape[-2]
+        if end > self.max_length:
+            raise ValueError(f"KV cache full: position {end} exceeds {self.max_length}")
+
+        self.keys[:, :, start_position:end] = keys
+        self.values[:, :, start_position:end] = values
+        return self.keys[:, :, :end], self.values[:, :, :end]
+
+    def nbytes(self) -> int:
+        return 2 * self.keys.numel() * self.keys.element_size()
+
+
+class KVCache:
+    """
+    Caches of every layer of a model.
+        - length: positions cached so far, advanced by the model after each forward
+        - Sized for max_length positions up front, so decoding never reallocates
+    """
+
+    def __init__(
+        self,
+        num_layers: int = ModelConfig.num_layers,
+        num_heads: int = ModelConfig.num_kv_heads,
+        head_dim: int = ModelConfig.hidden_dim // ModelConfig.num_heads,
+        max_length: int = ModelConfig.max_sequence_length,
+        batch_size: int = 1,
+        dtype: torch.dtype = torch.float32,
+        device: Optional[torch.device] = None,
+    ):
+        self.layers = [
+            LayerKVCache(batch_size, num_heads, head_dim, max_length, dtype, device)
+            for _ in range(num_layers)
+        ]
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.length = 0
+
+    def __getitem__(self, layer: int) -> LayerKVCache:
+        return self.layers[layer]
+
+    def reset(self, length: int = 0) -> None:
+        """Forget every position from length on (buffers are kept)."""
+        self.length = length
+
+    def nbytes(self) -> int:
+        return sum(layer.nbytes() for layer in self.layers)
+
+    def copy_prefix(self, entry: "PrefixEntry", length: int) -> None:
+        """Load the first length positions of a prefix cache entry."""
+        for layer, (keys, values) in zip(self.layers, entry.layers):
+            layer.keys[:, :, :length] = keys[:, :, :length]
+            layer.values[:, :, :length] = values[:, :, :length]
+        self.length = length
+
+    def snapshot(self, tokens: Sequence[int]) -> "PrefixEntry":
+        """Copy of the cached positions, for the PrefixCache."""
+        layers = [
+            (layer.keys[:, :, : self.length].clone(), layer.values[:, :, : self.length].clone())
+            for layer in self.layers
+        ]
+        return PrefixEntry(tuple(tokens[: self.length]), layers)
+
+
+class PrefixEntry:
+    """Tokens of a prompt and the keys / values the model computed for them."""
+
+    def __init__(self, tokens: Tuple[int, ...], layers: List[Tuple[torch.Tensor, torch.Tensor]]):
+        self.tokens = tokens
+        self.layers = layers
+
+    def nbytes(self) -> int:
+        return sum(2 * keys.numel() * keys.element_size() for keys, _ in self.layers)
+
+
+def common_prefix_length(a: Sequence[int], b: Sequence[int]) -> int:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+class PrefixCache:
+    """
+    LRU of PrefixEntry for single-sequence requests.
+        - Keys / values of position p only depend on tokens [0, p], so any common prefix of a
+          stored prompt and a new one is reusable, not only whole stored prompts
+        - max_entries bounds memory: each entry holds a full copy of its prompt's cache
+    """
+
+    def __init__(self, max_entries: int = GenerationConfig.prefix_cache_entries):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple[int, ...], PrefixEntry]" = OrderedDict()
+        self.hits = 0
+        self.reused_tokens = 0
+
+    def lookup(self, tokens: Sequence[int]) -> Tuple[Optional[PrefixEntry], int]:
+        """Entry sharing the longest prefix with tokens, and the length of that prefix."""
+        best, best_length = None, 0
+        for entry in self.entries.values():
+            length = common_prefix_length(entry.tokens, tokens)
+            if length > best_length:
+                best, best_length = entry, length
+
+        if best is not None:
+            self.entries.move_to_end(best.tokens)
+            self.hits += 1
+            self.reused_tokens += best_length
+        return best, best_length
+
+    def store(self, entry: PrefixEntry) -> None:
+        if self.max_entries <= 0 or not entry.tokens:
+            return
+        self.entries[entry.tokens] = entry
+        self.entries.move_to_end(entry.tokens)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
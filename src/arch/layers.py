@@ -1,12 +1,88 @@
 """
 Layers module for the model architecture
     - Implementation of RMSNorm
+    - Statistics in fp32 with rsqrt, input and output keep their dtype (bf16 safe)
+    - Implementations (ModelConfig.norm_impl):
+        - eager: plain torch ops, autograd keeps the fp32 intermediates
+        - autograd: custom autograd function, saves only the input and the per-row 1/rms
+        - compile: eager formula fused by torch.compile, falls back to eager if it can't compile
+    - rms_norm_ normalizes in place, for inference on tensors the caller owns
+    - SwiGLU feed-forward
 """
 
-import torch  # FIX: torch is installed yet it still throws error
-from torch.nn import nn
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
 
 from src.config.config import ModelConfig
+from src.utils.logger import Logger
+
+NORM_IMPLS = ("eager", "autograd", "compile")
+
+
+def rms_norm_reference(x: torch.Tensor, weight: torch.Tensor, epsilon: float) -> torch.Tensor:
+    """The original formula, at the input dtype; kept to check the others against."""
+    return weight * x / torch.sqrt(torch.mean(x**2, dim=-1, keepdim=True) + epsilon)
+
+
+def _upcast(x: torch.Tensor) -> torch.Tensor:
+    """x in at least fp32 (fp64 stays fp64)."""
+    return x.to(torch.promote_types(x.dtype, torch.float32))
+
+
+def rms_norm(x: torch.Tensor, weight: torch.Tensor, epsilon: float) -> torch.Tensor:
+    x32 = _upcast(x)
+    inverse_rms = torch.rsqrt(x32.pow(2).mean(dim=-1, keepdim=True) + epsilon)
+    return (x32 * inverse_rms * weight.to(x32.dtype)).to(x.dtype)
+
+
+def rms_norm_(x: torch.Tensor, weight: torch.Tensor, epsilon: float) -> torch.Tensor:
+    """In-place rms_norm: overwrites and returns x. Not differentiable."""
+    inverse_rms = torch.rsqrt(_upcast(x).pow(2).mean(dim=-1, keepdim=True) + epsilon)
+    return x.mul_(inverse_rms.to(x.dtype)).mul_(weight.to(x.dtype))
+
+
+class RMSNormFunction(torch.autograd.Function):
+    """
+    rms_norm with a hand-written backward.
+        - Saves x (usually alive anyway, as the residual stream) and 1/rms of shape [..., 1]
+          instead of the full-size fp32 intermediates eager autograd keeps
+        - dx = r * (g*w - x * r^2 * mean(g*w*x)), dw = sum(g * x * r), in fp32
+    """
+
+    @staticmethod
+    def forward(ctx, x: torch.Tensor, weight: torch.Tensor, epsilon: float) -> torch.Tensor:
+        x32 = _upcast(x)
+        inverse_rms = torch.rsqrt(x32.pow(2).mean(dim=-1, keepdim=True) + epsilon)
+        ctx.save_for_backward(x, weight, inverse_rms)
+        return (x32 * inverse_rms * weight.to(x32.dtype)).to(x.dtype)
+
+    @staticmethod
+    def backward(ctx, grad_output: torch.Tensor):
+        x, weight, inverse_rms = ctx.saved_tensors
+        x32 = _upcast(x)
+        grad32 = grad_output.to(x32.dtype)
+
+        grad_x = grad_weight = None
+        if ctx.needs_input_grad[0]:
+            grad_normalized = grad32 * weight.to(x32.dtype)
+            projection = (grad_normalized * x32).mean(dim=-1, keepdim=True) * inverse_rms**2
+            grad_x = ((grad_normalized - x32 * projection) * inverse_rms).to(x.dtype)
+        if ctx.needs_input_grad[1]:
+            grad_weight = (grad32 * x32 * inverse_rms).reshape(-1, x.shape[-1]).sum(dim=0)
+            grad_weight = grad_weight.to(weight.dtype)
+        return grad_x, grad_weight, None
+
+
+_compiled_rms_norm = None
+
+
+def compiled_rms_norm():
+    """torch.compile(rms_norm), built once and shared by every RMSNorm."""
+    global _compiled_rms_norm
+    if _compiled_rms_norm is None:
+        _compiled_rms_norm = torch.compile(rms_norm, dynamic=True)
+    return _compiled_rms_norm
 
 
 class RMSNorm(nn.Module):
@@ -14,20 +90,54 @@ class RMSNorm(nn.Module):
     Root Mean Square Layer Normalization.
         - Implementation of RMSNorm
         - Initializes the weight parameter with ones
-        - Implements the forward pass for RMSNorm
+        - Implements the forward pass for RMSNorm, with the implementation chosen by impl
     """
 
-    def __init__(self, hidden_dim=ModelConfig.hidden_dim, epsilon=ModelConfig.epsilon):
+    def __init__(
+        self,
+        hidden_dim=ModelConfig.hidden_dim,
+        epsilon=ModelConfig.epsilon,
+        impl=ModelConfig.norm_impl,
+    ):
         super().__init__()
+        if impl not in NORM_IMPLS:
+            raise ValueError(f"Unknown RMSNorm impl {impl}, expected one of {NORM_IMPLS}")
+
         self.weight = nn.Parameter(torch.ones(hidden_dim))
         self.epsilon = epsilon
+        self.impl = impl
+        self.logger = Logger(path="layers.RMSNorm")
 
     def forward(self, x):
-        return (
-            self.weight
-            * x
-            / torch.sqrt(torch.mean(x**2, dim=-1, keepdim=True) + self.epsilon)
-        )
+        if self.impl == "autograd":
+            return RMSNormFunction.apply(x, self.weight, self.epsilon)
+
+        if self.impl == "compile":
+            try:
+                return compiled_rms_norm()(x, self.weight, self.epsilon)
+            except Exception as e:  # no C compiler, unsupported backend...
+                self.logger.log(f"torch.compile failed, using eager RMSNorm: {e}", level="WARNING")
+                self.impl = "eager"
+
+        return rms_norm(x, self.weight, self.epsilon)
+
+
+class FeedForward(nn.Module):
+    """
+    SwiGLU feed-forward: down(silu(gate(x)) * up(x)).
+        - gate and up are one matmul of twice the width
+    """
+
+    def __init__(
+        self, hidden_dim: int = ModelConfig.hidden_dim, ffn_dim: int = ModelConfig.ffn_dim
+    ):
+        super().__init__()
+        self.gate_up = nn.Linear(hidden_dim, 2 * ffn_dim, bias=False)
+        self.down = nn.Linear(ffn_dim, hidden_dim, bias=False)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        gate, up = self.gate_up(x).chunk(2, dim=-1)
+        return self.down(F.silu(gate) * up)
 
 
 # TODO: consider using DeepNorm from google for more stability
@@ -0,0 +1,154 @@
+"""
+Decoder-only transformer
+    - Pre-norm blocks: x + attention(norm(x)), then x + feed_forward(norm(x))
+    - forward(input_ids, cache) with a KVCache runs only the new tokens and advances the cache,
+      which is how generation decodes one token per step
+    - rope_scaling / rope_scaling_factor reach the RoPE of every layer; set_rope_scaling switches
+      all of them, and context_length (the default KV cache size) follows
+    - activation_checkpointing: in training, each block's activations are recomputed during
+      backward instead of being kept (TrainingConfig.activation_checkpointing)
+"""
+
+from typing import Optional, Tuple
+
+import torch
+import torch.nn as nn
+from torch.utils.checkpoint import checkpoint
+
+from src.arch.attention import Attention
+from src.arch.kv_cache import KVCache
+from src.arch.layers import FeedForward, RMSNorm
+from src.config.config import ModelConfig
+
+
+class TransformerBlock(nn.Module):
+    def __init__(
+        self,
+        hidden_dim: int = ModelConfig.hidden_dim,
+        num_heads: int = ModelConfig.num_heads,
+        num_kv_heads: int = ModelConfig.num_kv_heads,
+        ffn_dim: int = ModelConfig.ffn_dim,
+        max_sequence_length: int = ModelConfig.max_sequence_length,
+        rope_scaling: Optional[str] = ModelConfig.rope_scaling,
+        rope_scaling_factor: float = ModelConfig.rope_scaling_factor,
+    ):
+        super().__init__()
+        self.attention_norm = RMSNorm(hidden_dim)
+        self.attention = Attention(
+            hidden_dim,
+            num_heads,
+            num_kv_heads,
+            max_sequence_length,
+            rope_scaling=rope_scaling,
+            rope_scaling_factor=rope_scaling_factor,
+        )
+        self.ffn_norm = RMSNorm(hidden_dim)
+        self.feed_forward = FeedForward(hidden_dim, ffn_dim)
+
+    def forward(self, x, cache=None, start_position: int = 0):
+        x = x + self.attention(self.attention_norm(x), cache, start_position)
+        return x + self.feed_forward(self.ffn_norm(x))
+
+
+class Transformer(nn.Module):
+    """
+    Token ids [batch, sequence] -> next-token logits [batch, sequence, vocab_size].
+        - last_token_only: project only the last position to logits (prefill / decode)
+        - context_length: positions the model can attend over, max_sequence_length times the
+          RoPE scaling factor
+    """
+
+    def __init__(
+        self,
+        vocab_size: int = ModelConfig.vocab_size,
+        hidden_dim: int = ModelConfig.hidden_dim,
+        num_layers: int = ModelConfig.num_layers,
+        num_heads: int = ModelConfig.num_heads,
+        num_kv_heads: int = ModelConfig.num_kv_heads,
+        ffn_dim: int = ModelConfig.ffn_dim,
+        max_sequence_length: int = ModelConfig.max_sequence_length,
+        rope_scaling: Optional[str] = ModelConfig.rope_scaling,
+        rope_scaling_factor: float = ModelConfig.rope_scaling_factor,
+    ):
+        super().__init__()
+        self.hidden_dim = hidden_dim
+        self.num_heads = num_heads
+        self.num_kv_heads = num_kv_heads
+        self.max_sequence_length = max_sequence_length
+
+        self.embedding = nn.Embedding(vocab_size, hidden_dim)
+        self.blocks = nn.ModuleList(
+            TransformerBlock(
+                hidden_dim,
+                num_heads,
+                num_kv_heads,
+                ffn_dim,
+                max_sequence_length,
+                rope_scaling,
+                rope_scaling_factor,
+            )
+            for _ in range(num_layers)
+        )
+        self.norm = RMSNorm(hidden_dim)
+        self.lm_head = nn.Linear(hidden_dim, vocab_size, bias=False)
+        self.activation_checkpointing = False
+        self.apply(self._init_weights)
+
+    @staticmethod
+    def _init_weights(module: nn.Module) -> None:
+        if isinstance(module, (nn.Linear, nn.Embedding)):
+            nn.init.normal_(module.weight, mean=0.0, std=0.02)
+
+    @property
+    def rope_scaling(self) -> Tuple[Optional[str], float]:
+        """(scaling, factor) of the RoPE of every layer."""
+        rope = self.blocks[0].attention.rope
+        return rope.scaling, rope.scaling_factor
+
+    @property
+    def context_length(self) -> int:
+        return self.blocks[0].attention.rope.context_length
+
+    def set_rope_scaling(self, scaling: Optional[str], scaling_factor: float = 1.0) -> None:
+        """Switch the context scaling of every layer, e.g. to serve longer prompts."""
+        for block in self.blocks:
+            block.attention.rope.set_scaling(scaling, scaling_factor)
+
+    def new_cache(
+        self,
+        batch_size: int = 1,
+        max_length: Optional[int] = None,
+        dtype: Optional[torch.dtype] = None,
+    ) -> KVCache:
+        """KVCache matching this model's layers, dtype and device."""
+        weight = self.lm_head.weight
+        return KVCache(
+            num_layers=len(self.blocks),
+            num_heads=self.num_kv_heads,
+            head_dim=self.hidden_dim // self.num_heads,
+            max_length=max_length or self.context_length,
+            batch_size=batch_size,
+            dtype=dtype or weight.dtype,
+            device=weight.device,
+        )
+
+    def forward(
+        self,
+        input_ids: torch.Tensor,
+        cache: Optional[KVCache] = None,
+        last_token_only: bool = False,
+    ) -> torch.Tensor:
+        start_position = cache.length if cache is not None else 0
+        x = self.embedding(input_ids)
+        recompute = self.activation_checkpointing and self.training and torch.is_grad_enabled()
+        for i, block in enumerate(self.blocks):
+            if recompute and cache is None:
+                x = checkpoint(block, x, use_reentrant=False)
+            else:
+                x = block(x, cache[i] if cache is not None else None, start_position)
+
+        if cache is not None:
+            cache.length += input_ids.shape[1]
+        if last_token_only:
+            x = x[:, -1:]
+        return self.lm_head(self.norm(x))
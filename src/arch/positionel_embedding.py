@@ -1,80 +1,198 @@
 """
 Implementation of Positional Embedding Layer
-    - RoPE
-    - FIX: I don't even know if this works🙂
+    - RoPE, rotate-half layout: dimension i is paired with i + hidden_dim / 2
+    - One cos / sin table per (hidden_dim, base, scaling, device), shared by every layer and
+      dtype, computed for the positions needed so far and grown geometrically when exceeded
+    - Tables are laid out per dimension (frequencies repeated, sign of sin folded in), so a
+      forward is two multiplies and an add on a slice of the table, no repeat_interleave
+    - start_position slices the table (a view), so a decode step costs O(new tokens)
+    - Context scaling without retraining (ModelConfig.rope_scaling): linear position
+      interpolation, NTK-aware base scaling or YaRN; each scaled table is cached, so switching
+      modes with set_scaling costs nothing per step
 """
 
+import math
+from typing import Dict, Optional, Tuple
+
 import torch
 import torch.nn as nn
 
 from src.config.config import ModelConfig
 from src.utils.logger import Logger
 
+SCALINGS = ("linear", "ntk", "yarn")
+
+
+def rope_frequencies(
+    hidden_dim: int,
+    base: float,
+    scaling: Optional[str] = None,
+    factor: float = 1.0,
+    original_length: int = ModelConfig.max_sequence_length,
+) -> Tuple[torch.Tensor, float]:
+    """
+    Inverse frequencies theta_i (float64) and the magnitude to scale cos / sin by.
+        - linear: theta / factor, positions are interpolated into the trained range
+        - ntk: base * factor^(d / (d - 2)), high frequencies kept, low ones interpolated
+        - yarn: per dimension blend of theta and theta / factor by how many rotations it makes
+          over original_length, plus the 0.1 * ln(factor) + 1 attention temperature
+    """
+    if hidden_dim % 2:
+        raise ValueError(f"RoPE needs an even hidden_dim, got {hidden_dim}")
+    if scaling is not None and scaling not in SCALINGS:
+        raise ValueError(f"Unknown RoPE scaling {scaling}, expected one of {SCALINGS}")
+
+    if scaling == "ntk":
+        base = base * factor ** (hidden_dim / (hidden_dim - 2))
+    exponents = torch.arange(0, hidden_dim, 2, dtype=torch.float64) / hidden_dim
+    theta = 1.0 / (base**exponents)
+
+    if scaling == "linear":
+        return theta / factor, 1.0
+    if scaling == "yarn":
+        rotations = original_length * theta / (2 * math.pi)
+        keep = (
+            (rotations - ModelConfig.yarn_beta_slow)
+            / (ModelConfig.yarn_beta_fast - ModelConfig.yarn_beta_slow)
+        ).clamp(0, 1)
+        theta = keep * theta + (1 - keep) * theta / factor
+        return theta, (0.1 * math.log(factor) + 1.0) if factor > 1 else 1.0
+    return theta, 1.0
+
+
+class RotaryTable:
+    """
+    cos / sin of every position up to length, in fp32.
+        - cos[p] = cos(p * theta) for both halves, sin[p] = (-sin, +sin)(p * theta), so that
+          rotate(x) = x * cos + swap_halves(x) * sin
+        - Both are multiplied by magnitude (YaRN's attention temperature, 1 otherwise)
+        - ensure(n) only computes the missing positions, and at least doubles the length
+    """
+
+    def __init__(
+        self, inverse_frequencies: torch.Tensor, magnitude: float, device: torch.device
+    ):
+        hidden_dim = 2 * len(inverse_frequencies)
+        self.device = device
+        # float64 on the CPU: angles of large positions stay exact whatever the device
+        self.inverse_frequencies = inverse_frequencies
+        self.magnitude = magnitude
+        self.length = 0
+        self.cos = torch.empty(0, hidden_dim, device=device)
+        self.sin = torch.empty(0, hidden_dim, device=device)
+
+    def ensure(self, length: int) -> None:
+        if length <= self.length:
+            return
+
+        new_length = max(length, 2 * self.length)
+        positions = torch.arange(self.length, new_length, dtype=torch.float64)
+        angles = torch.outer(positions, self.inverse_frequencies)
+        cos, sin = angles.cos() * self.magnitude, angles.sin() * self.magnitude
+
+        cos = torch.cat((cos, cos), dim=-1).to(self.device, torch.float32)
+        sin = torch.cat((-sin, sin), dim=-1).to(self.device, torch.float32)
+        self.cos = torch.cat((self.cos, cos))
+        self.sin = torch.cat((self.sin, sin))
+        self.length = new_length
+
+    def get(self, start: int, end: int, dtype: torch.dtype) -> Tuple[torch.Tensor, torch.Tensor]:
+        """cos / sin of positions [start, end) as [end - start, hidden_dim] in dtype."""
+        self.ensure(end)
+        return self.cos[start:end].to(dtype), self.sin[start:end].to(dtype)
+
+
+_tables: Dict[tuple, RotaryTable] = {}
+
+
+def get_rotary_table(
+    hidden_dim: int,
+    base: float,
+    device: torch.device,
+    scaling: Optional[str] = None,
+    factor: float = 1.0,
+    original_length: int = ModelConfig.max_sequence_length,
+) -> RotaryTable:
+    if scaling is None or factor == 1.0:
+        scaling, factor = None, 1.0
+    key = (hidden_dim, float(base), scaling, float(factor), original_length, torch.device(device))
+    if key not in _tables:
+        frequencies, magnitude = rope_frequencies(
+            hidden_dim, base, scaling, factor, original_length
+        )
+        _tables[key] = RotaryTable(frequencies, magnitude, key[-1])
+    return _tables[key]
+
+
+def swap_halves(x: torch.Tensor) -> torch.Tensor:
+    half = x.shape[-1] // 2
+    return torch.cat((x[..., half:], x[..., :half]), dim=-1)
+
+
+def apply_rotary(x: torch.Tensor, cos: torch.Tensor, sin: torch.Tensor) -> torch.Tensor:
+    return x * cos + swap_halves(x) * sin
+
 
 class RoPE(nn.Module):
+    """
+    Rotary position embedding of queries and keys shaped [..., sequence_length, hidden_dim].
+        - hidden_dim is the per-head dimension
+        - forward(q, k, start_position=p) rotates them as positions p, p + 1, ...
+        - max_sequence_length is the trained context; with scaling the usable context is
+          max_sequence_length * scaling_factor
+    """
+
     def __init__(
         self,
         hidden_dim: int = ModelConfig.hidden_dim,
         max_sequence_length: int = ModelConfig.max_sequence_length,
         base: float = ModelConfig.base,
+        scaling: Optional[str] = ModelConfig.rope_scaling,
+        scaling_factor: float = ModelConfig.rope_scaling_factor,
     ):
+        super().__init__()
+
         self.hidden_dim = hidden_dim
         self.max_sequence_length = max_sequence_length
         self.base = base
         self.logger = Logger(path="position_embedding.RoPE")  # See what to log later
-
-        super().__init__()
-
-        def build_cache(self, sequence_length: int):
-            theta = 1.0 / (
-                self.base
-                ** (torch.arange(0, self.hidden_dim, 2).float() / self.hidden_dim)
+        self.set_scaling(scaling, scaling_factor)
+
+    def set_scaling(self, scaling: Optional[str], scaling_factor: float = 1.0) -> None:
+        """Switch the context scaling mode, e.g. at inference on longer documents."""
+        if scaling is not None and scaling not in SCALINGS:
+            raise ValueError(f"Unknown RoPE scaling {scaling}, expected one of {SCALINGS}")
+        if scaling is not None and scaling_factor < 1:
+            raise ValueError(f"RoPE scaling factor must be >= 1, got {scaling_factor}")
+
+        self.scaling = scaling
+        self.scaling_factor = scaling_factor if scaling is not None else 1.0
+        self.context_length = int(self.max_sequence_length * self.scaling_factor)
+
+    def table(self, device: torch.device) -> RotaryTable:
+        return get_rotary_table(
+            self.hidden_dim,
+            self.base,
+            device,
+            self.scaling,
+            self.scaling_factor,
+            self.max_sequence_length,
+        )
+
+    def forward(
+        self,
+        q: torch.Tensor,
+        k: torch.Tensor,
+        sequence_length: Optional[int] = None,
+        start_position: int = 0,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        sequence_length = q.shape[-2] if sequence_length is None else sequence_length
+        end = start_position + sequence_length
+        if end > self.context_length:
+            raise ValueError(
+                f"Position {end} exceeds the context length {self.context_length} "
+                f"(max sequence length {self.max_sequence_length}, scaling {self.scaling})"
             )
 
-            sequence_index = torch.arange(sequence_length).float().unsqueeze(1)
-            frequences = torch.outer(sequence_index, theta)
-
-            self.register_buffer("cos_cached", torch.cos(frequences), persistant=False)
-            self.register_buffer("sin_cached", torch.sin(frequences), persistant=False)
-
-        def rotate_half(self, x: torch.Tensor):
-            x1 = x[..., : x.shape[-1] // 2]
-            x2 = x[..., x.shape[-1] // 2 :]
-
-            return torch.cat((-x2, x1), dim=-1)
-
-        def forword(
-            self,
-            q: torch.Tensor,
-            k: torch.Tensor,
-            sequence_length: int,
-            start_position: int = 0,
-        ):
-            if sequence_length > self.max_sequence_length:
-                raise ValueError(
-                    f"Sequence length {sequence_length} exceeds max sequence length {self.max_sequence_length}"
-                )
-
-            if start_position + sequence_length > self.cos_cached.shape[0]:
-                self.build_cache(start_position + sequence_length)
-
-            cos_cached = self.cos_cached[
-                start_position : start_position + sequence_length
-            ]
-            sin_cached = self.sin_cached[
-                start_position : start_position + sequence_length
-            ]
-
-            cos_cached = cos_cached.unsqueeze(0).unsqueeze(0)
-            sin_cached = cos_cached.unsqueeze(0).unsqueeze(0)
-
-            cos_cached = torch.repeat_interleave(cos_cached, 2, dim=-1)
-            sin_cached = torch.repeat_interleave(sin_cached, 2, dim=-1)
-
-            q_rotated = self.rotate_half(q)
-            k_rotated = self.rotate_half(k)
-
-            q_rotated = (q * cos_cached) + (self._rotate_half(q) * sin_cached)
-            k_rotated = (k * cos_cached) + (self._rotate_half(k) * sin_cached)
-
-            return q_rotated, k_rotated
+        cos, sin = self.table(q.device).get(start_position, end, q.dtype)
+        return apply_rotary(q, cos, sin), apply_rotary(k, cos, sin)
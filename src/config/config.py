@@ -8,21 +8,159 @@ class Paths:
         - RAW_DATA_DIR: directory for raw data
         - PROCESSED_DATA_DIR: directory for processed data
         - TOKENIZER_FILE: path to tokenizer file
+        - NEAR_DEDUP_DATA_DIR: directory for shards of the standalone near-dedup pass
+        - TOKENIZED_DATA_DIR: directory for binary token shards
+        - HASH_CACHE_FILE: path to the saved dedup index
+        - NEAR_DEDUP_CACHE_FILE: path to the saved near-dedup LSH index
+        - MANIFEST_FILE: path to the record of already processed raw files
+        - CHECKPOINT_DIR: directory for training checkpoints
     """
 
     DATA_DIR = "./data"
     RAW_DATA_DIR = os.path.join(DATA_DIR, "raw")
     PROCESSED_DATA_DIR = os.path.join(DATA_DIR, "processed")
     TOKENIZER_FILE = os.path.join("./src/tokenization/tokenizer.json")
+    NEAR_DEDUP_DATA_DIR = os.path.join(DATA_DIR, "near_dedup")
+    TOKENIZED_DATA_DIR = os.path.join(DATA_DIR, "tokens")
+    HASH_CACHE_FILE = os.path.join(PROCESSED_DATA_DIR, "hashes.cache")
+    NEAR_DEDUP_CACHE_FILE = os.path.join(PROCESSED_DATA_DIR, "near_dedup.cache")
+    MANIFEST_FILE = os.path.join(PROCESSED_DATA_DIR, "manifest.json")
+    CHECKPOINT_DIR = "./checkpoints"
+
+
+class LogConfig:
+    """
+    Logging configuration, every value can be overridden by its environment variable.
+        - level: messages below this level are dropped before formatting (LOG_LEVEL)
+        - file: plain-text log file appended to, None to disable (LOG_FILE)
+        - jsonl_file: JSON lines log file appended to, None to disable (LOG_JSONL)
+        - background: write records from a background thread instead of the caller (LOG_BACKGROUND)
+    """
+
+    level = os.environ.get("LOG_LEVEL", "INFO")
+    file = os.environ.get("LOG_FILE")
+    jsonl_file = os.environ.get("LOG_JSONL")
+    background = os.environ.get("LOG_BACKGROUND", "1") != "0"
+
+
+class MetricsConfig:
+    """
+    Instrumentation configuration (src/utils/metrics.py), overridable by environment variables.
+        - dir: where metric snapshots and profiles are written, None = only log them (METRICS_DIR)
+        - interval: seconds between periodic snapshots while a run is going, 0 = only at the end
+          (METRICS_INTERVAL)
+        - profile: comma-separated spans to run under cProfile, "all" for every span
+          (PROFILE_STAGES)
+        - tracemalloc: comma-separated spans to trace allocations of (TRACEMALLOC_STAGES)
+        - top_n: functions / allocation sites kept in profile reports
+    """
+
+    dir = os.environ.get("METRICS_DIR")
+    interval = float(os.environ.get("METRICS_INTERVAL", "0"))
+    profile = os.environ.get("PROFILE_STAGES", "")
+    tracemalloc = os.environ.get("TRACEMALLOC_STAGES", "")
+    top_n = 25
 
 
 class SaveData:
     """
     Data saving configuration.
-        - shard_size: size of each shard in bytes
+        - shard_size: size of each shard in bytes (uncompressed)
+        - compression: codec of processed shards (None, "gzip", "bz2" or "lzma")
     """
 
     shard_size = 1024 * 1024 * 1024  # 1GB per shard
+    compression = None
+
+
+class DownloadConfig:
+    """
+    Dataset download configuration.
+        - chunk_size: number of articles per raw chunk file
+        - writers: number of threads slicing the dataset and writing chunk files in parallel
+        - compression: codec of raw chunk files (None, "gzip", "bz2" or "lzma")
+    """
+
+    chunk_size = 10000
+    writers = 4
+    compression = None
+
+
+class ProcessConfig:
+    """
+    Data preprocessing configuration.
+        - workers: number of worker processes used to clean and hash articles
+        - batch_size: number of raw articles sent to a worker at once
+        - min_article_chars: minimum length of a cleaned article to keep it
+        - read_buffer_size: number of characters read from a raw file at a time
+        - dedup_digest_bits: width of the stored dedup digests (64 or 128)
+    """
+
+    workers = 1
+    batch_size = 256
+    min_article_chars = 100
+    read_buffer_size = 1024 * 1024  # 1M characters per read
+    dedup_digest_bits = 64
+
+
+class NearDedupConfig:
+    """
+    MinHash-LSH near-duplicate filtering configuration.
+        - enabled: run near dedup inside the preprocessing pipeline
+        - threshold: Jaccard similarity above which articles count as duplicates
+        - num_perm: number of MinHash permutations
+        - shingle_size: number of consecutive words per shingle
+        - seed: seed of the MinHash permutations
+        - target_articles_per_second: throughput below which the stage warns
+    """
+
+    enabled = False
+    threshold = 0.8
+    num_perm = 128
+    shingle_size = 5
+    seed = 42
+    target_articles_per_second = 10000
+
+
+class TokenizerConfig:
+    """
+    Tokenizer runtime configuration.
+        - cache_size: number of encoded texts kept in the LRU cache (0 disables it)
+        - cache_max_chars: only texts up to this length are cached (prompts, titles, templates)
+        - sample_bytes: byte budget of the corpus sample used for training (None = full corpus)
+        - sample_seed: seed deciding which articles the sample contains
+    """
+
+    cache_size = 0
+    cache_max_chars = 256
+    sample_bytes = None
+    sample_seed = 0
+
+
+class TokenShardConfig:
+    """
+    Binary token shard configuration.
+        - workers: number of worker processes running the tokenizer
+        - batch_size: number of articles passed to one encode_batch call
+    """
+
+    workers = 1
+    batch_size = 1024
+
+
+class PipelineConfig:
+    """
+    End-to-end pipeline (dataset -> token shards) configuration.
+        - clean_workers: processes cleaning and hashing articles
+        - tokenize_workers: processes running the tokenizer
+        - queue_size: batches buffered between the dataset reader thread and the workers
+        - shard_tokens: tokens per binary token shard
+    """
+
+    clean_workers = 1
+    tokenize_workers = 1
+    queue_size = 16
+    shard_tokens = 512 * 1024 * 1024  # 1GB of uint16 tokens
 
 
 class ModelConfig:
@@ -30,13 +168,116 @@ class ModelConfig:
     Model architecture configuration.
         - vocab_size: size of the vocabulary
         - hidden_dim: dimension of the hidden state
+        - num_layers: number of transformer blocks
+        - num_heads: number of attention heads (head dim = hidden_dim / num_heads)
+        - num_kv_heads: key / value heads shared by groups of query heads (num_heads for MHA,
+          1 for MQA); the KV cache is num_heads / num_kv_heads times smaller
+        - ffn_dim: inner dimension of the SwiGLU feed-forward
         - epsilon: small value to prevent division by zero
         - max_sequence_length: maximum sequence length for input sequences
         - base: base value for positional encoding
+        - norm_impl: RMSNorm implementation, "eager", "autograd" (lower activation memory)
+          or "compile" (torch.compile, falls back to eager)
+        - rope_scaling: None, "linear", "ntk" or "yarn" to serve contexts longer than
+          max_sequence_length without retraining
+        - rope_scaling_factor: usable context = max_sequence_length * rope_scaling_factor
+        - yarn_beta_fast / yarn_beta_slow: YaRN keeps dimensions making more than beta_fast
+          rotations over the trained context and interpolates those making less than beta_slow
     """
 
     vocab_size = 32000
     hidden_dim = 1024
+    num_layers = 16
+    num_heads = 16
+    num_kv_heads = 4
+    ffn_dim = 2816
     epsilon = 1e-8
     max_sequence_length = 4096
     base = 10000.0
+    norm_impl = "autograd"
+    rope_scaling = None
+    rope_scaling_factor = 1.0
+    yarn_beta_fast = 32.0
+    yarn_beta_slow = 1.0
+
+
+class TrainingConfig:
+    """
+    Training loop configuration; the memory / speed switches are:
+        - micro_batch_size: sequences per forward / backward (activation memory)
+        - gradient_accumulation_steps: micro batches per optimizer step, so the effective
+          batch is micro_batch_size * gradient_accumulation_steps sequences
+        - autocast_dtype: "bfloat16" to run matmuls in bf16 (CPU and CUDA), None for fp32
+        - activation_checkpointing: recompute each block in backward instead of keeping its
+          activations (about a third more compute, activation memory of one block)
+        - optimizer_impl: AdamW implementation, "fused", "foreach" or "loop"
+        - learning_rate / min_learning_rate: peak and final learning rate of the cosine schedule
+        - warmup_steps: linear warmup steps
+        - max_steps: optimizer steps of the run
+        - weight_decay: AdamW weight decay of matrices (norms and embeddings excluded)
+        - betas: AdamW betas
+        - grad_clip: max gradient norm, None to disable
+        - num_workers: DataLoader worker processes
+        - log_interval: optimizer steps between progress logs
+        - checkpoint_interval: optimizer steps between checkpoints
+        - seed: seed of the model initialization
+        - distributed_backend: torch.distributed backend when launched with torchrun
+        - ddp_bucket_cap_mb: gradient bucket size; smaller buckets start their all-reduce
+          earlier in backward (more overlap), larger ones make fewer calls
+        - data_split: "shards" gives every rank its own token shards (balanced by size,
+          falls back to "samples" with fewer shards than ranks), "samples" has every rank
+          take every world_size-th sample of all shards
+        - threads_per_rank: torch threads of each rank, None for cores / local ranks
+        - checkpoint_shard_bytes: max size of one checkpoint tensor file
+        - async_checkpoint: write checkpoints in a background thread, training only waits
+          for the copy of the tensors to CPU memory
+    """
+
+    micro_batch_size = 1
+    gradient_accumulation_steps = 16
+    autocast_dtype = "bfloat16"
+    activation_checkpointing = True
+    optimizer_impl = "foreach"
+    learning_rate = 3e-4
+    min_learning_rate = 3e-5
+    warmup_steps = 1000
+    max_steps = 100000
+    weight_decay = 0.1
+    betas = (0.9, 0.95)
+    grad_clip = 1.0
+    num_workers = 2
+    log_interval = 10
+    checkpoint_interval = 1000
+    seed = 0
+    distributed_backend = "gloo"
+    ddp_bucket_cap_mb = 25
+    data_split = "shards"
+    threads_per_rank = None
+    checkpoint_shard_bytes = 2 * 1024**3
+    async_checkpoint = True
+
+
+class GenerationConfig:
+    """
+    Text generation configuration.
+        - max_new_tokens: tokens generated per request
+        - temperature: sampling temperature, 0 for greedy decoding
+        - top_k: sample among the k most likely tokens only (None for all)
+        - prefix_cache_entries: prompts whose key / value cache is kept for reuse
+    """
+
+    max_new_tokens = 256
+    temperature = 0.0
+    top_k = None
+    prefix_cache_entries = 8
+
+
+class DatasetConfig:
+    """
+    Training data loading configuration.
+        - sequence_length: tokens per packed training sample
+        - seed: seed of the per-epoch shuffle
+    """
+
+    sequence_length = ModelConfig.max_sequence_length
+    seed = 0
@@ -0,0 +1,185 @@
+"""
+Compact deduplication index for StreamingShardWriter
+    - Stores fixed-width binary digests (64 or 128 bit) instead of hex strings
+    - NumPy-backed open-addressing (linear probing) hash table that grows itself
+    - Saves and loads as a small binary file
+"""
+
+import math
+import struct
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from src.config.config import ProcessConfig
+
+
+class DedupIndex(ABC):
+    """
+    Interface every dedup index used by StreamingShardWriter implements.
+        - add: insert a hex digest, return False if it was already there
+        - save / load: persist the index for resumed runs
+    """
+
+    @abstractmethod
+    def add(self, text_hash: str) -> bool:
+        ...
+
+    @abstractmethod
+    def __contains__(self, text_hash: str) -> bool:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    def collision_probability(self) -> float:
+        """Probability that two different texts were treated as duplicates."""
+        return 0.0
+
+    @abstractmethod
+    def memory_bytes(self) -> int:
+        ...
+
+    @abstractmethod
+    def save(self, path: str) -> None:
+        ...
+
+    @classmethod
+    @abstractmethod
+    def load(cls, path: str) -> "DedupIndex":
+        ...
+
+
+class DigestIndex(DedupIndex):
+    """
+    Open-addressing hash table of truncated SHA256 digests.
+        - Each entry is digest_bits // 64 uint64 words, all-zero rows mark empty slots
+        - The digest is already uniform, so its first word is used as the slot hash
+        - Doubles its capacity once max_load is reached
+    """
+
+    MAGIC = b"DDUP"
+    HEADER = struct.Struct("<4sBxxxQ")  # magic, words per entry, count
+
+    def __init__(
+        self,
+        digest_bits: int = ProcessConfig.dedup_digest_bits,
+        capacity: int = 1 << 16,
+        max_load: float = 0.7,
+    ) -> None:
+        if digest_bits not in (64, 128):
+            raise ValueError(f"digest_bits must be 64 or 128, got {digest_bits}")
+
+        self.digest_bits = digest_bits
+        self.words = digest_bits // 64
+        self.max_load = max_load
+        self.count = 0
+        self._allocate(1 << max(capacity - 1, 1).bit_length())
+
+    def _allocate(self, capacity: int) -> None:
+        self.table = np.zeros((capacity, self.words), dtype=np.uint64)
+        self.mask = capacity - 1
+
+    def key(self, text_hash: str) -> list:
+        """Turn a hex digest into the list of words stored in the table."""
+        return [int(text_hash[i * 16 : (i + 1) * 16], 16) for i in range(self.words)]
+
+    def _probe(self, key: list) -> tuple:
+        """Return (slot, found) for key using linear probing."""
+        if key[0] == 0:  # zero marks an empty slot
+            key[0] = 1
+
+        slot = key[0] & self.mask
+        table = self.table
+
+        while True:
+            row = table[slot].tolist()
+            if row[0] == 0:
+                return slot, False
+            if row == key:
+                return slot, True
+            slot = (slot + 1) & self.mask
+
+    def add(self, text_hash: str) -> bool:
+        return self.add_key(self.key(text_hash))
+
+    def add_key(self, key: list) -> bool:
+        """Insert a key given as words (e.g. an already binary digest)."""
+        slot, found = self._probe(key)
+        if found:
+            return False
+
+        if self.count + 1 > self.max_load * len(self.table):
+            self._grow()
+            slot, _ = self._probe(key)
+
+        self.table[slot] = key
+        self.count += 1
+        return True
+
+    def __contains__(self, text_hash: str) -> bool:
+        return self.contains_key(self.key(text_hash))
+
+    def contains_key(self, key: list) -> bool:
+        return self._probe(key)[1]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _grow(self) -> None:
+        """Double the capacity and re-insert every entry."""
+        old = self.table
+        keys = old[old[:, 0] != 0]
+        self._allocate(len(old) * 2)
+        self._insert_unique(keys)
+
+    def _insert_unique(self, keys: np.ndarray) -> None:
+        """
+        Vectorized insert of keys known to be distinct and absent.
+            - Every round places at most one key per free slot
+            - Keys that found their slot taken move on to the next one
+        """
+        slots = keys[:, 0] & np.uint64(self.mask)
+        pending = np.arange(len(keys))
+
+        while pending.size:
+            candidate_slots = slots[pending]
+            free = self.table[candidate_slots, 0] == 0
+
+            _, first = np.unique(candidate_slots[free], return_index=True)
+            placed = pending[free][first]
+            self.table[slots[placed]] = keys[placed]
+
+            is_placed = np.zeros(len(keys), dtype=bool)
+            is_placed[placed] = True
+            pending = pending[~is_placed[pending]]
+            slots[pending] = (slots[pending] + np.uint64(1)) & np.uint64(self.mask)
+
+    def collision_probability(self) -> float:
+        """Birthday bound: chance that any two distinct digests share a key."""
+        pairs = self.count * (self.count - 1) / 2
+        return -math.expm1(-pairs / 2.0**self.digest_bits)
+
+    def memory_bytes(self) -> int:
+        return self.table.nbytes
+
+    def save(self, path: str) -> None:
+        """Write the raw table, so loading is a single read."""
+        with open(path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.words, self.count))
+            self.table.tofile(f)
+
+    @classmethod
+    def load(cls, path: str) -> "DigestIndex":
+        with open(path, "rb") as f:
+            magic, words, count = cls.HEADER.unpack(f.read(cls.HEADER.size))
+            if magic != cls.MAGIC:
+                raise ValueError(f"{path} is not a dedup index file")
+            table = np.fromfile(f, dtype=np.uint64).reshape(-1, words)
+
+        index = cls(digest_bits=words * 64)
+        index.table = table
+        index.mask = len(table) - 1
+        index.count = count
+        return index
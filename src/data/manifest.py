@@ -0,0 +1,161 @@
+"""
+Processed-files manifest for incremental preprocessing
+    - Records size, mtime and content hash of every raw file already processed
+    - Records the shard positions each file's output went to
+    - Records where the writer stopped, so the next run appends instead of overwriting
+"""
+
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+from typing import IO, Dict, List, Optional, Tuple
+
+from src.utils.logger import Logger
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path: Path, block_size: int = 1024 * 1024) -> str:
+    """SHA256 of a file's bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class HashingReader(io.RawIOBase):
+    """
+    Binary stream feeding every byte read from raw into digest.
+        - Lets a reader fingerprint a file while decoding it, instead of reading it twice
+    """
+
+    def __init__(self, raw: IO[bytes], digest) -> None:
+        self.raw = raw
+        self.digest = digest
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        count = self.raw.readinto(buffer)
+        if count:
+            self.digest.update(memoryview(buffer)[:count])
+        return count
+
+
+class Manifest:
+    """
+    Persistent record of a preprocessing output directory.
+        - files: raw file name -> fingerprint and output position
+        - position: (shard index, byte offset) the writer stopped at
+        - hash_count: size of the dedup index saved next to it (consistency check)
+        - near_dedup: MinHash parameters the saved near-dedup index was built with
+        - compression: codec of the shards (None when uncompressed)
+    """
+
+    def __init__(self, path: str) -> None:
+        self.logger = Logger(path="manifest.Manifest")
+        self.path = path
+        self.files: Dict[str, dict] = {}
+        self.position: Optional[Tuple[int, int]] = None
+        self.hash_count = 0
+        self.near_dedup: Optional[dict] = None
+        self.compression: Optional[str] = None
+
+    @classmethod
+    def load(cls, path: str) -> "Manifest":
+        """Load a manifest, or return an empty one if there is none."""
+        manifest = cls(path)
+        if not os.path.exists(path):
+            return manifest
+
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        if data.get("version") != MANIFEST_VERSION:
+            manifest.logger.log(f"Ignoring manifest with unknown version: {path}", level="WARNING")
+            return manifest
+
+        manifest.files = data["files"]
+        manifest.position = tuple(data["position"]) if data["position"] else None
+        manifest.hash_count = data["hash_count"]
+        manifest.near_dedup = data["near_dedup"]
+        manifest.compression = data.get("compression")
+        return manifest
+
+    def save(self) -> None:
+        """Write atomically, so a crash never leaves a half-written manifest."""
+        data = {
+            "version": MANIFEST_VERSION,
+            "position": list(self.position) if self.position else None,
+            "hash_count": self.hash_count,
+            "near_dedup": self.near_dedup,
+            "compression": self.compression,
+            "files": self.files,
+        }
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def is_unchanged(self, path: Path) -> bool:
+        """
+        Check whether a raw file was already processed in its current form.
+            - Size and mtime are compared first, the content hash only when they differ
+        """
+        entry = self.files.get(path.name)
+        if entry is None:
+            return False
+
+        stat = path.stat()
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_mtime_ns == entry["mtime_ns"]:
+            return True
+
+        # Touched but maybe not modified
+        if file_sha256(path) != entry["sha256"]:
+            return False
+        entry["mtime_ns"] = stat.st_mtime_ns
+        return True
+
+    def pending_files(self, paths: List[Path]) -> List[Path]:
+        """Return the raw files that are new or changed since they were recorded."""
+        pending = []
+        for path in paths:
+            if self.is_unchanged(path):
+                continue
+            if path.name in self.files:
+                self.logger.log(
+                    f"{path.name} changed since it was processed, "
+                    "its previous output stays in the shards",
+                    level="WARNING",
+                )
+            pending.append(path)
+        return pending
+
+    def record(
+        self,
+        path: Path,
+        start: Tuple[int, int],
+        end: Tuple[int, int],
+        articles: int,
+        sha256: Optional[str] = None,
+    ) -> None:
+        """
+        Record a fully processed raw file and where its output went.
+            - sha256: content hash computed while the file was read (hashed again if not given)
+        """
+        stat = path.stat()
+        self.files[path.name] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256 if sha256 is not None else file_sha256(path),
+            "start": list(start),
+            "end": list(end),
+            "articles": articles,
+        }
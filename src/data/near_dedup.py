@@ -0,0 +1,353 @@
+"""
+MinHash-LSH near-duplicate filtering
+    - Catches near-identical stub, list and template articles that exact SHA256 dedup misses
+    - Signatures are computed for a whole batch of texts with NumPy (no per-token Python loops)
+    - Candidates are found with a banded LSH index stored in a DigestIndex
+    - Runs inside StreamingShardWriter or as a standalone pass over processed shards
+"""
+
+import argparse
+import os
+import time
+from functools import partial
+from multiprocessing import Pool
+from typing import List, Optional, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
+from src.config.config import NearDedupConfig, Paths, ProcessConfig, SaveData
+from src.data.dedup import DigestIndex
+from src.utils.compression import CODEC_CHOICES, parse_codec, text_files
+from src.utils.logger import Logger
+from src.utils.metrics import instrumented_run
+
+_BYTE_PRIME = np.uint64(0x100000001B3)
+_WORD_PRIME = np.uint64(0x9E3779B97F4A7C15)
+_ROW_PRIME = np.uint64(0xC2B2AE3D27D4EB4F)
+_BAND_SALT = np.uint64(0x165667B19E3779F9)
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """MurmurHash3 64-bit finalizer, vectorized (wraps modulo 2**64)."""
+    x = x ^ (x >> np.uint64(33))
+    x = x * np.uint64(0xFF51AFD7ED558CCD)
+    x = x ^ (x >> np.uint64(33))
+    x = x * np.uint64(0xC4CEB9FE1A85EC53)
+    return x ^ (x >> np.uint64(33))
+
+
+def _powers(base: np.uint64, count: int) -> np.ndarray:
+    """[1, base, base**2, ...] modulo 2**64."""
+    powers = np.full(count, base, dtype=np.uint64)
+    powers[0] = 1
+    return np.cumprod(powers, dtype=np.uint64)
+
+
+def optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Pick (bands, rows) with bands * rows <= num_perm for a Jaccard threshold.
+        - Minimizes the area of false positives below and false negatives above it
+    """
+    similarity = np.linspace(0.0, 1.0, 1001)
+    below = similarity <= threshold
+    best, best_error = (1, num_perm), float("inf")
+
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            candidate = 1.0 - (1.0 - similarity**rows) ** bands
+            false_positive = np.trapezoid(candidate[below], similarity[below])
+            false_negative = np.trapezoid(1.0 - candidate[~below], similarity[~below])
+            error = false_positive + false_negative
+            if error < best_error:
+                best, best_error = (bands, rows), error
+
+    return best
+
+
+class MinHasher:
+    """
+    Batched MinHash over word shingles.
+        - Word hashes come from prefix polynomial hashes over the UTF-8 bytes
+        - Shingles are shingle_size consecutive words of the same text
+        - Permutations are (a * x + b) >> 32 with random odd a
+        - Texts with fewer words than shingle_size get an all-zero band key row (never dropped)
+    """
+
+    def __init__(
+        self,
+        num_perm: int = NearDedupConfig.num_perm,
+        shingle_size: int = NearDedupConfig.shingle_size,
+        threshold: float = NearDedupConfig.threshold,
+        seed: int = NearDedupConfig.seed,
+    ) -> None:
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.seed = seed
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+
+        # Permutations past bands * rows are never read by the LSH index
+        used = self.bands * self.rows
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(0, 1 << 63, used, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, used, dtype=np.uint64)
+
+    def shingles(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (shingle_hashes, text_index) for a batch, grouped by text."""
+        encoded = [text.encode("utf-8") for text in texts]
+        lengths = np.fromiter((len(e) + 1 for e in encoded), dtype=np.int64, count=len(encoded))
+        text_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        data = np.frombuffer(b"\n".join(encoded) + b"\n", dtype=np.uint8)
+
+        is_word = ~((data == 32) | (data == 10) | (data == 9) | (data == 13))
+        edges = np.diff(np.concatenate(([False], is_word, [False])).astype(np.int8))
+        word_starts = np.flatnonzero(edges == 1)  # space -> word
+        word_ends = np.flatnonzero(edges == -1)  # word -> space
+
+        # Prefix polynomial hash: hash(data[s:e]) = (H[e] - H[s]) * P**-s
+        powers = _powers(_BYTE_PRIME, len(data))
+        inverse_powers = _powers(np.uint64(pow(int(_BYTE_PRIME), -1, 1 << 64)), len(data))
+        prefix = np.zeros(len(data) + 1, dtype=np.uint64)
+        np.cumsum((data.astype(np.uint64) + np.uint64(1)) * powers, out=prefix[1:])
+        words = _mix64((prefix[word_ends] - prefix[word_starts]) * inverse_powers[word_starts])
+
+        word_text = np.searchsorted(text_starts, word_starts, side="right") - 1
+        count = len(words) - self.shingle_size + 1
+        if count <= 0:
+            return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+
+        shingles = np.zeros(count, dtype=np.uint64)
+        for offset, power in enumerate(_powers(_WORD_PRIME, self.shingle_size)):
+            shingles += words[offset : offset + count] * power
+
+        valid = word_text[: count] == word_text[self.shingle_size - 1 :]
+        return _mix64(shingles[valid]), word_text[:count][valid]
+
+    def signatures(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (signatures[num_texts_with_shingles, bands * rows], text_index)."""
+        shingles, shingle_text = self.shingles(texts)
+        if not len(shingles):
+            return np.empty((0, len(self.a)), dtype=np.uint32), shingle_text
+
+        text_index, starts = np.unique(shingle_text, return_index=True)
+        signatures = np.empty((len(text_index), len(self.a)), dtype=np.uint32)
+
+        # In-place ops on an ~8 MB (permutations x shingles) buffer stay cache friendly
+        step = max(1, (1 << 20) // len(shingles))
+        hashed = np.empty((min(step, len(self.a)), len(shingles)), dtype=np.uint64)
+        for first in range(0, len(self.a), step):
+            a = self.a[first : first + step, None]
+            rows = hashed[: len(a)]
+            np.multiply(a, shingles[None, :], out=rows)
+            rows += self.b[first : first + step, None]
+            rows >>= np.uint64(32)
+            signatures[:, first : first + step] = np.minimum.reduceat(rows, starts, axis=1).T
+
+        return signatures, text_index
+
+    def band_keys(self, texts: List[str]) -> np.ndarray:
+        """Return one 64-bit LSH key per band for every text (all zero when unhashable)."""
+        keys = np.zeros((len(texts), self.bands), dtype=np.uint64)
+        signatures, text_index = self.signatures(texts)
+        if not len(text_index):
+            return keys
+
+        used = signatures.astype(np.uint64).reshape(len(text_index), self.bands, self.rows)
+        combined = (used * _powers(_ROW_PRIME, self.rows)).sum(axis=2, dtype=np.uint64)
+        combined += np.arange(self.bands, dtype=np.uint64) * _BAND_SALT
+        keys[text_index] = _mix64(combined)
+        return keys
+
+
+class NearDuplicateFilter:
+    """
+    Banded LSH index deciding whether a text is a near duplicate of one seen before.
+        - A text is a duplicate when any of its band keys was seen before
+        - Band keys of kept texts are stored in a DigestIndex (~14 bytes per band)
+        - Tracks dropped articles and its own throughput (MinHash time included, even when the
+          band keys were computed in workers)
+    """
+
+    def __init__(self, hasher: Optional[MinHasher] = None) -> None:
+        self.logger = Logger(path="near_dedup.NearDuplicateFilter")
+        self.hasher = hasher if hasher is not None else MinHasher()
+        self.index = DigestIndex(digest_bits=64)
+        self.checked = 0
+        self.dropped = 0
+        self.hashed_inline = 0
+        self.hash_seconds = 0.0
+        self.lookup_seconds = 0.0
+
+        self.logger.log(
+            f"Near dedup at Jaccard {self.hasher.threshold}: "
+            f"{self.hasher.bands} bands x {self.hasher.rows} rows"
+        )
+
+    def add(self, band_keys: Optional[np.ndarray] = None, text: Optional[str] = None) -> bool:
+        """
+        Record a text by its band keys (computed from text when not given).
+            - Returns False if it is a near duplicate of an earlier text
+        """
+        if band_keys is None:
+            keys, seconds = timed_band_keys(self.hasher, [text])
+            band_keys = keys[0]
+            self.record_hashing(seconds)
+            self.hashed_inline += 1
+
+        start = time.perf_counter()
+        keys = band_keys.tolist()
+        self.checked += 1
+
+        is_new = not any(keys) or not any(self.index.contains_key([key]) for key in keys)
+        if is_new:
+            for key in keys:
+                self.index.add_key([key])
+        else:
+            self.dropped += 1
+
+        self.lookup_seconds += time.perf_counter() - start
+        return is_new
+
+    def record_hashing(self, seconds: float) -> None:
+        """Add the time spent computing band keys elsewhere (e.g. in a worker)."""
+        self.hash_seconds += seconds
+
+    def params(self) -> dict:
+        """MinHash parameters a saved index is only valid for."""
+        return {
+            "threshold": self.hasher.threshold,
+            "num_perm": self.hasher.num_perm,
+            "shingle_size": self.hasher.shingle_size,
+            "seed": self.hasher.seed,
+        }
+
+    def save(self, path: str) -> None:
+        self.index.save(path)
+
+    def load(self, path: str) -> None:
+        """Restore the band index of an earlier run built with the same params()."""
+        self.index = DigestIndex.load(path)
+
+    def report(self) -> None:
+        """
+        Log how many articles were dropped and whether throughput met the target.
+            - Throughput is per process: MinHash plus LSH lookup time for every article
+        """
+        seconds = self.hash_seconds + self.lookup_seconds
+        rate = self.checked / seconds if seconds else float("inf")
+        percent = 100.0 * self.dropped / self.checked if self.checked else 0.0
+
+        self.logger.log(
+            f"Near duplicates dropped: {self.dropped}/{self.checked} ({percent:.2f}%)"
+        )
+        self.logger.log(
+            f"Near dedup throughput: {rate:.0f} articles/sec per process "
+            f"(MinHash {self.hash_seconds:.1f}s, LSH lookups {self.lookup_seconds:.1f}s)"
+        )
+        if rate < NearDedupConfig.target_articles_per_second:
+            hint = (
+                ", compute band keys in workers (--workers) to keep up"
+                if self.hashed_inline
+                else ""
+            )
+            self.logger.log(
+                f"Near dedup is below its target of "
+                f"{NearDedupConfig.target_articles_per_second} articles/sec{hint}",
+                level="WARNING",
+            )
+
+
+def timed_band_keys(hasher: MinHasher, texts: List[str]) -> Tuple[np.ndarray, float]:
+    """Return the band keys of texts and the seconds it took to compute them."""
+    start = time.perf_counter()
+    keys = hasher.band_keys(texts)
+    return keys, time.perf_counter() - start
+
+
+def band_keys_batch(
+    articles: List[str], hasher: MinHasher
+) -> Tuple[List[str], np.ndarray, float]:
+    """Worker entry point: returns the batch with its band keys and their hashing time."""
+    return (articles, *timed_band_keys(hasher, articles))
+
+
+def main(
+    threshold: float = NearDedupConfig.threshold,
+    workers: int = ProcessConfig.workers,
+    output_dir: str = Paths.NEAR_DEDUP_DATA_DIR,
+    compression: Optional[str] = SaveData.compression,
+) -> None:
+    """Standalone near-dedup pass: processed shards -> output_dir shards."""
+    # process_data imports this module, so import it only when running the pass
+    from src.data.process_data import (
+        StreamingShardWriter,
+        iter_article_batches,
+        ordered_imap,
+    )
+
+    logger = Logger(path="near_dedup.main")
+
+    shard_paths = text_files(Paths.PROCESSED_DATA_DIR, "shard_*.txt")
+    if not shard_paths:
+        logger.log("No shards found in " + Paths.PROCESSED_DATA_DIR, level="ERROR")
+        return
+
+    if os.path.abspath(output_dir) == os.path.abspath(Paths.PROCESSED_DATA_DIR):
+        logger.log("Output dir must differ from the processed data dir", level="ERROR")
+        return
+
+    logger.log(f"Near dedup of {len(shard_paths)} shard(s) into {output_dir}")
+
+    near_dedup = NearDuplicateFilter(MinHasher(threshold=threshold))
+    task = partial(band_keys_batch, hasher=near_dedup.hasher)
+    batches = (
+        batch for shard_path in shard_paths for batch in iter_article_batches(shard_path)
+    )
+    with instrumented_run("near_dedup"):
+        pool = Pool(processes=workers) if workers > 1 else None
+        start = time.perf_counter()
+
+        try:
+            with StreamingShardWriter(
+                output_dir=output_dir,
+                near_dedup=near_dedup,
+                compression=compression,
+                stage="near_dedup",
+            ) as writer:
+                for articles, keys, hash_seconds in tqdm(
+                    ordered_imap(pool, task, batches, workers * 4),
+                    desc="Near dedup",
+                ):
+                    near_dedup.record_hashing(hash_seconds)
+                    for article, band_keys in zip(articles, keys):
+                        writer.add_text(article, band_keys=band_keys)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        elapsed = time.perf_counter() - start
+        logger.log(
+            f"Near dedup complete in {elapsed:.1f}s "
+            f"({near_dedup.checked / max(elapsed, 1e-9):.0f} articles/sec end to end)",
+            level="SUCCESS",
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drop near-duplicate articles from processed shards")
+    parser.add_argument("--threshold", type=float, default=NearDedupConfig.threshold)
+    parser.add_argument("--workers", type=int, default=ProcessConfig.workers)
+    parser.add_argument("--output-dir", default=Paths.NEAR_DEDUP_DATA_DIR)
+    parser.add_argument(
+        "--compression", choices=CODEC_CHOICES, default=SaveData.compression or "none"
+    )
+    args = parser.parse_args()
+
+    main(
+        threshold=args.threshold,
+        workers=args.workers,
+        output_dir=args.output_dir,
+        compression=parse_codec(args.compression),
+    )
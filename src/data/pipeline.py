@@ -0,0 +1,372 @@
+"""
+End-to-end streaming pipeline: dataset -> clean -> dedup -> tokenize -> binary token shards
+    - One run replaces download_data, process_data and token_shards, without intermediate files
+    - Stages are connected by bounded queues, so memory stays flat and a slow stage
+      throttles the ones feeding it (backpressure)
+        - dataset reader: background thread
+        - clean + hash: process pool (or inline)
+        - exact / near dedup: main process, in order
+        - tokenize: process pool (or inline)
+    - Output is the same as the three separate steps would produce
+"""
+
+import argparse
+import os
+import queue
+import threading
+import time
+from functools import partial
+from itertools import islice
+from multiprocessing import Pool
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+from tqdm import tqdm
+
+from src.config.config import (
+    NearDedupConfig,
+    Paths,
+    PipelineConfig,
+    ProcessConfig,
+    SaveData,
+    TokenShardConfig,
+)
+from src.data.dedup import DigestIndex
+from src.data.near_dedup import MinHasher, NearDuplicateFilter
+from src.data.process_data import (
+    ARTICLE_DELIMITER,
+    StreamingShardWriter,
+    _clean_and_hash_task,
+    iter_articles,
+    ordered_imap,
+)
+from src.tokenization.token_shards import (
+    TOKEN_DTYPE,
+    TokenShardWriter,
+    _init_worker,
+    encode_batch_task,
+    remove_stale_token_shards,
+)
+from src.tokenization.tokenizing import load_tokenizer
+from src.utils.compression import CODEC_CHOICES, parse_codec, text_files
+from src.utils.logger import Logger
+from src.utils.metrics import instrumented_run, metrics
+
+_END = object()
+
+
+def iter_in_thread(items: Iterable, max_pending: int, stats: Optional[dict] = None) -> Iterator:
+    """
+    Iterate over items in a background thread, handing them over through a bounded queue.
+        - The thread blocks when max_pending items are waiting (backpressure)
+        - Exceptions raised by the iterator are re-raised in the consumer
+        - stats["source_wait"] accumulates the seconds the consumer waited for items
+    """
+    handoff: queue.Queue = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if stop.is_set():
+                    return
+                handoff.put(item)
+            handoff.put(_END)
+        except BaseException as e:
+            handoff.put(e)
+
+    thread = threading.Thread(target=produce, name="pipeline-source", daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            start = time.perf_counter()
+            item = handoff.get()
+            if stats is not None:
+                stats["source_wait"] = stats.get("source_wait", 0.0) + time.perf_counter() - start
+
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Consumer stopped early: unblock the producer so the thread can exit
+        stop.set()
+        while thread.is_alive():
+            try:
+                handoff.get_nowait()
+            except queue.Empty:
+                thread.join(timeout=0.1)
+
+
+def stream_dataset() -> Iterator[str]:
+    """Article texts of the Wikipedia dataset, streamed instead of downloaded."""
+    from datasets import load_dataset
+
+    dataset = load_dataset("wikimedia/wikipedia", "20231101.en", streaming=True, split="train")
+    for example in dataset:
+        yield example.get("text", "")
+
+
+def stream_raw_files(raw_dir: str = Paths.RAW_DATA_DIR) -> Iterator[str]:
+    """Articles of already downloaded raw chunk files, in processing order."""
+    for path in text_files(raw_dir, "*.txt"):
+        yield from iter_articles(path)
+
+
+def split_articles(texts: Iterable[str]) -> Iterator[str]:
+    """
+    Split dataset texts the way download_data + process_data do.
+        - Raw chunks separate texts with "\\n\\n" and are read back split on it,
+          so every paragraph block becomes its own article there; do the same here
+    """
+    for text in texts:
+        if text.strip():
+            yield from text.split(ARTICLE_DELIMITER)
+
+
+def batched(items: Iterable, batch_size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+class TokenShardRotator:
+    """Writes token batches to tokens_XXXX.bin shards of about shard_tokens tokens each."""
+
+    def __init__(self, vocab_size: int, output_dir: str, shard_tokens: int) -> None:
+        self.logger = Logger(path="pipeline.TokenShardRotator")
+        self.vocab_size = vocab_size
+        self.output_dir = output_dir
+        self.shard_tokens = shard_tokens
+        self.shard_index = 0
+        self.total_tokens = 0
+        self.writer: Optional[TokenShardWriter] = None
+
+        os.makedirs(output_dir, exist_ok=True)
+
+    def append(self, tokens: np.ndarray, lengths: List[int]) -> None:
+        if self.writer is None:
+            self.writer = TokenShardWriter(self.shard_index, self.vocab_size, self.output_dir)
+            self.shard_index += 1
+
+        self.writer.append(tokens, lengths)
+        self.total_tokens += len(tokens)
+        if self.writer.num_tokens >= self.shard_tokens:
+            self.close_shard()
+
+    def close_shard(self) -> None:
+        if self.writer is None:
+            return
+
+        self.writer.close()
+        self.logger.log(
+            f"Wrote {self.writer.bin_path}: {self.writer.num_tokens} tokens, "
+            f"{len(self.writer.doc_offsets) - 1} documents"
+        )
+        self.writer = None
+
+    def remove_stale_shards(self) -> None:
+        """Delete shards of an earlier, longer run that this run did not overwrite."""
+        remove_stale_token_shards(self.output_dir, set(range(self.shard_index)))
+
+
+def run_pipeline(
+    source: Optional[Iterable[str]] = None,
+    clean_workers: int = PipelineConfig.clean_workers,
+    tokenize_workers: int = PipelineConfig.tokenize_workers,
+    near_dedup: bool = NearDedupConfig.enabled,
+    near_dedup_threshold: float = NearDedupConfig.threshold,
+    write_text: bool = False,
+    compression: Optional[str] = SaveData.compression,
+    tokenizer_path: str = Paths.TOKENIZER_FILE,
+    output_dir: str = Paths.TOKENIZED_DATA_DIR,
+    shard_tokens: int = PipelineConfig.shard_tokens,
+    max_articles: Optional[int] = None,
+) -> int:
+    """
+    Run every stage in one pass, returns the number of tokens written.
+        - source: dataset texts (default: the streamed Wikipedia dataset)
+        - write_text: also write processed text shards (with index and dedup cache)
+        - max_articles: stop after this many source texts
+    """
+    logger = Logger(path="pipeline.run_pipeline")
+
+    if not os.path.exists(tokenizer_path):
+        logger.log(
+            f"No tokenizer at {tokenizer_path}, train one first "
+            "(e.g. on a sample: src.tokenization.tokenizing --sample-bytes)",
+            level="ERROR",
+        )
+        return 0
+
+    vocab_size = load_tokenizer(tokenizer_path).get_vocab_size()
+    if vocab_size > np.iinfo(TOKEN_DTYPE).max + 1:
+        raise ValueError(f"Vocab size {vocab_size} does not fit in {np.dtype(TOKEN_DTYPE).name}")
+
+    if source is None:
+        source = stream_dataset()
+    if max_articles is not None:
+        source = islice(source, max_articles)
+
+    near_dedup_filter = (
+        NearDuplicateFilter(MinHasher(threshold=near_dedup_threshold)) if near_dedup else None
+    )
+    hasher = near_dedup_filter.hasher if near_dedup_filter is not None else None
+    text_writer = (
+        StreamingShardWriter(
+            near_dedup=near_dedup_filter, compression=compression, stage="pipeline"
+        )
+        if write_text
+        else None
+    )
+    hashes_seen = DigestIndex()
+    stats = {"articles": 0, "kept": 0, "duplicates": 0, "near_duplicates": 0}
+
+    def keep(text: str, text_hash: str, band_keys: Optional[np.ndarray]) -> bool:
+        if text_writer is not None:
+            return text_writer.add_text(text, text_hash=text_hash, band_keys=band_keys)
+        if not hashes_seen.add(text_hash):
+            stats["duplicates"] += 1
+            metrics.inc("pipeline.duplicates")
+            return False
+        if near_dedup_filter is not None and not near_dedup_filter.add(band_keys, text):
+            stats["near_duplicates"] += 1
+            metrics.inc("pipeline.near_duplicates")
+            return False
+        return True
+
+    def deduplicated(cleaned_batches) -> Iterator[List[str]]:
+        """Dedup stage: keeps the order of the source, re-batches for the tokenizer."""
+        kept = []
+        for _, batch, band_keys, hash_seconds in cleaned_batches:
+            if near_dedup_filter is not None:
+                near_dedup_filter.record_hashing(hash_seconds)
+            for i, (text_hash, cleaned) in enumerate(batch):
+                if keep(cleaned, text_hash, band_keys[i] if band_keys is not None else None):
+                    kept.append(cleaned)
+                    if len(kept) >= TokenShardConfig.batch_size:
+                        yield kept
+                        kept = []
+        if kept:
+            yield kept
+
+    def source_batches() -> Iterator[list]:
+        for batch in batched(split_articles(source), ProcessConfig.batch_size):
+            stats["articles"] += len(batch)
+            metrics.inc("pipeline.articles", len(batch))
+            yield batch
+
+    clean_pool = Pool(processes=clean_workers) if clean_workers > 1 else None
+    if tokenize_workers > 1:
+        token_pool = Pool(
+            processes=tokenize_workers, initializer=_init_worker, initargs=(tokenizer_path,)
+        )
+    else:
+        token_pool = None
+        _init_worker(tokenizer_path, rust_parallelism=True)
+
+    logger.log(
+        f"Streaming pipeline: {clean_workers} clean worker(s), "
+        f"{tokenize_workers} tokenize worker(s), text shards {'on' if write_text else 'off'}"
+    )
+
+    with instrumented_run("pipeline"):
+        rotator = TokenShardRotator(vocab_size, output_dir, shard_tokens)
+        start = time.perf_counter()
+
+        try:
+            batches = iter_in_thread(source_batches(), PipelineConfig.queue_size, stats)
+            cleaned = ordered_imap(
+                clean_pool,
+                partial(_clean_and_hash_task, hasher=hasher),
+                ((0, batch) for batch in batches),
+                max_pending=clean_workers * 4,
+            )
+            encoded = ordered_imap(
+                token_pool,
+                encode_batch_task,
+                ((0, batch) for batch in deduplicated(cleaned)),
+                max_pending=tokenize_workers * 4,
+            )
+
+            progress = tqdm(desc="Pipeline", unit=" docs")
+            for _, tokens, lengths in encoded:
+                rotator.append(tokens, lengths)
+                stats["kept"] += len(lengths)
+                metrics.inc("pipeline.tokens", len(tokens))
+                metrics.inc("pipeline.documents", len(lengths))
+                progress.update(len(lengths))
+            progress.close()
+
+            rotator.close_shard()
+            rotator.remove_stale_shards()
+        finally:
+            for pool in (clean_pool, token_pool):
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+            if text_writer is not None:
+                text_writer.close()
+
+        elapsed = time.perf_counter() - start
+        if text_writer is not None:
+            stats["duplicates"] = text_writer.duplicates_skipped
+            stats["near_duplicates"] = text_writer.near_duplicates_skipped
+        elif near_dedup_filter is not None:
+            near_dedup_filter.report()
+
+        logger.log(
+            f"{stats['articles']} articles in, {stats['kept']} kept, "
+            f"{stats['duplicates']} duplicates, {stats['near_duplicates']} near duplicates"
+        )
+        logger.log(
+            f"{stats['articles'] / max(elapsed, 1e-9):.0f} articles/sec, "
+            f"{rotator.total_tokens / max(elapsed, 1e-9):.0f} tokens/sec, "
+            f"{stats.get('source_wait', 0.0):.1f}s of {elapsed:.1f}s waiting for the dataset"
+        )
+        logger.log(
+            f"Pipeline complete! {rotator.total_tokens} tokens in {rotator.shard_index} shard(s)",
+            level="SUCCESS",
+        )
+        return rotator.total_tokens
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream the dataset straight into token shards")
+    parser.add_argument("--clean-workers", type=int, default=PipelineConfig.clean_workers)
+    parser.add_argument("--tokenize-workers", type=int, default=PipelineConfig.tokenize_workers)
+    parser.add_argument(
+        "--from-raw",
+        action="store_true",
+        help="read downloaded raw chunks instead of streaming the dataset",
+    )
+    parser.add_argument("--near-dedup", action="store_true", default=NearDedupConfig.enabled)
+    parser.add_argument("--near-dedup-threshold", type=float, default=NearDedupConfig.threshold)
+    parser.add_argument(
+        "--write-text",
+        action="store_true",
+        help="also write processed text shards to " + Paths.PROCESSED_DATA_DIR,
+    )
+    parser.add_argument(
+        "--compression",
+        choices=CODEC_CHOICES,
+        default=SaveData.compression or "none",
+        help="codec of the text shards (with --write-text)",
+    )
+    parser.add_argument("--shard-tokens", type=int, default=PipelineConfig.shard_tokens)
+    parser.add_argument("--max-articles", type=int, default=None)
+    args = parser.parse_args()
+
+    run_pipeline(
+        source=stream_raw_files() if args.from_raw else None,
+        clean_workers=args.clean_workers,
+        tokenize_workers=args.tokenize_workers,
+        near_dedup=args.near_dedup,
+        near_dedup_threshold=args.near_dedup_threshold,
+        write_text=args.write_text,
+        compression=parse_codec(args.compression),
+        shard_tokens=args.shard_tokens,
+        max_articles=args.max_articles,
+    )
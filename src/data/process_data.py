@@ -1,104 +1,242 @@
 """
 Code Responsible for data cleaning and sharding
-    - FIX: make it memory efficient
+    - Raw files are streamed article by article, so memory does not grow with file size
+    - Raw files and shards may be compressed (.gz / .bz2 / .xz), decompression is streamed too
+    - Every shard gets a sidecar index of article offsets (see shard_index)
 """
 
+import argparse
 import hashlib
+import io
 import os
-import re
-from io import TextIOWrapper
+import time
+from collections import deque
+from contextlib import ExitStack
+from multiprocessing import Pool
+from functools import partial
 from pathlib import Path
-from typing import Optional, Set
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
 
 from tqdm import tqdm
 
-from src.config.config import Paths, SaveData
-from utils.Logger import Logger
+from src.config.config import NearDedupConfig, Paths, ProcessConfig, SaveData
+from src.data.dedup import DedupIndex, DigestIndex
+from src.data.manifest import HashingReader, Manifest
+from src.data.near_dedup import MinHasher, NearDuplicateFilter, timed_band_keys
+from src.data.shard_index import ShardIndexBuilder, index_path, scan_shard
+from src.data.text_cleaner import wikipedia_cleaner
+from src.utils.compression import (
+    CODEC_CHOICES,
+    open_text,
+    parse_codec,
+    strip_codec,
+    text_files,
+    with_codec,
+)
+from src.utils.logger import Logger
+from src.utils.metrics import instrumented_run, metrics
 
 
 def clean_text(text: str) -> str:
     """
     Clean and normalize Wikipedia text.
 
-    Operations:
+    Operations (see text_cleaner.WIKIPEDIA_RULES):
         - Remove HTML/XML tags
         - Remove Wiki markup ([[...]])
         - Normalize whitespace
         - Remove non-ASCII characters (optional, can be removed if multilingual needed)
     """
-    # Remove HTML/XML tags
-    text = re.sub(r"<[^>]+>", "", text)
+    # Non-ASCII is kept for now, add a CleaningRule(r"[^\x00-\x7F]+") to drop it
+    return wikipedia_cleaner(text)
 
-    # Remove Wiki markup like [[Category:...]] or [[File:...]]
-    text = re.sub(r"\[\[.*?\]\]", "", text)
 
-    # Normalize whitespace (newlines, tabs -> single space)
-    text = re.sub(r"\s+", " ", text)
+def hash_text(text: str) -> str:
+    """Generate SHA256 hash for deduplication."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-    # Remove non-printable characters but keep basic unicode for now
-    # text = re.sub(r"[^\x00-\x7F]+", "", text)  # Commented out: removes non-ASCII
 
-    return text.strip()
+def clean_and_hash_batch(articles: List[str]) -> List[Tuple[str, str]]:
+    """
+    Clean a batch of raw articles and hash the ones worth keeping.
+        - Runs inside worker processes, so it must stay a top-level function
+        - Returns (hash, cleaned_text) pairs in input order
+    """
+    batch = []
+    for article in articles:
+        cleaned = clean_text(article)
 
+        # Only keep substantial articles (100+ chars)
+        if len(cleaned) >= ProcessConfig.min_article_chars:
+            batch.append((hash_text(cleaned), cleaned))
 
-def hash_text(text: str) -> str:
-    """Generate SHA256 hash for deduplication."""
-    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return batch
 
 
 class StreamingShardWriter:  # Fixed: Writer not Writter
     """
     Manages writing text to sharded files with size limits.
     Handles deduplication and automatic shard rotation.
+        - near_dedup: optional MinHash-LSH filter applied after exact dedup
+        - resume_position: (shard index, offset) to keep appending from instead of starting over;
+          without it, every shard already in output_dir (any codec) is deleted first
+        - compression: codec of the shards; shard_size and offsets count uncompressed bytes
+        - Writes shard_XXXX.idx (offset, length, hash of every article) next to each shard
+        - stage: prefix of the metrics it counts ({stage}.written, {stage}.duplicates, ...)
     """
 
-    def __init__(self, shard_size: int = SaveData.shard_size) -> None:
+    def __init__(
+        self,
+        shard_size: int = SaveData.shard_size,
+        dedup_index: Optional[DedupIndex] = None,
+        near_dedup: Optional[NearDuplicateFilter] = None,
+        output_dir: str = Paths.PROCESSED_DATA_DIR,
+        resume_position: Optional[Tuple[int, int]] = None,
+        compression: Optional[str] = SaveData.compression,
+        stage: str = "process",
+    ) -> None:
         self.logger = Logger(path="process_data.StreamingShardWriter")
         self.shard_size = shard_size
+        self.output_dir = output_dir
+        self.near_dedup = near_dedup
+        self.compression = parse_codec(compression)
         self.shard_index = 0
-        self.current_file: Optional[TextIOWrapper] = None  # Fixed: removed field()
-        self.hashes_seen: Set[str] = set()  # Fixed: hashes not hashs
+        self.current_file: Optional[IO[str]] = None  # Fixed: removed field()
+        self.written_paths: List[str] = []
+        self.index = ShardIndexBuilder()
+        self.hashes_seen: DedupIndex = (
+            dedup_index if dedup_index is not None else DigestIndex()
+        )
         self.current_size = 0
+        self.bytes_written = 0
         self.total_written_texts = 0
         self.duplicates_skipped = 0
+        self.near_duplicates_skipped = 0
+
+        self.stage = stage
+        self.written_counter = metrics.counter(f"{stage}.written")
+        self.bytes_counter = metrics.counter(f"{stage}.bytes")
+        self.duplicates_counter = metrics.counter(f"{stage}.duplicates")
+        self.near_duplicates_counter = metrics.counter(f"{stage}.near_duplicates")
 
         # Ensure directory exists
-        os.makedirs(Paths.PROCESSED_DATA_DIR, exist_ok=True)
-        self.open_new_shard()
+        os.makedirs(self.output_dir, exist_ok=True)
+        if resume_position is None:
+            self.remove_shards_after(-1)
+            self.open_new_shard()
+        else:
+            self.resume_shard(*resume_position)
 
         self.logger.log("Initialized StreamingShardWriter")
 
+    def shard_path(self, shard_index: int) -> str:
+        return with_codec(
+            os.path.join(self.output_dir, f"shard_{shard_index:04d}.txt"), self.compression
+        )
+
+    def cache_path(self, path: str) -> str:
+        """Place one of the Paths cache files inside this writer's output dir."""
+        return os.path.join(self.output_dir, os.path.basename(path))
+
+    def position(self) -> Tuple[int, int]:
+        """(shard index, byte offset) the next text will be written at."""
+        return self.shard_index - 1, self.current_size
+
+    def save_index(self) -> None:
+        """Write the sidecar index of the current shard."""
+        self.index.save(index_path(self.shard_path(self.shard_index - 1)))
+
     def open_new_shard(self) -> None:
         """Close current shard (if any) and open a new one."""
         if self.current_file:
             self.current_file.close()
+            self.save_index()
             self.logger.log(f"Closed shard {self.shard_index - 1}")
 
-        shard_path = os.path.join(
-            Paths.PROCESSED_DATA_DIR, f"shard_{self.shard_index:04d}.txt"
-        )
+        shard_path = self.shard_path(self.shard_index)
 
-        self.current_file = open(shard_path, "w", encoding="utf-8", buffering=8192)
+        self.current_file = open_text(shard_path, "w")
+        self.written_paths.append(shard_path)
+        self.index = ShardIndexBuilder()
         self.current_size = 0  # Reset size counter
         self.shard_index += 1
 
         self.logger.log(f"Opened new shard: {shard_path}")
 
+    def remove_shards_after(self, shard_index: int) -> None:
+        """Delete the shards (any codec) and sidecar indexes numbered above shard_index."""
+        stale_paths = [
+            *text_files(self.output_dir, "shard_*.txt"),
+            *Path(self.output_dir).glob("shard_*.idx"),
+        ]
+        for stale_path in stale_paths:
+            if shard_number(stale_path) > shard_index:
+                stale_path.unlink()
+                self.logger.log(f"Removed stale shard: {stale_path}", level="WARNING")
+
+    def resume_shard(self, shard_index: int, offset: int) -> None:
+        """
+        Reopen a shard for appending at offset.
+            - Anything written after that position (e.g. by a killed run) is dropped
+            - Compressed shards cannot be cut at an uncompressed offset, so the shard at
+              shard_index is kept as is and writing continues in a new shard
+        """
+        self.remove_shards_after(shard_index)
+
+        if self.compression is not None:
+            self.shard_index = shard_index + 1
+            self.open_new_shard()
+            return
+
+        shard_path = self.shard_path(shard_index)
+        with open(shard_path, "ab") as f:
+            f.truncate(offset)
+
+        if os.path.exists(index_path(shard_path)):
+            entries = np.load(index_path(shard_path))
+            entries = entries[entries["offset"] + entries["length"] <= offset]
+        else:
+            entries = scan_shard(shard_path)
+        self.index = ShardIndexBuilder.from_array(entries)
+
+        self.current_file = open_text(shard_path, "a")
+        self.written_paths.append(shard_path)
+        self.current_size = offset
+        self.shard_index = shard_index + 1
+
+        self.logger.log(f"Resumed shard {shard_path} at byte {offset}")
+
     def should_rotate_shard(self, text_size: int) -> bool:
         """Determine if we need to rotate to a new shard."""
         return (self.current_size + text_size) > self.shard_size
 
-    def add_text(self, text: str) -> bool:
+    def add_text(
+        self,
+        text: str,
+        text_hash: Optional[str] = None,
+        band_keys: Optional[np.ndarray] = None,
+    ) -> bool:
+        """
+        Write text to the current shard unless it was seen before.
+            - text_hash and band_keys can be passed in when already computed (e.g. by a worker)
+        """
         if not text or not text.strip():
             return False
 
         # Check for duplicates
-        text_hash = hash_text(text)
-        if text_hash in self.hashes_seen:
+        if text_hash is None:
+            text_hash = hash_text(text)
+        if not self.hashes_seen.add(text_hash):
             self.duplicates_skipped += 1
+            self.duplicates_counter.inc()
             return False
 
-        self.hashes_seen.add(text_hash)
+        if self.near_dedup is not None and not self.near_dedup.add(band_keys, text):
+            self.near_duplicates_skipped += 1
+            self.near_duplicates_counter.inc()
+            return False
 
         # Calculate size with delimiter
         text_bytes = text.encode("utf-8")
@@ -108,14 +246,20 @@ class StreamingShardWriter:  # Fixed: Writer not Writter
         # Rotate shard if needed
         if self.should_rotate_shard(text_size):
             self.open_new_shard()
+            delimiter_size = 0  # first text of the new shard
+            text_size = len(text_bytes)
 
         # Write to file
         if self.current_size > 0:
             self.current_file.write("\n\n")
 
+        self.index.append(self.current_size + delimiter_size, len(text_bytes), text_hash)
         self.current_file.write(text)
         self.current_size += text_size
+        self.bytes_written += text_size
         self.total_written_texts += 1
+        self.written_counter.inc()
+        self.bytes_counter.inc(text_size)
         return True
 
     def close(self) -> None:
@@ -123,22 +267,50 @@ class StreamingShardWriter:  # Fixed: Writer not Writter
         if self.current_file:
             self.current_file.close()
             self.current_file = None  # Fixed: Added None
+            self.save_index()
 
         self.logger.log(f"Closed shard {self.shard_index - 1}")
         self.logger.log(f"Total texts written: {self.total_written_texts}")
         self.logger.log(f"Duplicates skipped: {self.duplicates_skipped}")
+
+        seen = self.total_written_texts + self.duplicates_skipped + self.near_duplicates_skipped
+        metrics.set_gauge(
+            f"{self.stage}.duplicate_rate",
+            (self.duplicates_skipped + self.near_duplicates_skipped) / max(seen, 1),
+        )
         self.logger.log(f"Total shards created: {self.shard_index}")
 
-        # Optional: Save hash set to disk for resumability
-        hash_cache_path = os.path.join(Paths.PROCESSED_DATA_DIR, "hashes.cache")
+        disk_bytes = sum(os.path.getsize(path) for path in self.written_paths)
+        self.logger.log(
+            f"Shard bytes: {self.bytes_written / (1024 * 1024):.1f} MB text, "
+            f"{disk_bytes / (1024 * 1024):.1f} MB on disk ({self.compression or 'uncompressed'})"
+        )
+
+        if self.near_dedup is not None:
+            self.near_dedup.report()
+
+        self.logger.log(
+            f"Dedup index: {len(self.hashes_seen)} hashes, "
+            f"{self.hashes_seen.memory_bytes() / (1024 * 1024):.1f} MB, "
+            f"collision probability {self.hashes_seen.collision_probability():.2e}"
+        )
+
+        # Save dedup index to disk for resumability
+        hash_cache_path = self.cache_path(Paths.HASH_CACHE_FILE)
         try:
-            with open(hash_cache_path, "w") as f:
-                for h in self.hashes_seen:
-                    f.write(h + "\n")
+            self.hashes_seen.save(hash_cache_path)
             self.logger.log(f"Saved hash cache to {hash_cache_path}")
         except Exception as e:
             self.logger.log(f"Failed to save hash cache: {e}", level="WARNING")
 
+        if self.near_dedup is not None:
+            near_dedup_cache_path = self.cache_path(Paths.NEAR_DEDUP_CACHE_FILE)
+            try:
+                self.near_dedup.save(near_dedup_cache_path)
+                self.logger.log(f"Saved near dedup cache to {near_dedup_cache_path}")
+            except Exception as e:
+                self.logger.log(f"Failed to save near dedup cache: {e}", level="WARNING")
+
     def __enter__(self):
         """Context manager support."""
         return self
@@ -149,57 +321,352 @@ class StreamingShardWriter:  # Fixed: Writer not Writter
         return False
 
 
-def process_articles(writer: StreamingShardWriter, file_path: Path) -> int:
-    written = 0
+ARTICLE_DELIMITER = "\n\n"
 
-    with open(file_path, "r", encoding="utf-8") as file:
-        content = file.read()
 
-    # Split by double newlines (article separator)
-    articles = content.split("\n\n")  # Fixed spelling: articles not articales
+def shard_number(path: Path) -> int:
+    """Index of a shard file, compressed or not (shard_0003.txt.gz -> 3, shard_0003.idx -> 3)."""
+    return int(Path(strip_codec(path)).stem.split("_")[1])
 
-    for article in articles:
-        cleaned = clean_text(article)
 
-        # Only keep substantial articles (100+ chars)
-        if len(cleaned) >= 100:
-            if writer.add_text(cleaned):
+def iter_articles(
+    file_path: Path, buffer_size: int = ProcessConfig.read_buffer_size, digest=None
+) -> Iterator[str]:
+    """
+    Yield the raw articles of a file one at a time.
+        - Reads buffer_size characters at a time instead of the whole file
+        - Delimiters split across two reads are still found
+        - Yields exactly what content.split("\n\n") would
+        - Compressed files (.gz / .bz2 / .xz) are decompressed on the fly
+        - digest: hashlib object fed the raw bytes of the file as they are read
+    """
+    pending = ""
+
+    with ExitStack() as stack:
+        source = None
+        if digest is not None:
+            raw = stack.enter_context(open(file_path, "rb"))
+            source = io.BufferedReader(HashingReader(raw, digest))
+        file = stack.enter_context(open_text(file_path, "r", fileobj=source))
+
+        while chunk := file.read(buffer_size):
+            # pending holds no delimiter, only its last char can start one
+            search_from = max(len(pending) - 1, 0)
+            buffer = pending + chunk
+            start = 0
+
+            index = buffer.find(ARTICLE_DELIMITER, search_from)
+            while index != -1:
+                yield buffer[start:index]
+                start = index + len(ARTICLE_DELIMITER)
+                index = buffer.find(ARTICLE_DELIMITER, start)
+
+            pending = buffer[start:]
+
+        # Decoders may stop before the end of the file (e.g. trailing padding)
+        while source is not None and source.read(1 << 20):
+            pass
+
+    yield pending
+
+
+def iter_article_batches(
+    file_path: Path, batch_size: int = ProcessConfig.batch_size, digest=None
+) -> Iterator[List[str]]:
+    """Yield the raw articles of a file in batches of size batch_size."""
+    batch = []
+    for article in iter_articles(file_path, digest=digest):
+        batch.append(article)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def ordered_imap(pool: Optional[Pool], func, items: Iterable, max_pending: int):
+    """
+    Map func over items, in order, with at most max_pending tasks in flight.
+        - Runs inline when pool is None
+        - Unlike Pool.imap, never reads ahead of what the workers can take
+    """
+    if pool is None:
+        yield from map(func, items)
+        return
+
+    pending = deque()
+    for item in items:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+
+    while pending:
+        yield pending.popleft().get()
+
+
+def _clean_and_hash_task(
+    task: Tuple[int, Optional[List[str]]], hasher: Optional[MinHasher] = None
+) -> Tuple[int, Optional[List[Tuple[str, str]]], Optional[np.ndarray], float]:
+    """
+    Worker entry point: keeps the file index next to the cleaned batch.
+        - Also computes near-dedup band keys when a hasher is given, with their hashing time
+    """
+    file_index, articles = task
+    if articles is None:  # end-of-file marker, passed through untouched
+        return file_index, None, None, 0.0
+
+    batch = clean_and_hash_batch(articles)
+    band_keys, hash_seconds = None, 0.0
+    if hasher is not None:
+        band_keys, hash_seconds = timed_band_keys(hasher, [cleaned for _, cleaned in batch])
+    return file_index, batch, band_keys, hash_seconds
+
+
+def process_files(
+    writer: StreamingShardWriter,
+    file_paths: List[Path],
+    pool: Optional[Pool] = None,
+    workers: int = 1,
+) -> Iterator[Tuple[Path, int, Optional[str]]]:
+    """
+    Clean, hash and write every article of the given raw files.
+        - Batches of all files flow through the pool as one stream (no stall between files)
+        - Results are written in file order, so output does not depend on workers
+        - Yields (file_path, articles_written, sha256) as each file finishes
+        - sha256 of the raw file is computed while reading it, None if the file failed mid-read
+    """
+    logger = Logger(path="process_data.process_files")
+    # file index -> sha256, or None when reading failed, set before the end-of-file marker
+    file_digests = {}
+
+    def tasks() -> Iterator[Tuple[int, Optional[List[str]]]]:
+        for file_index, file_path in enumerate(file_paths):
+            digest = hashlib.sha256()
+            try:
+                for batch in iter_article_batches(file_path, digest=digest):
+                    yield file_index, batch
+                file_digests[file_index] = digest.hexdigest()
+            except Exception as e:
+                # Continue with next file instead of crashing
+                logger.log(f"Error processing {file_path}: {e}", level="ERROR")
+                file_digests[file_index] = None
+            yield file_index, None
+
+    hasher = writer.near_dedup.hasher if writer.near_dedup is not None else None
+    task = partial(_clean_and_hash_task, hasher=hasher)
+
+    written = 0
+    for file_index, batch, band_keys, hash_seconds in ordered_imap(
+        pool, task, tasks(), max_pending=workers * 4
+    ):
+        if hasher is not None:
+            writer.near_dedup.record_hashing(hash_seconds)
+        if batch is None:
+            yield file_paths[file_index], written, file_digests.pop(file_index)
+            written = 0
+            continue
+
+        for i, (text_hash, cleaned) in enumerate(batch):
+            keys = band_keys[i] if band_keys is not None else None
+            if writer.add_text(cleaned, text_hash=text_hash, band_keys=keys):
                 written += 1
 
-    return written
 
+def process_articles(
+    writer: StreamingShardWriter,
+    file_path: Path,
+    pool: Optional[Pool] = None,
+    workers: int = 1,
+) -> int:
+    """Clean, hash and write every article of a single raw file."""
+    return sum(count for _, count, _ in process_files(writer, [file_path], pool, workers))
+
+
+def load_dedup_state(
+    manifest: Manifest,
+    near_dedup_filter: Optional[NearDuplicateFilter],
+    compression: Optional[str] = SaveData.compression,
+) -> Tuple[DedupIndex, Optional[NearDuplicateFilter]]:
+    """
+    Load the dedup indexes saved together with the manifest.
+        - Raises ValueError if they don't belong to the recorded output
+    """
+    if manifest.compression != compression:
+        raise ValueError(
+            f"shards were written with {manifest.compression or 'no compression'}, "
+            f"not {compression or 'no compression'}"
+        )
 
-def main() -> None:
-    """Main preprocessing pipeline."""
+    shard_index, offset = manifest.position
+    shard_path = with_codec(
+        os.path.join(Paths.PROCESSED_DATA_DIR, f"shard_{shard_index:04d}.txt"), compression
+    )
+    if not os.path.exists(shard_path):
+        raise ValueError(f"{shard_path} not found")
+    if compression is None and os.path.getsize(shard_path) < offset:
+        raise ValueError(f"{shard_path} is shorter than recorded")
+
+    dedup_index = DigestIndex.load(Paths.HASH_CACHE_FILE)
+    if len(dedup_index) != manifest.hash_count:
+        raise ValueError(f"{Paths.HASH_CACHE_FILE} does not match the manifest")
+
+    if near_dedup_filter is not None:
+        if manifest.near_dedup != near_dedup_filter.params():
+            raise ValueError("near dedup parameters changed since the last run")
+        near_dedup_filter.load(Paths.NEAR_DEDUP_CACHE_FILE)
+
+    return dedup_index, near_dedup_filter
+
+
+def main(
+    workers: int = ProcessConfig.workers,
+    near_dedup: bool = NearDedupConfig.enabled,
+    near_dedup_threshold: float = NearDedupConfig.threshold,
+    incremental: bool = False,
+    compression: Optional[str] = SaveData.compression,
+) -> None:
+    """
+    Main preprocessing pipeline.
+        - incremental: skip raw files recorded in the manifest and append to the existing shards
+        - compression: codec of the output shards (raw files are read whatever their codec)
+    """
     logger = Logger(path="process_data.main")
     logger.log("Starting data preprocessing...")
 
-    raw_files = sorted(Path(Paths.RAW_DATA_DIR).glob("*.txt"))
+    raw_files = text_files(Paths.RAW_DATA_DIR, "*.txt")
 
     if not raw_files:
         logger.log("No raw files found in " + Paths.RAW_DATA_DIR, level="ERROR")
         return
 
-    logger.log(f"Found {len(raw_files)} files to process")
+    near_dedup_filter = (
+        NearDuplicateFilter(MinHasher(threshold=near_dedup_threshold))
+        if near_dedup
+        else None
+    )
 
-    # Use context manager for safe cleanup
-    with StreamingShardWriter() as writer:
-        total_articles = 0
+    manifest = Manifest(Paths.MANIFEST_FILE)
+    dedup_index = None
+    resume_position = None
 
-        for raw_file in tqdm(raw_files, desc="Processing Files"):
+    if incremental:
+        previous = Manifest.load(Paths.MANIFEST_FILE)
+        if previous.position is None:
+            logger.log("No manifest found, processing everything", level="WARNING")
+        else:
             try:
-                count = process_articles(writer, raw_file)
-                total_articles += count
-                logger.log(f"Processed {raw_file.name}: {count} articles written")
+                dedup_index, near_dedup_filter = load_dedup_state(
+                    previous, near_dedup_filter, compression
+                )
+                manifest = previous
+                resume_position = previous.position
+                raw_files = manifest.pending_files(raw_files)
             except Exception as e:
-                logger.log(f"Error processing {raw_file}: {e}", level="ERROR")
-                # Continue with next file instead of crashing
-                continue
+                logger.log(f"Cannot resume ({e}), processing everything", level="WARNING")
 
-    logger.log(
-        f"Preprocessing complete! Total articles: {total_articles}", level="SUCCESS"
-    )
+        if not raw_files:
+            logger.log("All raw files are already processed", level="SUCCESS")
+            return
+
+    logger.log(f"Found {len(raw_files)} files to process with {workers} worker(s)")
+
+    with instrumented_run("process"):
+        pool = Pool(processes=workers) if workers > 1 else None
+        writer = None
+        raw_bytes = sum(path.stat().st_size for path in raw_files)
+        start_time = time.perf_counter()
+
+        # Use context manager for safe cleanup
+        try:
+            with StreamingShardWriter(
+                dedup_index=dedup_index,
+                near_dedup=near_dedup_filter,
+                resume_position=resume_position,
+                compression=compression,
+            ) as writer:
+                total_articles = 0
+                start = writer.position()
+
+                for raw_file, count, sha256 in tqdm(
+                    process_files(writer, raw_files, pool, workers),
+                    total=len(raw_files),
+                    desc="Processing Files",
+                ):
+                    end = writer.position()
+                    if sha256 is not None:
+                        manifest.record(raw_file, start, end, count, sha256)
+                    else:
+                        # What it wrote stays in the shards, the file is read again next run
+                        logger.log(
+                            f"{raw_file.name} was not read to the end, not recorded",
+                            level="WARNING",
+                        )
+                    start = end
+
+                    total_articles += count
+                    metrics.inc("process.raw_bytes", raw_file.stat().st_size)
+                    logger.log(f"Processed {raw_file.name}: {count} articles written")
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+            # The writer saved its dedup state on close, record the matching position
+            if writer is not None:
+                manifest.position = writer.position()
+                manifest.hash_count = len(writer.hashes_seen)
+                manifest.near_dedup = near_dedup_filter.params() if near_dedup_filter else None
+                manifest.compression = writer.compression
+                manifest.save()
+
+        elapsed = time.perf_counter() - start_time
+        logger.log(
+            f"Read {raw_bytes / (1024 * 1024):.1f} MB of raw files in {elapsed:.1f}s "
+            f"({raw_bytes / (1024 * 1024) / max(elapsed, 1e-9):.1f} MB/s)"
+        )
+        logger.log(
+            f"Preprocessing complete! Total articles: {total_articles}", level="SUCCESS"
+        )
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Clean, deduplicate and shard raw data")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=ProcessConfig.workers,
+        help="number of processes used to clean and hash articles",
+    )
+    parser.add_argument(
+        "--near-dedup",
+        action="store_true",
+        default=NearDedupConfig.enabled,
+        help="also drop near-duplicate articles (MinHash-LSH)",
+    )
+    parser.add_argument(
+        "--near-dedup-threshold",
+        type=float,
+        default=NearDedupConfig.threshold,
+        help="Jaccard similarity above which articles count as near duplicates",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only process new or changed raw files and append to the existing shards",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=CODEC_CHOICES,
+        default=SaveData.compression or "none",
+        help="codec of the output shards",
+    )
+    args = parser.parse_args()
+
+    main(
+        workers=args.workers,
+        near_dedup=args.near_dedup,
+        near_dedup_threshold=args.near_dedup_threshold,
+        incremental=args.incremental,
+        compression=parse_codec(args.compression),
+    )
@@ -0,0 +1,252 @@
+"""
+Byte-offset sidecar index of processed shards
+    - shard_XXXX.txt[.gz|.bz2|.xz] -> shard_XXXX.idx, a .npy array with one row per article:
+      (offset, length, hash) with offsets and lengths in uncompressed bytes
+    - ProcessedShard reads any article by index without scanning the shard
+    - partition / partition_shards split articles into byte-balanced ranges for workers
+"""
+
+import argparse
+import hashlib
+import os
+from array import array
+from pathlib import Path
+from typing import IO, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from src.config.config import Paths
+from src.utils.compression import CODECS, codec_of, strip_codec, text_files
+from src.utils.logger import Logger
+
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u8"), ("hash", "<u8")])
+DELIMITER = b"\n\n"
+
+
+def index_path(shard_path) -> str:
+    """Sidecar index path of a shard (shard_0003.txt.gz -> shard_0003.idx)."""
+    return os.path.splitext(strip_codec(shard_path))[0] + ".idx"
+
+
+def hash_key(text_hash: str) -> int:
+    """First 64 bits of a hex digest, as stored in the index."""
+    return int(text_hash[:16], 16)
+
+
+def open_binary(path) -> IO[bytes]:
+    """Open a shard for reading bytes, decompressing according to its suffix."""
+    codec = codec_of(path)
+    if codec is None:
+        return open(path, "rb")
+    return CODECS[codec][1](path, "rb")
+
+
+class ShardIndexBuilder:
+    """
+    Collects the index rows of the shard being written.
+        - Rows are kept in compact arrays, not Python lists of tuples
+        - save writes atomically, so an index is complete or absent
+    """
+
+    def __init__(self) -> None:
+        self.offsets = array("Q")
+        self.lengths = array("Q")
+        self.hashes = array("Q")
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def append(self, offset: int, length: int, text_hash: str) -> None:
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.hashes.append(hash_key(text_hash))
+
+    def to_array(self) -> np.ndarray:
+        entries = np.empty(len(self), dtype=INDEX_DTYPE)
+        entries["offset"] = np.frombuffer(self.offsets, dtype=np.uint64)
+        entries["length"] = np.frombuffer(self.lengths, dtype=np.uint64)
+        entries["hash"] = np.frombuffer(self.hashes, dtype=np.uint64)
+        return entries
+
+    @classmethod
+    def from_array(cls, entries: np.ndarray) -> "ShardIndexBuilder":
+        builder = cls()
+        builder.offsets.frombytes(entries["offset"].astype("<u8").tobytes())
+        builder.lengths.frombytes(entries["length"].astype("<u8").tobytes())
+        builder.hashes.frombytes(entries["hash"].astype("<u8").tobytes())
+        return builder
+
+    def save(self, path: str) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, self.to_array())
+        os.replace(tmp_path, path)
+
+
+def scan_shard(shard_path) -> np.ndarray:
+    """
+    Build the index of a shard by reading it once.
+        - For shards written before indexes existed, or whose index is missing
+    """
+    builder = ShardIndexBuilder()
+    pending = b""
+    pending_offset = 0  # offset of pending in the shard
+
+    def add(article: bytes, offset: int) -> None:
+        if article:
+            builder.append(offset, len(article), hashlib.sha256(article).hexdigest())
+
+    with open_binary(shard_path) as f:
+        while chunk := f.read(1024 * 1024):
+            buffer = pending + chunk
+            start = 0
+            index = buffer.find(DELIMITER, max(len(pending) - 1, 0))
+            while index != -1:
+                add(buffer[start:index], pending_offset + start)
+                start = index + len(DELIMITER)
+                index = buffer.find(DELIMITER, start)
+            pending = buffer[start:]
+            pending_offset += start
+
+    add(pending, pending_offset)
+    return builder.to_array()
+
+
+def partition(lengths: np.ndarray, parts: int) -> List[Tuple[int, int]]:
+    """
+    Split articles into parts contiguous (start, end) ranges of about equal bytes.
+        - Boundaries are found with a binary search over cumulative lengths
+    """
+    if parts < 1:
+        raise ValueError(f"parts must be positive, got {parts}")
+
+    ends = np.cumsum(lengths, dtype=np.uint64)
+    total = int(ends[-1]) if len(ends) else 0
+    targets = [total * part // parts for part in range(1, parts)]
+    cuts = [0, *np.searchsorted(ends, targets, side="left").tolist(), len(lengths)]
+    cuts = np.maximum.accumulate(np.minimum(cuts, len(lengths))).tolist()
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+class ProcessedShard:
+    """
+    Random access to the articles of a processed shard through its sidecar index.
+        - offsets / lengths / hashes: read-only arrays, one entry per article
+        - Plain shards are read with a seek per article (O(1)); compressed shards can
+          be read too, but every seek decompresses from the start of the stream
+        - Builds the index by scanning the shard if the sidecar is missing
+    """
+
+    def __init__(self, shard_path) -> None:
+        self.shard_path = str(shard_path)
+        self.index_path = index_path(self.shard_path)
+
+        if os.path.exists(self.index_path):
+            entries = np.load(self.index_path, mmap_mode="r")
+        else:
+            entries = scan_shard(self.shard_path)
+
+        self.offsets = entries["offset"]
+        self.lengths = entries["length"]
+        self.hashes = entries["hash"]
+        self._file: Optional[IO[bytes]] = None
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getstate__(self) -> dict:
+        """Open file handles are reopened in the receiving process instead of pickled."""
+        state = self.__dict__.copy()
+        state["_file"] = None
+        return state
+
+    def num_bytes(self) -> int:
+        return int(self.lengths.sum())
+
+    def article(self, index: int) -> str:
+        """Text of article index."""
+        if not -len(self) <= index < len(self):
+            raise IndexError(f"Article {index} out of range for {len(self)} articles")
+
+        if self._file is None:
+            self._file = open_binary(self.shard_path)
+        self._file.seek(int(self.offsets[index]))
+        return self._file.read(int(self.lengths[index])).decode("utf-8")
+
+    def articles(self, start: int = 0, end: Optional[int] = None) -> Iterator[str]:
+        """
+        Articles [start, end) in order.
+            - Reads the whole range with one seek, so a worker's slice streams sequentially
+        """
+        end = len(self) if end is None else min(end, len(self))
+        if start >= end:
+            return
+
+        if self._file is None:
+            self._file = open_binary(self.shard_path)
+        base = int(self.offsets[start])
+        self._file.seek(base)
+        data = self._file.read(int(self.offsets[end - 1] + self.lengths[end - 1]) - base)
+
+        for offset, length in zip(
+            self.offsets[start:end].tolist(), self.lengths[start:end].tolist()
+        ):
+            yield data[offset - base : offset - base + length].decode("utf-8")
+
+    def partition(self, parts: int) -> List[Tuple[int, int]]:
+        """Byte-balanced (start, end) article ranges of this shard."""
+        return partition(self.lengths, parts)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def partition_shards(shards: List[ProcessedShard], parts: int) -> List[List[Tuple[int, int, int]]]:
+    """
+    Split the articles of several shards into parts of about equal bytes.
+        - Returns, per part, a list of (shard number in shards, start, end) ranges
+        - A part may cover the end of one shard and the start of the next
+    """
+    lengths = np.concatenate([shard.lengths for shard in shards]) if shards else np.empty(0)
+    shard_starts = np.cumsum([0, *(len(shard) for shard in shards)])
+
+    result = []
+    for start, end in partition(lengths, parts):
+        ranges = []
+        for i, shard in enumerate(shards):
+            lo = max(start, int(shard_starts[i])) - int(shard_starts[i])
+            hi = min(end, int(shard_starts[i + 1])) - int(shard_starts[i])
+            if lo < hi:
+                ranges.append((i, lo, hi))
+        result.append(ranges)
+    return result
+
+
+def get_processed_shards(shard_dir: str = Paths.PROCESSED_DATA_DIR) -> List[ProcessedShard]:
+    """Every processed shard in shard_dir, in order, with its index loaded."""
+    return [ProcessedShard(path) for path in text_files(shard_dir, "shard_*.txt")]
+
+
+def build_indexes(shard_dir: str = Paths.PROCESSED_DATA_DIR, overwrite: bool = False) -> None:
+    """Write the sidecar index of every shard in shard_dir that has none yet."""
+    logger = Logger(path="shard_index.build_indexes")
+
+    for shard_path in text_files(shard_dir, "shard_*.txt"):
+        path = index_path(shard_path)
+        if os.path.exists(path) and not overwrite:
+            continue
+
+        entries = scan_shard(shard_path)
+        ShardIndexBuilder.from_array(entries).save(path)
+        logger.log(f"Indexed {Path(shard_path).name}: {len(entries)} articles")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build sidecar indexes of processed shards")
+    parser.add_argument("--shard-dir", default=Paths.PROCESSED_DATA_DIR)
+    parser.add_argument("--overwrite", action="store_true", help="rebuild existing indexes")
+    args = parser.parse_args()
+
+    build_indexes(shard_dir=args.shard_dir, overwrite=args.overwrite)
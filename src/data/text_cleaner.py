@@ -0,0 +1,139 @@
+"""
+Rule-based text cleaning engine used by process_data.clean_text
+    - Rules are compiled once, not looked up in re's cache on every call
+    - A rule only runs when its trigger substring occurs in the text (a C-speed scan),
+      so rules for other corpora cost next to nothing on articles they don't apply to
+    - Rules sharing a group are fused into one alternation pattern, i.e. one pass
+    - Whitespace is collapsed with str.split / str.join instead of a regex pass
+"""
+
+import re
+from typing import Callable, List, Optional, Sequence, Union
+
+Replacement = Union[str, Callable[["re.Match"], str]]
+
+
+class CleaningRule:
+    """
+    One substitution applied by TextCleaner.
+        - pattern: regex, replaced by replacement (a string or a function of the match)
+        - trigger: substring every match contains; the rule is skipped if it is absent
+        - group: consecutive rules with the same group run as one fused pass. Only group
+          rules whose matches cannot create or destroy each other's (e.g. removing "<tag>"
+          can create "[[...]]", so those two stay separate). Their patterns must not use
+          numeric backreferences; replacements may
+    """
+
+    def __init__(
+        self,
+        pattern: str,
+        replacement: Replacement = "",
+        trigger: Optional[str] = None,
+        group: Optional[str] = None,
+        flags: int = 0,
+    ) -> None:
+        self.pattern = pattern
+        self.replacement = replacement
+        self.trigger = trigger
+        self.group = group
+        self.flags = flags
+
+    def __repr__(self) -> str:
+        return f"CleaningRule({self.pattern!r}, {self.replacement!r}, trigger={self.trigger!r})"
+
+
+class _Pass:
+    """A compiled substitution pass: one rule, or a fused group of rules."""
+
+    def __init__(self, rules: List[CleaningRule]) -> None:
+        triggers = [rule.trigger for rule in rules]
+        # A fused pass can only be skipped when none of its rules could match
+        self.triggers = None if None in triggers else triggers
+
+        if len(rules) == 1:
+            rule = rules[0]
+            self.regex = re.compile(rule.pattern, rule.flags)
+            self.replacement = rule.replacement
+            return
+
+        self.regex = re.compile(
+            "|".join(f"(?P<r{i}>{rule.pattern})" for i, rule in enumerate(rules)),
+            rules[0].flags,
+        )
+        if all(rule.replacement == "" for rule in rules):
+            self.replacement = ""
+            return
+
+        # Group numbers shift once fused, so replacements see a match of their own pattern
+        own = [(re.compile(rule.pattern, rule.flags), rule.replacement) for rule in rules]
+
+        def replace(match: "re.Match") -> str:
+            regex, replacement = own[int(match.lastgroup[1:])]
+            own_match = regex.match(match.string, match.start(), match.end())
+            if callable(replacement):
+                return replacement(own_match)
+            return own_match.expand(replacement)
+
+        self.replacement = replace
+
+    def __call__(self, text: str) -> str:
+        if self.triggers is not None and not any(t in text for t in self.triggers):
+            return text
+        return self.regex.sub(self.replacement, text)
+
+
+class TextCleaner:
+    """
+    Applies a list of CleaningRules in order, then normalizes whitespace.
+        - normalize_whitespace: collapse whitespace runs to one space and strip the ends
+          (same result as re.sub(r"\\s+", " ", text).strip())
+        - Picklable (when the replacements are), so it can be sent to worker processes
+    """
+
+    def __init__(self, rules: Sequence[CleaningRule], normalize_whitespace: bool = True) -> None:
+        self.rules = list(rules)
+        self.normalize_whitespace = normalize_whitespace
+        self.passes = self._compile(self.rules)
+
+    @staticmethod
+    def _compile(rules: List[CleaningRule]) -> List[_Pass]:
+        passes = []
+        pending: List[CleaningRule] = []
+        for rule in rules:
+            if pending and (rule.group is None or rule.group != pending[-1].group):
+                passes.append(_Pass(pending))
+                pending = []
+            pending.append(rule)
+        if pending:
+            passes.append(_Pass(pending))
+        return passes
+
+    def __getstate__(self) -> dict:
+        """Compiled passes hold closures, rebuild them in the receiving process."""
+        return {"rules": self.rules, "normalize_whitespace": self.normalize_whitespace}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(**state)
+
+    def extend(self, rules: Sequence[CleaningRule]) -> "TextCleaner":
+        """New cleaner with extra rules applied after these ones."""
+        return TextCleaner(self.rules + list(rules), self.normalize_whitespace)
+
+    def __call__(self, text: str) -> str:
+        for cleaning_pass in self.passes:
+            text = cleaning_pass(text)
+
+        if self.normalize_whitespace:
+            # str.split() and \s agree on what is whitespace
+            text = " ".join(text.split())
+        return text
+
+
+WIKIPEDIA_RULES = [
+    # Remove HTML/XML tags
+    CleaningRule(r"<[^>]+>", trigger="<"),
+    # Remove Wiki markup like [[Category:...]] or [[File:...]]
+    CleaningRule(r"\[\[.*?\]\]", trigger="[["),
+]
+
+wikipedia_cleaner = TextCleaner(WIKIPEDIA_RULES)
@@ -0,0 +1,174 @@
+"""
+Packed-sequence training data on top of binary token shards
+    - PackedTokenDataset: all token shards as one stream cut into fixed windows (no padding)
+    - PackedSampler: deterministic per-epoch shuffle, resumable, split across ranks
+    - rank_shards: deterministic split of the shard files themselves across ranks
+"""
+
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+import torch.distributed as dist
+from torch.utils.data import Dataset, Sampler
+
+from src.config.config import DatasetConfig, Paths
+from src.tokenization.token_shards import TokenShard, get_token_shards
+
+
+class PackedTokenDataset(Dataset):
+    """
+    Fixed-length windows over the concatenated tokens of every shard.
+        - Documents are packed back to back, their <s>/</s> tokens mark the boundaries
+        - Sample i is tokens [i * L, i * L + L + 1), split into inputs and next-token targets
+        - Shards are memory-mapped lazily in each process, so pickling for workers is cheap
+        - Inputs and targets are views of the same mapped window (no copy), except for the
+          rare window that spans two shards
+    """
+
+    def __init__(
+        self,
+        shard_paths: Optional[List[str]] = None,
+        sequence_length: int = DatasetConfig.sequence_length,
+    ) -> None:
+        self.shard_paths = shard_paths if shard_paths is not None else get_token_shards()
+        if not self.shard_paths:
+            raise FileNotFoundError(f"No token shards found in {Paths.TOKENIZED_DATA_DIR}")
+
+        self.sequence_length = sequence_length
+        self._shards: Optional[List[TokenShard]] = None
+
+        lengths = [len(shard) for shard in self._open_shards()]
+        self.shard_starts = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        self.total_tokens = int(self.shard_starts[-1])
+
+    def _open_shards(self) -> List[TokenShard]:
+        if self._shards is None:
+            # Copy-on-write maps are writable, so torch.from_numpy accepts them without copying
+            self._shards = [TokenShard(path, mode="c") for path in self.shard_paths]
+        return self._shards
+
+    def __getstate__(self) -> dict:
+        """Memory maps are reopened in the receiving process instead of pickled."""
+        state = self.__dict__.copy()
+        state["_shards"] = None
+        return state
+
+    def __len__(self) -> int:
+        return max(0, (self.total_tokens - 1) // self.sequence_length)
+
+    def window(self, start: int, length: int) -> np.ndarray:
+        """Tokens [start, start + length) of the concatenated stream."""
+        shards = self._open_shards()
+        shard = int(np.searchsorted(self.shard_starts, start, side="right")) - 1
+        offset = start - int(self.shard_starts[shard])
+
+        if offset + length <= len(shards[shard]):
+            return shards[shard].tokens[offset : offset + length]
+
+        # Window spans shard boundaries
+        pieces = []
+        while length > 0:
+            piece = shards[shard].tokens[offset : offset + length]
+            pieces.append(piece)
+            length -= len(piece)
+            shard += 1
+            offset = 0
+        return np.concatenate(pieces)
+
+    def __getitem__(self, index: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        if not 0 <= index < len(self):
+            raise IndexError(f"Sample {index} out of range for {len(self)} samples")
+
+        tokens = torch.from_numpy(
+            self.window(index * self.sequence_length, self.sequence_length + 1)
+        )
+        return tokens[:-1], tokens[1:]
+
+
+class PackedSampler(Sampler[int]):
+    """
+    Deterministic shuffling sampler for PackedTokenDataset.
+        - The order only depends on seed and epoch, so every rank derives the same permutation
+        - Each rank takes every world_size-th sample; the tail is dropped so ranks stay in step
+        - start_index skips samples this rank already consumed (resume mid-epoch)
+        - num_samples caps the samples per rank and epoch, for ranks reading different datasets
+          that still have to take the same number of steps
+        - DataLoader workers need no extra handling: they receive indices from this sampler
+    """
+
+    def __init__(
+        self,
+        dataset: PackedTokenDataset,
+        shuffle: bool = True,
+        seed: int = DatasetConfig.seed,
+        rank: Optional[int] = None,
+        world_size: Optional[int] = None,
+        start_index: int = 0,
+        num_samples: Optional[int] = None,
+    ) -> None:
+        distributed = dist.is_available() and dist.is_initialized()
+        self.rank = rank if rank is not None else (dist.get_rank() if distributed else 0)
+        self.world_size = (
+            world_size if world_size is not None else (dist.get_world_size() if distributed else 1)
+        )
+        if not 0 <= self.rank < self.world_size:
+            raise ValueError(f"Rank {self.rank} out of range for world size {self.world_size}")
+
+        self.num_samples = len(dataset) // self.world_size
+        self.population = self.num_samples * self.world_size  # sample indices drawn from
+        if num_samples is not None and num_samples < self.num_samples:
+            self.num_samples = num_samples
+            self.population = len(dataset)  # a different subset every epoch
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        self.start_index = start_index
+
+    def set_epoch(self, epoch: int) -> None:
+        """Select the shuffle of a new epoch, starting it from its first sample."""
+        self.epoch = epoch
+        self.start_index = 0
+
+    def indices(self) -> np.ndarray:
+        """Every sample index of this rank for the current epoch."""
+        total = self.num_samples * self.world_size
+        if self.shuffle:
+            order = np.random.default_rng((self.seed, self.epoch)).permutation(self.population)
+            order = order[:total]
+        else:
+            order = np.arange(total)
+        return order[self.rank :: self.world_size]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.indices()[self.start_index :].tolist())
+
+    def __len__(self) -> int:
+        return self.num_samples - self.start_index
+
+    def state_dict(self, samples_consumed: int) -> Dict[str, int]:
+        """State to resume after samples_consumed more samples of this epoch."""
+        return {"epoch": self.epoch, "start_index": self.start_index + samples_consumed}
+
+    def load_state_dict(self, state: Dict[str, int]) -> None:
+        self.epoch = state["epoch"]
+        self.start_index = state["start_index"]
+
+
+def rank_shards(shard_paths: List[str], rank: int, world_size: int) -> List[str]:
+    """
+    Token shards read by rank: largest first, each to the rank with the fewest bytes so far.
+        - Only depends on the paths and file sizes, so every rank computes the same split and
+          no shard is read by two ranks
+    """
+    if len(shard_paths) < world_size:
+        raise ValueError(f"{len(shard_paths)} shard(s) can't be split over {world_size} ranks")
+
+    loads = [0] * world_size
+    assignment: List[List[str]] = [[] for _ in range(world_size)]
+    for path in sorted(shard_paths, key=lambda p: (-os.path.getsize(p), p)):
+        target = loads.index(min(loads))
+        assignment[target].append(path)
+        loads[target] += os.path.getsize(path)
+    return sorted(assignment[rank])
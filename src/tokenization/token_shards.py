@@ -0,0 +1,287 @@
+"""
+Pre-tokenized binary token shards built from processed text shards
+    - shard_XXXX.txt[.gz|.bz2|.xz] -> tokens_XXXX.bin (header + flat uint16 token ids)
+                     -> tokens_XXXX.idx (uint64 document start offsets, num_docs + 1 entries)
+    - Articles are encoded with BPETokenizer.encode_batch across a process pool; workers read
+      byte-balanced article ranges themselves through the shards' sidecar indexes
+    - TokenShard memory-maps a shard, so training reads tokens without copying them
+"""
+
+import argparse
+import os
+import struct
+from itertools import chain
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
+from src.config.config import Paths, TokenShardConfig
+from src.data.process_data import ordered_imap, shard_number
+from src.data.shard_index import ProcessedShard, get_processed_shards, partition_shards
+from src.tokenization.tokenizing import BPETokenizer, load_tokenizer
+from src.utils.logger import Logger
+from src.utils.metrics import instrumented_run, metrics
+
+TOKEN_DTYPE = np.uint16
+MAGIC = b"TOKS"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQQ")  # magic, version, itemsize, vocab_size, num_tokens, num_docs
+
+_worker_tokenizer: Optional[BPETokenizer] = None
+_worker_shards: Dict[str, ProcessedShard] = {}
+
+
+def token_shard_paths(shard_index: int, output_dir: str) -> Tuple[str, str]:
+    """Return the (.bin, .idx) paths of a token shard."""
+    stem = os.path.join(output_dir, f"tokens_{shard_index:04d}")
+    return stem + ".bin", stem + ".idx"
+
+
+class TokenShardWriter:
+    """
+    Streams token ids of one shard to disk.
+        - Writes to temporary files and renames them on close, so a shard is complete or absent
+        - The header is written last, once the token and document counts are known
+    """
+
+    def __init__(self, shard_index: int, vocab_size: int, output_dir: str) -> None:
+        self.shard_index = shard_index
+        self.bin_path, self.idx_path = token_shard_paths(shard_index, output_dir)
+        self.vocab_size = vocab_size
+        self.num_tokens = 0
+        self.doc_offsets = [0]
+
+        self.file = open(self.bin_path + ".tmp", "wb")
+        self.file.write(bytes(HEADER.size))  # placeholder, filled in by close()
+
+    def append(self, tokens: np.ndarray, lengths: List[int]) -> None:
+        """Append the tokens of a batch of documents (lengths of each document)."""
+        tokens.astype(TOKEN_DTYPE, copy=False).tofile(self.file)
+        for length in lengths:
+            self.num_tokens += length
+            self.doc_offsets.append(self.num_tokens)
+
+    def close(self) -> None:
+        self.file.seek(0)
+        self.file.write(
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                np.dtype(TOKEN_DTYPE).itemsize,
+                self.vocab_size,
+                self.num_tokens,
+                len(self.doc_offsets) - 1,
+            )
+        )
+        self.file.close()
+
+        np.asarray(self.doc_offsets, dtype=np.uint64).tofile(self.idx_path + ".tmp")
+        os.replace(self.idx_path + ".tmp", self.idx_path)
+        os.replace(self.bin_path + ".tmp", self.bin_path)
+
+
+class TokenShard:
+    """
+    Read-only, memory-mapped view of a token shard.
+        - tokens: uint16 memmap of every token id in the shard
+        - doc_offsets: start of every document in tokens (plus the total at the end)
+        - mode: "r", or "c" (copy-on-write) when consumers need writable arrays (torch.from_numpy)
+    """
+
+    def __init__(self, bin_path: str, mode: str = "r") -> None:
+        self.bin_path = bin_path
+        self.idx_path = os.path.splitext(bin_path)[0] + ".idx"
+
+        with open(bin_path, "rb") as f:
+            magic, version, itemsize, vocab_size, num_tokens, num_docs = HEADER.unpack(
+                f.read(HEADER.size)
+            )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{bin_path} is not a token shard")
+        if itemsize != np.dtype(TOKEN_DTYPE).itemsize:
+            raise ValueError(f"{bin_path} stores {itemsize}-byte tokens")
+
+        self.vocab_size = vocab_size
+        self.num_docs = num_docs
+        self.tokens = (
+            np.memmap(bin_path, dtype=TOKEN_DTYPE, mode=mode, offset=HEADER.size, shape=(num_tokens,))
+            if num_tokens
+            else np.empty(0, dtype=TOKEN_DTYPE)
+        )
+        self.doc_offsets = np.fromfile(self.idx_path, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def document(self, index: int) -> np.ndarray:
+        """Token ids of one document (a view, no copy)."""
+        return self.tokens[self.doc_offsets[index] : self.doc_offsets[index + 1]]
+
+
+def get_token_shards(token_dir: str = Paths.TOKENIZED_DATA_DIR) -> List[str]:
+    """Sorted .bin paths of every token shard in token_dir."""
+    return sorted(str(path) for path in Path(token_dir).glob("tokens_*.bin"))
+
+
+def remove_stale_token_shards(output_dir: str, keep: Set[int]) -> None:
+    """Delete the token shards of an earlier run whose index this run did not write."""
+    logger = Logger(path="token_shards.remove_stale_token_shards")
+    for path in Path(output_dir).glob("tokens_*"):
+        if path.suffix in (".bin", ".idx") and int(path.stem.split("_")[1]) not in keep:
+            path.unlink()
+            logger.log(f"Removed stale token shard: {path}", level="WARNING")
+
+
+def _init_worker(tokenizer_path: str, rust_parallelism: bool = False) -> None:
+    """Load the tokenizer once per worker process."""
+    global _worker_tokenizer
+
+    if not rust_parallelism:
+        # Parallelism comes from the processes, keep the Rust thread pool out of the way
+        os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    _worker_tokenizer = BPETokenizer()
+    _worker_tokenizer.load(tokenizer_path)
+    _worker_tokenizer.tokenizer.no_truncation()  # whole articles, not max_sequence_length
+
+
+def _encode(articles: List[str]) -> Tuple[np.ndarray, List[int]]:
+    """Flat token ids and per-document lengths of a batch of articles."""
+    ids = _worker_tokenizer.encode_batch(articles)
+    lengths = [len(doc) for doc in ids]
+    tokens = np.fromiter(chain.from_iterable(ids), dtype=TOKEN_DTYPE, count=sum(lengths))
+    return tokens, lengths
+
+
+def encode_batch_task(
+    task: Tuple[int, Optional[List[str]]],
+) -> Tuple[int, Optional[np.ndarray], Optional[List[int]]]:
+    """Worker entry point: encodes a batch of articles into flat tokens and lengths."""
+    shard_index, articles = task
+    if articles is None:  # end-of-shard marker
+        return shard_index, None, None
+
+    return (shard_index, *_encode(articles))
+
+
+def encode_ranges_task(
+    ranges: List[Tuple[int, str, int, int]],
+) -> List[Tuple[int, np.ndarray, List[int]]]:
+    """
+    Worker entry point: reads and encodes (shard index, shard path, start, end) article ranges.
+        - Shards stay open in the worker; its ranges of a shard come in order, so a compressed
+          shard is only ever seeked forward
+    """
+    results = []
+    for shard_index, shard_path, start, end in ranges:
+        if shard_path not in _worker_shards:
+            _worker_shards[shard_path] = ProcessedShard(shard_path)
+        articles = list(_worker_shards[shard_path].articles(start, end))
+        results.append((shard_index, *_encode(articles)))
+    return results
+
+
+def tokenize_shards(
+    workers: int = TokenShardConfig.workers,
+    tokenizer_path: str = Paths.TOKENIZER_FILE,
+    input_dir: str = Paths.PROCESSED_DATA_DIR,
+    output_dir: str = Paths.TOKENIZED_DATA_DIR,
+) -> int:
+    """
+    Tokenize every processed shard into a binary token shard, returns total tokens.
+        - Work is split with partition_shards into parts of about batch_size articles' bytes
+        - Shards without articles get no token shard
+    """
+    logger = Logger(path="token_shards.tokenize_shards")
+
+    shards = get_processed_shards(input_dir)
+    if not shards:
+        logger.log(f"No shards found in {input_dir}", level="ERROR")
+        return 0
+
+    vocab_size = load_tokenizer(tokenizer_path).get_vocab_size()
+    if vocab_size > np.iinfo(TOKEN_DTYPE).max + 1:
+        raise ValueError(f"Vocab size {vocab_size} does not fit in {np.dtype(TOKEN_DTYPE).name}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    logger.log(f"Tokenizing {len(shards)} shard(s) with {workers} worker(s)")
+
+    numbers = [shard_number(shard.shard_path) for shard in shards]
+    num_articles = sum(len(shard) for shard in shards)
+    parts = partition_shards(shards, max(1, -(-num_articles // TokenShardConfig.batch_size)))
+    tasks = (
+        [(numbers[i], shards[i].shard_path, start, end) for i, start, end in part]
+        for part in parts
+    )
+
+    with instrumented_run("tokenize"):
+        if workers > 1:
+            pool = Pool(processes=workers, initializer=_init_worker, initargs=(tokenizer_path,))
+        else:
+            pool = None
+            _init_worker(tokenizer_path, rust_parallelism=True)
+
+        total_tokens = 0
+        written: Set[int] = set()
+        writer = None
+
+        def close_writer() -> None:
+            nonlocal total_tokens
+            writer.close()
+            logger.log(
+                f"Wrote {writer.bin_path}: {writer.num_tokens} tokens, "
+                f"{len(writer.doc_offsets) - 1} documents"
+            )
+            total_tokens += writer.num_tokens
+            written.add(writer.shard_index)
+
+        try:
+            for results in tqdm(
+                ordered_imap(pool, encode_ranges_task, tasks, max_pending=workers * 4),
+                total=len(parts),
+                desc="Tokenizing shards",
+            ):
+                for shard_index, tokens, lengths in results:
+                    if writer is not None and writer.shard_index != shard_index:
+                        close_writer()
+                        writer = None
+                    if writer is None:
+                        writer = TokenShardWriter(shard_index, vocab_size, output_dir)
+
+                    writer.append(tokens, lengths)
+                    metrics.inc("tokenize.tokens", len(tokens))
+                    metrics.inc("tokenize.documents", len(lengths))
+
+            if writer is not None:
+                close_writer()
+            remove_stale_token_shards(output_dir, written)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            for shard in _worker_shards.values():
+                shard.close()
+            _worker_shards.clear()
+
+        logger.log(
+            f"Tokenization complete! {total_tokens} tokens "
+            f"({total_tokens * np.dtype(TOKEN_DTYPE).itemsize / (1024 * 1024):.1f} MB)",
+            level="SUCCESS",
+        )
+        return total_tokens
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tokenize processed shards into binary token shards")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=TokenShardConfig.workers,
+        help="number of processes running the tokenizer",
+    )
+    args = parser.parse_args()
+
+    tokenize_shards(workers=args.workers)
@@ -3,21 +3,49 @@ BPE Tokenizer that trains on processed shards from Paths.PROCESSED_DATA_DIR
     - Saves to Paths.TOKENIZER_FILE in JSON format
 """
 
+import argparse
 import os
 import glob
-from typing import List, Optional, Union
+import random
+import time
+from collections import OrderedDict
+from itertools import compress
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence as SequenceType, Tuple, Union
 
+import numpy as np
 from tokenizers import Tokenizer, models, pre_tokenizers, trainers, processors
 from tokenizers.normalizers import NFD, Lowercase, StripAccents, Sequence
 
-from src.config.config import Paths, ModelConfig
+from src.config.config import Paths, ModelConfig, ProcessConfig, TokenizerConfig
+from src.data.process_data import iter_articles
+from src.data.shard_index import ProcessedShard, partition_shards
+from src.utils.compression import codec_of
 from src.utils.logger import Logger
+from src.utils.metrics import instrumented_run, metrics
+
+
+TokenIds = Union[List[int], np.ndarray]
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_size(size: str) -> int:
+    """Parse a byte count such as "500M" or "5G" (binary units)."""
+    size = size.strip().upper().removesuffix("B")
+    unit = size[-1] if size and size[-1] in SIZE_UNITS else ""
+    return int(float(size[: len(size) - len(unit)]) * SIZE_UNITS[unit])
 
 
 class BPETokenizer:
-    def __init__(self):
+    def __init__(self, cache_size: int = TokenizerConfig.cache_size):
         self.logger = Logger(__name__)
         self.tokenizer = None
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[Tuple[str, bool], Tuple[int, ...]]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.training_seconds = 0.0
         self._ensure_directories()
         
     def _ensure_directories(self):
@@ -46,6 +74,7 @@ class BPETokenizer:
             shards.extend(glob.glob(pattern))
         
         shards = sorted(list(set(shards)))  # Remove duplicates, sort
+        shards = [s for s in shards if not s.endswith((".idx", ".tmp"))]  # Sidecar indexes
         
         if shards:
             self.logger.log(f"Found {len(shards)} shard(s) in {Paths.PROCESSED_DATA_DIR}", "INFO")
@@ -72,7 +101,66 @@ class BPETokenizer:
         
         return tokenizer
     
-    def train(self, files: Union[str, List[str], None] = None, vocab_size: Optional[int] = None) -> None:
+    def iter_sample(
+        self, files: List[str], sample_bytes: int, seed: int = TokenizerConfig.sample_seed
+    ) -> Iterator[str]:
+        """
+        Stream a reproducible sample of about sample_bytes of articles from the shards.
+            - Every shard keeps the same fraction of its articles, chosen by an RNG seeded
+              with (seed, shard name), so adding shards doesn't change the others' picks
+            - Stops once the byte budget is reached
+            - Sizes come from the sidecar indexes (uncompressed bytes, like the budget)
+            - Shards are read in byte-balanced ranges (partition_shards), ranges without a
+              picked article are skipped
+        """
+        shards = [ProcessedShard(f) for f in files]
+        total_bytes = sum(shard.num_bytes() for shard in shards)
+        keep = min(1.0, sample_bytes / total_bytes) if total_bytes else 1.0
+        taken_bytes = 0
+        taken_articles = 0
+        
+        self.logger.log(
+            f"Sampling {sample_bytes / 1024**2:.1f} MB of {total_bytes / 1024**2:.1f} MB "
+            f"({keep:.2%} of articles, seed {seed})", "INFO"
+        )
+        
+        rngs = [random.Random(f"{seed}:{os.path.basename(f)}") for f in files]
+        parts = max(1, -(-total_bytes // ProcessConfig.read_buffer_size))
+        
+        def picked_articles() -> Iterator[str]:
+            for part in partition_shards(shards, parts):
+                for i, start, end in part:
+                    picks = [rngs[i].random() < keep for _ in range(end - start)]
+                    if any(picks):
+                        yield from compress(shards[i].articles(start, end), picks)
+        
+        try:
+            for article in picked_articles():
+                yield article
+                taken_bytes += len(article.encode("utf-8"))
+                taken_articles += 1
+                if taken_bytes >= sample_bytes:
+                    break
+        finally:
+            for shard in shards:
+                shard.close()
+        
+        self.logger.log(f"Sampled {taken_articles} articles ({taken_bytes / 1024**2:.1f} MB)", "INFO")
+    
+    def create_trainer(self, vocab_size: int) -> trainers.BpeTrainer:
+        return trainers.BpeTrainer(
+            vocab_size=vocab_size,
+            special_tokens=["<pad>", "<s>", "</s>", "<unk>", "<mask>"],
+            min_frequency=2,
+            show_progress=True
+        )
+    
+    def train(
+        self,
+        files: Union[str, List[str], None] = None,
+        vocab_size: Optional[int] = None,
+        sample_bytes: Optional[int] = TokenizerConfig.sample_bytes,
+    ) -> None:
         if files is None:
             files = self.get_processed_shards()
             if not files:
@@ -86,15 +174,18 @@ class BPETokenizer:
         self.logger.log(f"Target vocab: {vocab_size}, Max length: {ModelConfig.max_sequence_length}", "INFO")
         
         self.tokenizer = self.create_tokenizer(vocab_size)
+        trainer = self.create_trainer(vocab_size)
+        start = time.perf_counter()
         
-        trainer = trainers.BpeTrainer(
-            vocab_size=vocab_size,
-            special_tokens=["<pad>", "<s>", "</s>", "<unk>", "<mask>"],
-            min_frequency=2,
-            show_progress=True
-        )
-        
-        self.tokenizer.train(files, trainer)
+        with metrics.span("tokenizer.train"):
+            if sample_bytes is None and not any(codec_of(f) for f in files):
+                self.tokenizer.train(files, trainer)
+            elif sample_bytes is None:
+                # The Rust trainer reads plain files only, stream compressed shards instead
+                articles = (a for f in files for a in iter_articles(Path(f)) if a)
+                self.tokenizer.train_from_iterator(articles, trainer)
+            else:
+                self.tokenizer.train_from_iterator(self.iter_sample(files, sample_bytes), trainer)
         
         self.tokenizer.post_processor = processors.TemplateProcessing(
             single="<s> $A </s>",
@@ -105,7 +196,11 @@ class BPETokenizer:
             ],
         )
         
-        self.logger.log(f"Training complete. Vocab size: {self.get_vocab_size()}", "SUCCESS")
+        self.training_seconds = time.perf_counter() - start
+        self.logger.log(
+            f"Training complete in {self.training_seconds:.1f}s. Vocab size: {self.get_vocab_size()}",
+            "SUCCESS",
+        )
         
     def save(self, path: Optional[str] = None) -> str:
         if self.tokenizer is None:
@@ -135,16 +230,113 @@ class BPETokenizer:
         self.tokenizer = Tokenizer.from_file(load_path)
         self.logger.log(f"Loaded tokenizer from {load_path}", "SUCCESS")
         
-    def encode(self, text: str, add_special_tokens: bool = True) -> List[int]:
+    def _is_cacheable(self, text: str) -> bool:
+        return self.cache_size > 0 and len(text) <= TokenizerConfig.cache_max_chars
+    
+    def _cache_get(self, key: Tuple[str, bool]) -> Optional[Tuple[int, ...]]:
+        ids = self.cache.get(key)
+        if ids is None:
+            self.cache_misses += 1
+            return None
+        self.cache.move_to_end(key)
+        self.cache_hits += 1
+        return ids
+    
+    def _cache_put(self, key: Tuple[str, bool], ids: SequenceType[int]) -> None:
+        self.cache[key] = tuple(ids)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)  # least recently used
+    
+    def cache_info(self) -> Dict[str, int]:
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "size": len(self.cache),
+            "max_size": self.cache_size,
+        }
+    
+    def clear_cache(self) -> None:
+        self.cache.clear()
+        self.cache_hits = 0
+        self.cache_misses = 0
+    
+    @staticmethod
+    def _format(ids: SequenceType[int], return_numpy: bool) -> TokenIds:
+        return np.asarray(ids, dtype=np.int32) if return_numpy else list(ids)
+    
+    def _encode_batch(self, texts: List[str], add_special_tokens: bool):
+        # encode_batch_fast skips offset tracking (tokenizers >= 0.20)
+        encode_batch = getattr(self.tokenizer, "encode_batch_fast", self.tokenizer.encode_batch)
+        with metrics.timer("tokenizer.encode").time():
+            encodings = encode_batch(texts, add_special_tokens=add_special_tokens)
+        
+        metrics.inc("tokenizer.encode.texts", len(texts))
+        metrics.inc("tokenizer.encode.tokens", sum(len(encoding) for encoding in encodings))
+        return encodings
+        
+    def encode(self, text: str, add_special_tokens: bool = True, return_numpy: bool = False) -> TokenIds:
         if self.tokenizer is None:
             raise ValueError("Tokenizer not initialized")
-        return self.tokenizer.encode(text, add_special_tokens=add_special_tokens).ids
+        
+        cacheable = self._is_cacheable(text)
+        ids = self._cache_get((text, add_special_tokens)) if cacheable else None
+        if ids is None:
+            with metrics.timer("tokenizer.encode").time():
+                ids = self.tokenizer.encode(text, add_special_tokens=add_special_tokens).ids
+            metrics.inc("tokenizer.encode.texts")
+            metrics.inc("tokenizer.encode.tokens", len(ids))
+            if cacheable:
+                self._cache_put((text, add_special_tokens), ids)
+        
+        return self._format(ids, return_numpy)
     
-    def decode(self, ids: List[int], skip_special_tokens: bool = True) -> str:
+    def encode_batch(
+        self, texts: List[str], add_special_tokens: bool = True, return_numpy: bool = False
+    ) -> List[TokenIds]:
+        """Encode many texts in one call, spread over the tokenizers thread pool."""
         if self.tokenizer is None:
             raise ValueError("Tokenizer not initialized")
+        
+        if self.cache_size == 0:
+            encodings = self._encode_batch(texts, add_special_tokens)
+            return [self._format(encoding.ids, return_numpy) for encoding in encodings]
+        
+        results: List[Optional[SequenceType[int]]] = [None] * len(texts)
+        missing = []
+        for i, text in enumerate(texts):
+            if self._is_cacheable(text):
+                results[i] = self._cache_get((text, add_special_tokens))
+            if results[i] is None:
+                missing.append(i)
+        
+        if missing:
+            encodings = self._encode_batch([texts[i] for i in missing], add_special_tokens)
+            for i, encoding in zip(missing, encodings):
+                results[i] = encoding.ids
+                if self._is_cacheable(texts[i]):
+                    self._cache_put((texts[i], add_special_tokens), encoding.ids)
+        
+        return [self._format(ids, return_numpy) for ids in results]
+    
+    def decode(self, ids: TokenIds, skip_special_tokens: bool = True) -> str:
+        if self.tokenizer is None:
+            raise ValueError("Tokenizer not initialized")
+        if isinstance(ids, np.ndarray):
+            ids = ids.tolist()
         return self.tokenizer.decode(ids, skip_special_tokens=skip_special_tokens)
     
+    def decode_batch(self, sequences: List[TokenIds], skip_special_tokens: bool = True) -> List[str]:
+        if self.tokenizer is None:
+            raise ValueError("Tokenizer not initialized")
+        sequences = [ids.tolist() if isinstance(ids, np.ndarray) else ids for ids in sequences]
+        return self.tokenizer.decode_batch(sequences, skip_special_tokens=skip_special_tokens)
+    
+    def vocab_overlap(self, other: "BPETokenizer") -> float:
+        """Share of tokens the two vocabularies have in common (intersection over union)."""
+        vocab = set(self.tokenizer.get_vocab())
+        other_vocab = set(other.tokenizer.get_vocab())
+        return len(vocab & other_vocab) / len(vocab | other_vocab)
+    
     def get_vocab_size(self) -> int:
         return self.tokenizer.get_vocab_size() if self.tokenizer else 0
     
@@ -153,10 +345,28 @@ class BPETokenizer:
 
 
 # Convenience functions
-def train_tokenizer_on_shards(vocab_size: Optional[int] = None):
-    tokenizer = BPETokenizer()
-    tokenizer.train(vocab_size=vocab_size)
-    tokenizer.save()
+def train_tokenizer_on_shards(
+    vocab_size: Optional[int] = None,
+    sample_bytes: Optional[int] = TokenizerConfig.sample_bytes,
+    compare_full: bool = False,
+):
+    with instrumented_run("tokenizer"):
+        tokenizer = BPETokenizer()
+        tokenizer.train(vocab_size=vocab_size, sample_bytes=sample_bytes)
+        
+        if compare_full and sample_bytes is not None:
+            # Costs a full-corpus run, only meant to check that sampling keeps the vocab
+            full = BPETokenizer()
+            full.train(vocab_size=vocab_size)
+            overlap = tokenizer.vocab_overlap(full)
+            tokenizer.logger.log(
+                f"Vocab overlap with full-corpus run: {overlap:.2%} "
+                f"({len(set(full.tokenizer.get_vocab()) - set(tokenizer.tokenizer.get_vocab()))} tokens differ), "
+                f"training time {tokenizer.training_seconds:.1f}s vs {full.training_seconds:.1f}s",
+                "INFO",
+            )
+        
+        tokenizer.save()
     return tokenizer
 
 
@@ -167,7 +377,22 @@ def load_tokenizer(path: Optional[str] = None):
 
 
 if __name__ == "__main__":
-    tokenizer = train_tokenizer_on_shards()
+    parser = argparse.ArgumentParser(description="Train the BPE tokenizer on processed shards")
+    parser.add_argument("--vocab-size", type=int, default=None)
+    parser.add_argument(
+        "--sample-bytes",
+        type=parse_size,
+        default=TokenizerConfig.sample_bytes,
+        help="train on a reproducible sample of this size (e.g. 500M, 5G) instead of every shard",
+    )
+    parser.add_argument(
+        "--compare-full",
+        action="store_true",
+        help="also train on the full corpus and log the vocab overlap with the sampled run",
+    )
+    args = parser.parse_args()
+    
+    tokenizer = train_tokenizer_on_shards(args.vocab_size, args.sample_bytes, args.compare_full)
     
     ids = tokenizer.encode("hello world")
     print(f"Tokenized: {ids}")
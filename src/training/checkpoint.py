@@ -0,0 +1,376 @@
+"""
+Sharded, memory-mappable checkpoint files
+    - safetensors layout: 8-byte little-endian header size, JSON header (dtype, shape and
+      data_offsets of every tensor, plus __metadata__), then the raw tensor bytes
+    - The header is padded so data starts 64-byte aligned, and tensors are stored by
+      decreasing element size, so every tensor is aligned for its dtype in the mapped file
+    - Tensors are split over {prefix}-0000i-of-0000n.safetensors files of at most
+      max_shard_bytes, with a {prefix}.safetensors.index.json weight map
+    - CheckpointReader maps the files (copy-on-write) and builds tensors on first access:
+      opening is instant, and processes loading the same checkpoint share its page cache
+    - AsyncCheckpointWriter copies the tensors to CPU and writes them in a background thread,
+      into {directory}.tmp renamed when complete; trainer_state.json is written last, so a
+      directory without it is not a checkpoint
+    - Every file is fsynced, and so is the parent directory after each rename; a crash
+      between the two renames of an overwrite leaves a complete {directory}.tmp and the
+      previous {directory}.old, which train.latest_checkpoint falls back to
+"""
+
+import argparse
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import torch
+
+from src.config.config import TrainingConfig
+from src.utils.logger import Logger
+
+ALIGNMENT = 64
+HEADER_SIZE = struct.Struct("<Q")
+STATE_FILE = "trainer_state.json"
+TEMPORARY_SUFFIXES = (".tmp", ".old")
+
+DTYPES = {
+    torch.float64: "F64",
+    torch.float32: "F32",
+    torch.float16: "F16",
+    torch.bfloat16: "BF16",
+    torch.int64: "I64",
+    torch.int32: "I32",
+    torch.int16: "I16",
+    torch.int8: "I8",
+    torch.uint8: "U8",
+    torch.bool: "BOOL",
+}
+DTYPE_NAMES = {name: dtype for dtype, name in DTYPES.items()}
+
+
+def shard_file_name(prefix: str, index: int, count: int) -> str:
+    return f"{prefix}-{index + 1:05d}-of-{count:05d}.safetensors"
+
+
+def index_file_name(prefix: str) -> str:
+    return f"{prefix}.safetensors.index.json"
+
+
+def plan_shards(tensors: Dict[str, torch.Tensor], max_shard_bytes: int) -> List[List[str]]:
+    """Tensor names per file, largest elements first, a new file when one would overflow."""
+    names = sorted(tensors, key=lambda n: (-tensors[n].element_size(), n))
+    shards: List[List[str]] = [[]]
+    size = 0
+    for name in names:
+        nbytes = tensors[name].numel() * tensors[name].element_size()
+        if shards[-1] and size + nbytes > max_shard_bytes:
+            shards.append([])
+            size = 0
+        shards[-1].append(name)
+        size += nbytes
+    return shards
+
+
+def fsync_directory(path: str) -> None:
+    """Persist the entries (new files, renames) of a directory."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_file(
+    path: str, tensors: Dict[str, torch.Tensor], names: List[str], metadata: Dict[str, str]
+) -> int:
+    """One .safetensors file with the given tensors in order; returns its data size."""
+    header = {"__metadata__": metadata}
+    offset = 0
+    for name in names:
+        tensor = tensors[name]
+        if tensor.dtype not in DTYPES:
+            raise TypeError(f"Can't store {name} of dtype {tensor.dtype}")
+        nbytes = tensor.numel() * tensor.element_size()
+        header[name] = {
+            "dtype": DTYPES[tensor.dtype],
+            "shape": list(tensor.shape),
+            "data_offsets": [offset, offset + nbytes],
+        }
+        offset += nbytes
+
+    encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    padding = -(HEADER_SIZE.size + len(encoded)) % ALIGNMENT
+    encoded += b" " * padding
+
+    with open(path, "wb") as f:
+        f.write(HEADER_SIZE.pack(len(encoded)))
+        f.write(encoded)
+        for name in names:
+            tensor = tensors[name].detach().contiguous().reshape(-1)
+            if tensor.numel():
+                f.write(memoryview(tensor.view(torch.uint8).numpy()))
+        f.flush()
+        os.fsync(f.fileno())
+    return offset
+
+
+def save_tensors(
+    directory: str,
+    tensors: Dict[str, torch.Tensor],
+    prefix: str = "model",
+    max_shard_bytes: int = TrainingConfig.checkpoint_shard_bytes,
+    metadata: Optional[Dict[str, str]] = None,
+) -> List[str]:
+    """Write tensors (CPU) as sharded .safetensors files plus their index into directory."""
+    os.makedirs(directory, exist_ok=True)
+    metadata = {"format": "pt", **(metadata or {})}
+    shards = plan_shards(tensors, max_shard_bytes)
+
+    weight_map, paths, total = {}, [], 0
+    for index, names in enumerate(shards):
+        file_name = shard_file_name(prefix, index, len(shards))
+        total += write_file(os.path.join(directory, file_name), tensors, names, metadata)
+        weight_map.update({name: file_name for name in names})
+        paths.append(os.path.join(directory, file_name))
+
+    index_path = os.path.join(directory, index_file_name(prefix))
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump({"metadata": {"total_size": total}, "weight_map": weight_map}, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    return paths + [index_path]
+
+
+class MappedFile:
+    """Header and copy-on-write mapping of one .safetensors file."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            (header_size,) = HEADER_SIZE.unpack(f.read(HEADER_SIZE.size))
+            self.header = json.loads(f.read(header_size))
+            self.data_start = HEADER_SIZE.size + header_size
+            # ACCESS_COPY: writable tensors without a copy, pages stay shared until written
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        self.metadata = self.header.pop("__metadata__", {})
+
+    def tensor(self, name: str) -> torch.Tensor:
+        info = self.header[name]
+        dtype = DTYPE_NAMES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        if begin == end:
+            return torch.empty(info["shape"], dtype=dtype)
+        data = torch.frombuffer(
+            self.map, dtype=torch.uint8, count=end - begin, offset=self.data_start + begin
+        )
+        return data.view(dtype).reshape(info["shape"])
+
+
+class CheckpointReader:
+    """
+    Lazy view of the tensors saved under one prefix of a checkpoint directory.
+        - reader[name] maps the tensor from its file, no read happens before it is used
+        - state_dict() returns every tensor that way, for load_state_dict(..., assign=True)
+    """
+
+    def __init__(self, directory: str, prefix: str = "model"):
+        index_path = os.path.join(directory, index_file_name(prefix))
+        with open(index_path, "r", encoding="utf-8") as f:
+            self.weight_map: Dict[str, str] = json.load(f)["weight_map"]
+        self.directory = directory
+        self.files: Dict[str, MappedFile] = {}
+
+    def _file(self, file_name: str) -> MappedFile:
+        if file_name not in self.files:
+            self.files[file_name] = MappedFile(os.path.join(self.directory, file_name))
+        return self.files[file_name]
+
+    def keys(self) -> List[str]:
+        return list(self.weight_map)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.weight_map
+
+    def __getitem__(self, name: str) -> torch.Tensor:
+        return self._file(self.weight_map[name]).tensor(name)
+
+    def items(self) -> Iterator[Tuple[str, torch.Tensor]]:
+        for name in self.weight_map:
+            yield name, self[name]
+
+    def state_dict(self) -> Dict[str, torch.Tensor]:
+        return dict(self.items())
+
+
+def load_model(
+    model: torch.nn.Module, directory: str, assign: bool = False, strict: bool = True
+) -> torch.nn.Module:
+    """
+    Load a saved model state into model.
+        - assign=True makes the parameters the mapped tensors themselves (CPU, matching dtype):
+          no copy, pages are read on first use and shared between processes
+    """
+    model.load_state_dict(CheckpointReader(directory).state_dict(), strict=strict, assign=assign)
+    return model
+
+
+class AsyncCheckpointWriter:
+    """
+    Saves checkpoints without blocking training for the write.
+        - save(directory, tensors, state) blocks only to copy tensors to CPU memory (training
+          updates the originals in place), then writes in a background thread
+        - One save at a time: a new save first waits for the previous one
+        - Files go to {directory}.tmp, renamed to directory once everything is written; an
+          existing directory is moved to {directory}.old first and only deleted after, so
+          the step always has a complete checkpoint on disk
+    """
+
+    def __init__(
+        self,
+        background: bool = TrainingConfig.async_checkpoint,
+        max_shard_bytes: int = TrainingConfig.checkpoint_shard_bytes,
+    ):
+        self.logger = Logger(path="checkpoint.AsyncCheckpointWriter")
+        self.background = background
+        self.max_shard_bytes = max_shard_bytes
+        self.thread: Optional[threading.Thread] = None
+        self.error: Optional[BaseException] = None
+
+    def save(
+        self,
+        directory: str,
+        tensors: Dict[str, Dict[str, torch.Tensor]],
+        state: dict,
+        on_complete: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        """tensors: {prefix: {name: tensor}}; state: JSON-serializable training state."""
+        self.wait()
+        start = time.perf_counter()
+        snapshot = {
+            prefix: {name: t.detach().to("cpu", copy=True) for name, t in group.items()}
+            for prefix, group in tensors.items()
+        }
+        self.logger.debug("Snapshot of %s taken in %.2fs", directory, time.perf_counter() - start)
+
+        def write() -> None:
+            try:
+                self._write(directory, snapshot, state)
+                if on_complete is not None:
+                    on_complete(directory)
+            except BaseException as e:  # surfaced by the next wait()
+                self.error = e
+
+        if self.background:
+            self.thread = threading.Thread(target=write, name="checkpoint-writer", daemon=False)
+            self.thread.start()
+        else:
+            write()
+            self.wait()
+
+    def _write(self, directory: str, snapshot: Dict[str, Dict[str, torch.Tensor]], state: dict):
+        start = time.perf_counter()
+        temporary = directory + ".tmp"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+
+        for prefix, tensors in snapshot.items():
+            save_tensors(temporary, tensors, prefix, self.max_shard_bytes)
+        # Last: its presence marks the checkpoint complete
+        with open(os.path.join(temporary, STATE_FILE), "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        fsync_directory(temporary)
+
+        parent = os.path.dirname(os.path.abspath(directory))
+        previous = None
+        if os.path.exists(directory):
+            previous = directory + ".old"
+            shutil.rmtree(previous, ignore_errors=True)
+            os.replace(directory, previous)
+            fsync_directory(parent)
+        os.replace(temporary, directory)
+        fsync_directory(parent)
+        if previous is not None:
+            shutil.rmtree(previous)
+        self.logger.log(f"Saved checkpoint {directory} in {time.perf_counter() - start:.2f}s")
+
+    def wait(self) -> None:
+        """Block until the pending save is written; re-raises its error."""
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError("Checkpoint save failed") from error
+
+
+def optimizer_tensors(
+    optimizer: torch.optim.Optimizer, names: Dict[torch.nn.Parameter, str]
+) -> Tuple[Dict[str, torch.Tensor], dict]:
+    """
+    Optimizer state as {"{parameter name}.{key}": tensor} plus the JSON-able rest (param
+    groups, non-tensor state), keyed by parameter name so it survives reordering.
+    """
+    tensors, extra = {}, {}
+    for parameter, state in optimizer.state.items():
+        name = names[parameter]
+        for key, value in state.items():
+            if isinstance(value, torch.Tensor):
+                tensors[f"{name}.{key}"] = value
+            else:
+                extra.setdefault(name, {})[key] = value
+
+    groups = []
+    for group in optimizer.param_groups:
+        settings = {k: v for k, v in group.items() if k != "params"}
+        groups.append({**settings, "params": [names[p] for p in group["params"]]})
+    return tensors, {"param_groups": groups, "state": extra}
+
+
+def load_optimizer(
+    optimizer: torch.optim.Optimizer,
+    names: Dict[torch.nn.Parameter, str],
+    reader: CheckpointReader,
+    saved: dict,
+) -> None:
+    """Inverse of optimizer_tensors."""
+    index = {}
+    for group in optimizer.param_groups:
+        for parameter in group["params"]:
+            index[names[parameter]] = len(index)
+
+    state = {}
+    for tensor_name, tensor in reader.items():
+        name, key = tensor_name.rsplit(".", 1)
+        state.setdefault(index[name], {})[key] = tensor.clone()
+    for name, values in saved["state"].items():
+        state.setdefault(index[name], {}).update(values)
+
+    groups = [
+        {**group, "params": [index[name] for name in group["params"]]}
+        for group in saved["param_groups"]
+    ]
+    optimizer.load_state_dict({"state": state, "param_groups": groups})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect a checkpoint directory")
+    parser.add_argument("directory")
+    parser.add_argument("--prefix", default="model")
+    args = parser.parse_args()
+
+    logger = Logger(path="checkpoint")
+    start = time.perf_counter()
+    reader = CheckpointReader(args.directory, args.prefix)
+    tensors = reader.state_dict()
+    total = sum(t.numel() for t in tensors.values())
+    logger.log(
+        f"{len(tensors)} tensors, {total / 1e6:.1f}M elements in "
+        f"{len(set(reader.weight_map.values()))} file(s), mapped in "
+        f"{time.perf_counter() - start:.3f}s"
+    )
+    for name, tensor in tensors.items():
+        logger.log(f"{name}: {str(tensor.dtype)[6:]} {list(tensor.shape)}")
@@ -0,0 +1,448 @@
+"""
+Training loop for the decoder-only Transformer
+    - Packed token shards in, next-token cross-entropy, AdamW with warmup + cosine decay
+    - Memory / speed switches from TrainingConfig (or the command line): micro batch size and
+      gradient accumulation, bf16 autocast, per-block activation checkpointing, and a fused /
+      foreach optimizer step
+    - Logs loss, learning rate, tokens/sec and memory (current and peak RSS on CPU, peak
+      allocated on CUDA) every TrainingConfig.log_interval steps
+    - Checkpoints model, optimizer, schedule and sampler position, and resumes from them;
+      checkpoints are sharded .safetensors directories written in the background
+      (src.training.checkpoint), the model tensors are memory-mapped on load
+    - Data parallel when launched with torchrun (gloo on CPU): DistributedDataParallel
+      all-reduces gradients in buckets while backward is still running, accumulation steps
+      skip the all-reduce, and every rank reads its own shards (TrainingConfig.data_split)
+
+    torchrun --standalone --nproc-per-node 4 -m src.training.train
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+import resource
+import sys
+import time
+from contextlib import nullcontext
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import torch
+import torch.distributed as dist
+import torch.nn.functional as F
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader
+
+from src.arch.model import Transformer
+from src.config.config import DatasetConfig, ModelConfig, Paths, TrainingConfig
+from src.data.token_dataset import PackedSampler, PackedTokenDataset, rank_shards
+from src.tokenization.token_shards import get_token_shards
+from src.training.checkpoint import (
+    STATE_FILE,
+    TEMPORARY_SUFFIXES,
+    AsyncCheckpointWriter,
+    CheckpointReader,
+    load_optimizer,
+    optimizer_tensors,
+)
+from src.utils import logger as logging_module
+from src.utils.logger import Logger
+from src.utils.metrics import instrumented_run, metrics
+
+OPTIMIZER_IMPLS = ("fused", "foreach", "loop")
+AUTOCAST_DTYPES = {"bfloat16": torch.bfloat16, "float16": torch.float16}
+
+
+def memory_stats(device: torch.device) -> Dict[str, float]:
+    """
+    Memory of this process in MB.
+        - CUDA: max_allocated_mb, the most ever allocated on the device
+        - Otherwise: rss_mb, the current RSS, and max_rss_mb, the process-lifetime peak RSS
+          (ru_maxrss, it never goes down)
+    """
+    if device.type == "cuda":
+        return {"max_allocated_mb": torch.cuda.max_memory_allocated(device) / 1024**2}
+
+    with open("/proc/self/statm") as f:
+        rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = peak if sys.platform == "darwin" else peak * 1024  # bytes on macOS, KB on Linux
+    return {"rss_mb": rss / 1024**2, "max_rss_mb": peak / 1024**2}
+
+
+def create_optimizer(
+    model: torch.nn.Module, learning_rate: float, impl: str
+) -> torch.optim.Optimizer:
+    """AdamW, weight decay on matrices only; impl picks the fused / foreach kernels."""
+    if impl not in OPTIMIZER_IMPLS:
+        raise ValueError(f"Unknown optimizer impl {impl}, expected one of {OPTIMIZER_IMPLS}")
+
+    decay, no_decay = [], []
+    for name, parameter in model.named_parameters():
+        if not parameter.requires_grad:
+            continue
+        is_matrix = parameter.dim() >= 2 and "embedding" not in name
+        (decay if is_matrix else no_decay).append(parameter)
+    groups = [
+        {"params": decay, "weight_decay": TrainingConfig.weight_decay},
+        {"params": no_decay, "weight_decay": 0.0},
+    ]
+
+    kwargs = {"lr": learning_rate, "betas": TrainingConfig.betas}
+    if impl == "fused":
+        try:
+            return torch.optim.AdamW(groups, fused=True, **kwargs)
+        except (RuntimeError, TypeError) as e:
+            Logger(path="train.create_optimizer").log(
+                f"Fused AdamW unavailable ({e}), using foreach", level="WARNING"
+            )
+    return torch.optim.AdamW(groups, foreach=impl != "loop", **kwargs)
+
+
+def cosine_schedule(step: int, max_steps: int, learning_rate: float) -> float:
+    """Multiplier of learning_rate: linear warmup, then cosine decay to min_learning_rate."""
+    warmup = TrainingConfig.warmup_steps
+    if step < warmup:
+        return (step + 1) / warmup
+    progress = min(1.0, (step - warmup) / max(1, max_steps - warmup))
+    floor = TrainingConfig.min_learning_rate / learning_rate
+    return floor + (1 - floor) * 0.5 * (1 + math.cos(math.pi * progress))
+
+
+def init_distributed() -> Tuple[int, int]:
+    """(rank, world_size); joins the process group when started by torchrun."""
+    world_size = int(os.environ.get("WORLD_SIZE", 1))
+    if world_size == 1:
+        return 0, 1
+
+    if not dist.is_initialized():
+        dist.init_process_group(backend=TrainingConfig.distributed_backend)
+    # Ranks on one machine share its cores, oversubscribing them slows every rank down
+    local_ranks = int(os.environ.get("LOCAL_WORLD_SIZE", world_size))
+    torch.set_num_threads(TrainingConfig.threads_per_rank or max(1, os.cpu_count() // local_ranks))
+    return dist.get_rank(), dist.get_world_size()
+
+
+def create_data(
+    sequence_length: int, rank: int, world_size: int, shard_paths: Optional[List[str]] = None
+) -> Tuple[PackedTokenDataset, PackedSampler]:
+    """Dataset and sampler of this rank, split by shards or by samples (data_split)."""
+    shard_paths = shard_paths if shard_paths is not None else get_token_shards()
+    if world_size == 1 or TrainingConfig.data_split == "samples":
+        dataset = PackedTokenDataset(shard_paths, sequence_length)
+        return dataset, PackedSampler(dataset, rank=rank, world_size=world_size)
+
+    if len(shard_paths) < world_size:
+        Logger(path="train.create_data").log(
+            f"{len(shard_paths)} shard(s) for {world_size} ranks, splitting by samples",
+            level="WARNING",
+        )
+        dataset = PackedTokenDataset(shard_paths, sequence_length)
+        return dataset, PackedSampler(dataset, rank=rank, world_size=world_size)
+
+    dataset = PackedTokenDataset(rank_shards(shard_paths, rank, world_size), sequence_length)
+    # Every rank must take the same number of steps: the smallest split sets the epoch
+    samples = torch.tensor(len(dataset))
+    dist.all_reduce(samples, op=dist.ReduceOp.MIN)
+    sampler = PackedSampler(
+        dataset, seed=TrainingConfig.seed + rank, rank=0, world_size=1, num_samples=int(samples)
+    )
+    return dataset, sampler
+
+
+def latest_checkpoint(directory: str = Paths.CHECKPOINT_DIR) -> Optional[str]:
+    """
+    Newest complete checkpoint directory (one with its trainer_state.json).
+        - A step whose directory is missing, because a save crashed between its two renames,
+          falls back to its complete step_*.tmp (the new save), else to its step_*.old
+    """
+    preference = ("", *TEMPORARY_SUFFIXES)
+    candidates = {}
+    for path in glob.glob(os.path.join(directory, "step_*")):
+        step_path, suffix = os.path.splitext(path)
+        if suffix not in preference or not os.path.isfile(os.path.join(path, STATE_FILE)):
+            continue
+        candidate = (preference.index(suffix), path)
+        candidates[step_path] = min(candidates.get(step_path, candidate), candidate)
+    return candidates[max(candidates)][1] if candidates else None
+
+
+class Trainer:
+    """
+    Runs optimizer steps of gradient_accumulation_steps micro batches each.
+        - model is the module that is optimized and checkpointed; forward_model is what the
+          micro batches run through (model itself, or its DistributedDataParallel wrapper)
+        - In a process group, only rank 0 writes checkpoints; logged loss and tokens/s are
+          global
+        - save_checkpoint returns once the tensors are copied, the files are written in the
+          background while training goes on; close() waits for the last one
+    """
+
+    def __init__(
+        self,
+        model: Transformer,
+        dataset: PackedTokenDataset,
+        device: Optional[torch.device] = None,
+        micro_batch_size: int = TrainingConfig.micro_batch_size,
+        gradient_accumulation_steps: int = TrainingConfig.gradient_accumulation_steps,
+        autocast_dtype: Optional[str] = TrainingConfig.autocast_dtype,
+        activation_checkpointing: bool = TrainingConfig.activation_checkpointing,
+        optimizer_impl: str = TrainingConfig.optimizer_impl,
+        learning_rate: float = TrainingConfig.learning_rate,
+        max_steps: int = TrainingConfig.max_steps,
+        checkpoint_dir: str = Paths.CHECKPOINT_DIR,
+        sampler: Optional[PackedSampler] = None,
+    ):
+        if autocast_dtype is not None and autocast_dtype not in AUTOCAST_DTYPES:
+            raise ValueError(f"Unknown autocast dtype {autocast_dtype}")
+
+        self.logger = Logger(path="train.Trainer")
+        self.device = device or torch.device("cpu")
+        self.model = model.to(self.device)
+        self.model.activation_checkpointing = activation_checkpointing
+        self.forward_model: torch.nn.Module = self.model
+        self.rank, self.world_size = 0, 1
+        if dist.is_available() and dist.is_initialized():
+            self.rank, self.world_size = dist.get_rank(), dist.get_world_size()
+            self.forward_model = DistributedDataParallel(
+                self.model,
+                device_ids=[self.device.index] if self.device.type == "cuda" else None,
+                bucket_cap_mb=TrainingConfig.ddp_bucket_cap_mb,
+                gradient_as_bucket_view=True,
+            )
+        self.dataset = dataset
+        self.sampler = sampler if sampler is not None else PackedSampler(dataset)
+        self.micro_batch_size = micro_batch_size
+        self.gradient_accumulation_steps = gradient_accumulation_steps
+        self.autocast_dtype = AUTOCAST_DTYPES.get(autocast_dtype)
+        self.max_steps = max_steps
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_writer = AsyncCheckpointWriter()
+
+        self.optimizer = create_optimizer(self.model, learning_rate, optimizer_impl)
+        self.scheduler = torch.optim.lr_scheduler.LambdaLR(
+            self.optimizer, lambda step: cosine_schedule(step, max_steps, learning_rate)
+        )
+        self.step = 0
+        self.samples_consumed = 0  # of the sampler's current epoch
+
+    def autocast(self):
+        if self.autocast_dtype is None:
+            return nullcontext()
+        return torch.autocast(device_type=self.device.type, dtype=self.autocast_dtype)
+
+    def batches(self) -> Iterator[Tuple[torch.Tensor, torch.Tensor]]:
+        """Micro batches forever, epoch after epoch, from the sampler's position on."""
+        while True:
+            loader = DataLoader(
+                self.dataset,
+                batch_size=self.micro_batch_size,
+                sampler=self.sampler,
+                num_workers=TrainingConfig.num_workers,
+                persistent_workers=False,
+                drop_last=True,
+            )
+            for inputs, targets in loader:
+                self.samples_consumed += len(inputs)
+                yield inputs, targets
+            self.sampler.set_epoch(self.sampler.epoch + 1)
+            self.samples_consumed = 0
+
+    def micro_step(self, inputs: torch.Tensor, targets: torch.Tensor, sync: bool) -> float:
+        """Forward / backward of one micro batch; sync is False while accumulating."""
+        inputs = inputs.to(self.device, torch.long, non_blocking=True)
+        targets = targets.to(self.device, torch.long, non_blocking=True)
+        skip_all_reduce = not sync and isinstance(self.forward_model, DistributedDataParallel)
+        with self.forward_model.no_sync() if skip_all_reduce else nullcontext():
+            with self.autocast():
+                logits = self.forward_model(inputs)
+            loss = F.cross_entropy(logits.float().flatten(0, 1), targets.flatten())
+            (loss / self.gradient_accumulation_steps).backward()
+        return loss.item()
+
+    def optimizer_step(self, micro_batches: List[Tuple[torch.Tensor, torch.Tensor]]) -> float:
+        """One optimizer step over the micro batches, returns their mean loss."""
+        self.model.train()
+        total_loss = 0.0
+        for i, (inputs, targets) in enumerate(micro_batches):
+            total_loss += self.micro_step(inputs, targets, sync=i == len(micro_batches) - 1)
+
+        if TrainingConfig.grad_clip is not None:
+            torch.nn.utils.clip_grad_norm_(self.model.parameters(), TrainingConfig.grad_clip)
+        self.optimizer.step()
+        self.optimizer.zero_grad(set_to_none=True)
+        self.scheduler.step()
+        self.step += 1
+        return total_loss / len(micro_batches)
+
+    def train(self) -> None:
+        batches = self.batches()
+        tokens_per_step = (
+            self.micro_batch_size
+            * self.gradient_accumulation_steps
+            * self.dataset.sequence_length
+            * self.world_size
+        )
+        self.logger.log(
+            f"Training {sum(p.numel() for p in self.model.parameters()) / 1e6:.1f}M parameters "
+            f"from step {self.step} to {self.max_steps}, {tokens_per_step} tokens per step "
+            f"over {self.world_size} rank(s)"
+        )
+
+        interval_start, interval_steps = time.perf_counter(), 0
+        while self.step < self.max_steps:
+            micro_batches = [next(batches) for _ in range(self.gradient_accumulation_steps)]
+            with metrics.timer("train.step").time():
+                loss = self.optimizer_step(micro_batches)
+            metrics.inc("train.tokens", tokens_per_step)
+            interval_steps += 1
+
+            if self.step % TrainingConfig.log_interval == 0 or self.step == self.max_steps:
+                if self.world_size > 1:
+                    loss = self.mean_over_ranks(loss)
+                elapsed = time.perf_counter() - interval_start
+                memory = memory_stats(self.device)
+                for name, value in memory.items():
+                    metrics.set_gauge(f"train.{name}", value)
+                metrics.set_gauge("train.loss", loss)
+                self.logger.log(
+                    f"step {self.step}: loss {loss:.4f}, "
+                    f"lr {self.scheduler.get_last_lr()[0]:.2e}, "
+                    f"{interval_steps * tokens_per_step / elapsed:,.0f} tokens/s, "
+                    + ", ".join(f"{name} {value:,.0f}" for name, value in memory.items())
+                )
+                interval_start, interval_steps = time.perf_counter(), 0
+
+            if self.step % TrainingConfig.checkpoint_interval == 0 or self.step == self.max_steps:
+                self.save_checkpoint()
+
+    def mean_over_ranks(self, value: float) -> float:
+        total = torch.tensor(value, dtype=torch.float64)
+        dist.all_reduce(total)
+        return total.item() / self.world_size
+
+    def parameter_names(self) -> Dict[torch.nn.Parameter, str]:
+        return {parameter: name for name, parameter in self.model.named_parameters()}
+
+    def state_dict(self) -> Tuple[Dict[str, Dict[str, torch.Tensor]], dict]:
+        """Tensors by file prefix ("model", "optimizer"), and the JSON-able rest."""
+        optimizer, optimizer_state = optimizer_tensors(self.optimizer, self.parameter_names())
+        state = {
+            "step": self.step,
+            "optimizer": optimizer_state,
+            "scheduler": self.scheduler.state_dict(),
+            "sampler": self.sampler.state_dict(self.samples_consumed),
+        }
+        return {"model": self.model.state_dict(), "optimizer": optimizer}, state
+
+    def save_checkpoint(self) -> str:
+        path = os.path.join(self.checkpoint_dir, f"step_{self.step:08d}")
+        if self.rank == 0:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            tensors, state = self.state_dict()
+            self.checkpoint_writer.save(path, tensors, state)
+        return path
+
+    def close(self) -> None:
+        """Wait for the checkpoint being written."""
+        self.checkpoint_writer.wait()
+        if self.world_size > 1:
+            dist.barrier()  # no rank exits before the last checkpoint exists
+
+    def load_checkpoint(self, path: str) -> None:
+        with open(os.path.join(path, STATE_FILE), "r", encoding="utf-8") as f:
+            state = json.load(f)
+        # Copied into the parameters: the mapped pages are shared until then
+        self.model.load_state_dict(CheckpointReader(path, "model").state_dict())
+        load_optimizer(
+            self.optimizer,
+            self.parameter_names(),
+            CheckpointReader(path, "optimizer"),
+            state["optimizer"],
+        )
+        self.scheduler.load_state_dict(state["scheduler"])
+        self.sampler.load_state_dict(state["sampler"])
+        self.step = state["step"]
+        self.samples_consumed = 0
+        self.logger.log(f"Resumed from {path} at step {self.step}")
+
+
+def train(
+    max_steps: int = TrainingConfig.max_steps,
+    micro_batch_size: int = TrainingConfig.micro_batch_size,
+    gradient_accumulation_steps: int = TrainingConfig.gradient_accumulation_steps,
+    autocast_dtype: Optional[str] = TrainingConfig.autocast_dtype,
+    activation_checkpointing: bool = TrainingConfig.activation_checkpointing,
+    optimizer_impl: str = TrainingConfig.optimizer_impl,
+    sequence_length: int = DatasetConfig.sequence_length,
+    resume: bool = True,
+) -> None:
+    rank, world_size = init_distributed()
+    if rank != 0:
+        logging_module.configure(level="WARNING")  # one rank reports progress
+
+    torch.manual_seed(TrainingConfig.seed)  # same initial weights on every rank
+    dataset, sampler = create_data(sequence_length, rank, world_size)
+    model = Transformer(max_sequence_length=max(sequence_length, ModelConfig.max_sequence_length))
+    trainer = Trainer(
+        model,
+        dataset,
+        sampler=sampler,
+        micro_batch_size=micro_batch_size,
+        gradient_accumulation_steps=gradient_accumulation_steps,
+        autocast_dtype=autocast_dtype,
+        activation_checkpointing=activation_checkpointing,
+        optimizer_impl=optimizer_impl,
+        max_steps=max_steps,
+    )
+
+    checkpoint = latest_checkpoint(trainer.checkpoint_dir) if resume else None
+    if checkpoint is not None:
+        trainer.load_checkpoint(checkpoint)
+
+    try:
+        with instrumented_run("train", "train" if world_size == 1 else f"train.rank{rank}"):
+            trainer.train()
+            trainer.close()
+        trainer.logger.log(f"Training complete at step {trainer.step}", level="SUCCESS")
+    finally:
+        if dist.is_initialized():
+            dist.destroy_process_group()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the model on the token shards")
+    parser.add_argument("--max-steps", type=int, default=TrainingConfig.max_steps)
+    parser.add_argument("--micro-batch-size", type=int, default=TrainingConfig.micro_batch_size)
+    parser.add_argument(
+        "--gradient-accumulation-steps",
+        type=int,
+        default=TrainingConfig.gradient_accumulation_steps,
+    )
+    parser.add_argument(
+        "--autocast",
+        choices=["none", *AUTOCAST_DTYPES],
+        default=TrainingConfig.autocast_dtype or "none",
+    )
+    parser.add_argument(
+        "--activation-checkpointing",
+        action=argparse.BooleanOptionalAction,
+        default=TrainingConfig.activation_checkpointing,
+    )
+    parser.add_argument(
+        "--optimizer", choices=OPTIMIZER_IMPLS, default=TrainingConfig.optimizer_impl
+    )
+    parser.add_argument("--sequence-length", type=int, default=DatasetConfig.sequence_length)
+    parser.add_argument("--no-resume", action="store_true", help="ignore existing checkpoints")
+    args = parser.parse_args()
+
+    train(
+        max_steps=args.max_steps,
+        micro_batch_size=args.micro_batch_size,
+        gradient_accumulation_steps=args.gradient_accumulation_steps,
+        autocast_dtype=None if args.autocast == "none" else args.autocast,
+        activation_checkpointing=args.activation_checkpointing,
+        optimizer_impl=args.optimizer,
+        sequence_length=args.sequence_length,
+        resume=not args.no_resume,
+    )
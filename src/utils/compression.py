@@ -0,0 +1,80 @@
+"""
+Transparent compression for raw and processed text shards.
+    - The codec is chosen per stage and recorded only in the file suffix (.gz / .bz2 / .xz)
+    - open_text streams (de)compression, so readers never hold a whole file
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+from pathlib import Path
+from typing import IO, List, Optional, Union
+
+# codec name -> (suffix, opener, extra write arguments)
+CODECS = {
+    "gzip": (".gz", gzip.open, {"compresslevel": 6}),
+    "bz2": (".bz2", bz2.open, {}),
+    "lzma": (".xz", lzma.open, {"preset": 1}),
+}
+CODEC_CHOICES = ["none", *CODECS]
+
+
+def parse_codec(codec: Optional[str]) -> Optional[str]:
+    """Map a CLI codec name to the value used in code ("none" -> None)."""
+    if codec in (None, "none"):
+        return None
+    if codec not in CODECS:
+        raise ValueError(f"Unknown compression codec: {codec}")
+    return codec
+
+
+def with_codec(path: str, codec: Optional[str]) -> str:
+    """Append the codec suffix to a plain .txt path."""
+    return path if codec is None else path + CODECS[codec][0]
+
+
+def codec_of(path: Union[str, Path]) -> Optional[str]:
+    """Codec a file was written with, from its suffix."""
+    name = str(path)
+    for codec, (suffix, _, _) in CODECS.items():
+        if name.endswith(suffix):
+            return codec
+    return None
+
+
+def strip_codec(path: Union[str, Path]) -> str:
+    """Path without its codec suffix (shard_0001.txt.gz -> shard_0001.txt)."""
+    name = str(path)
+    codec = codec_of(name)
+    return name if codec is None else name[: -len(CODECS[codec][0])]
+
+
+def open_text(
+    path: Union[str, Path], mode: str = "r", fileobj: Optional[IO[bytes]] = None
+) -> IO[str]:
+    """
+    Open a UTF-8 text file, (de)compressing on the fly according to its suffix.
+        - fileobj: binary stream to read from instead of opening path (path still picks the
+          codec), the caller closes it
+    """
+    codec = codec_of(path)
+    if codec is None:
+        if fileobj is not None:
+            return io.TextIOWrapper(fileobj, encoding="utf-8")
+        return open(path, mode, encoding="utf-8", buffering=8192)
+
+    _, opener, write_kwargs = CODECS[codec]
+    kwargs = write_kwargs if mode[0] in "wa" else {}
+    return opener(
+        fileobj if fileobj is not None else path, mode + "t", encoding="utf-8", **kwargs
+    )
+
+
+def text_files(directory: Union[str, Path], pattern: str) -> List[Path]:
+    """Sorted files matching pattern (e.g. "shard_*.txt"), compressed or not."""
+    directory = Path(directory)
+    paths = set(directory.glob(pattern))
+    for suffix, _, _ in CODECS.values():
+        paths.update(directory.glob(pattern + suffix))
+    return sorted(paths)
@@ -1,17 +1,219 @@
 """
 Logging utilities with colorized console output.
+    - Calls below the level threshold return before any formatting
+    - Messages can be formatted lazily: log("%d items", "DEBUG", n) or log(lambda: ...)
+    - Records go to sinks (console, plain-text file, JSON lines), written in batches from a
+      background thread in the main process and synchronously in worker processes
+    - Every batch is one write call of whole lines, so processes sharing a terminal or
+      log file never interleave within a line; JSON records carry the pid
 """
 
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
 from datetime import datetime
-from pathlib import Path
-from typing import Optional
+from typing import Callable, List, Optional, Tuple, Union
 
 from colorama import Fore, Style
 
+from src.config.config import LogConfig
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "SUCCESS": 25, "WARNING": 30, "ERROR": 40}
+
+# (created, level, logger path, message, pid)
+Record = Tuple[float, str, str, str, int]
+
+_threshold = LEVELS["INFO"]
+
+
+class _Timestamps:
+    """strftime once per second instead of once per record."""
+
+    def __init__(self) -> None:
+        self.second = -1
+        self.text = ""
+
+    def __call__(self, created: float) -> str:
+        second = int(created)
+        if second != self.second:
+            self.second = second
+            self.text = datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+        return self.text
+
+
+class ConsoleSink:
+    """Colored lines on stdout."""
+
+    def __init__(self) -> None:
+        self.timestamp = _Timestamps()
+
+    def write(self, records: List[Record]) -> None:
+        lines = []
+        for created, level, path, message, _ in records:
+            color, label = Logger.LEVEL_COLORS.get(level, (Fore.WHITE, level))
+            lines.append(
+                f"{self.timestamp(created)} {color}{Style.BRIGHT}[{label}]{Style.RESET_ALL} "
+                f"[{path}] {message}\n"
+            )
+        sys.stdout.write("".join(lines))
+        sys.stdout.flush()
+
+    def close(self) -> None:
+        pass
+
+
+class FileSink:
+    """Plain-text lines appended to a file (O_APPEND, one write per batch)."""
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, "ab", buffering=0)
+        self.timestamp = _Timestamps()
+
+    def format(self, record: Record) -> str:
+        created, level, path, message, pid = record
+        return f"{self.timestamp(created)} [{level}] [{path}] [pid {pid}] {message}\n"
+
+    def write(self, records: List[Record]) -> None:
+        self.file.write("".join(self.format(record) for record in records).encode("utf-8"))
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class JsonlSink(FileSink):
+    """One JSON object per record, for log aggregation tools."""
+
+    def format(self, record: Record) -> str:
+        created, level, path, message, pid = record
+        data = {"time": created, "level": level, "logger": path, "message": str(message), "pid": pid}
+        return json.dumps(data, ensure_ascii=False) + "\n"
+
+
+class LogDispatcher:
+    """
+    Hands records to the sinks.
+        - background: records are queued and written in batches by a daemon thread
+        - Otherwise each record is written by the caller, under a lock
+    """
+
+    def __init__(self, sinks: list, background: bool) -> None:
+        self.sinks = sinks
+        self.lock = threading.Lock()
+        self.queue: Optional[queue.SimpleQueue] = None
+        self.thread: Optional[threading.Thread] = None
+        if background:
+            self.queue = queue.SimpleQueue()
+            self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self.thread.start()
+
+    def _write(self, records: List[Record]) -> None:
+        with self.lock:
+            for sink in self.sinks:
+                try:
+                    sink.write(records)
+                except Exception:
+                    pass  # a broken sink must not take the pipeline down
+
+    def _run(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < 1024:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [item for item in batch if not isinstance(item, threading.Event)]
+            if records:
+                self._write(records)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def emit(self, record: Record) -> None:
+        if self.queue is not None:
+            self.queue.put(record)
+        else:
+            self._write([record])
+
+    def flush(self) -> None:
+        """Wait until every queued record is written."""
+        if self.queue is not None and self.thread.is_alive():
+            written = threading.Event()
+            self.queue.put(written)
+            written.wait(timeout=5)
+
+    def close(self) -> None:
+        self.flush()
+        for sink in self.sinks:
+            sink.close()
+
+
+_dispatcher: Optional[LogDispatcher] = None
+
+
+def _is_worker_process() -> bool:
+    import multiprocessing
+
+    return multiprocessing.parent_process() is not None
+
+
+def configure(
+    level: Optional[str] = None,
+    console: bool = True,
+    file: Optional[str] = None,
+    jsonl_file: Optional[str] = None,
+    background: Optional[bool] = None,
+) -> None:
+    """
+    (Re)configure logging for this process; arguments left as None come from LogConfig.
+        - Worker processes always write synchronously: they exit without running atexit,
+          so a background queue could lose their last records
+    """
+    global _dispatcher, _threshold
+
+    level = (level or LogConfig.level).upper()
+    if level not in LEVELS:
+        raise ValueError(f"Unknown log level {level}, expected one of {list(LEVELS)}")
+    _threshold = LEVELS[level]
+
+    sinks = [ConsoleSink()] if console else []
+    file = file if file is not None else LogConfig.file
+    jsonl_file = jsonl_file if jsonl_file is not None else LogConfig.jsonl_file
+    if file:
+        sinks.append(FileSink(file))
+    if jsonl_file:
+        sinks.append(JsonlSink(jsonl_file))
+
+    background = LogConfig.background if background is None else background
+    if _dispatcher is not None:
+        _dispatcher.close()
+    _dispatcher = LogDispatcher(sinks, background and not _is_worker_process())
+
+
+def flush() -> None:
+    """Write out every record logged so far."""
+    if _dispatcher is not None:
+        _dispatcher.flush()
+
+
+def _after_fork_in_child() -> None:
+    # The writer thread does not survive fork: write synchronously with fresh locks
+    global _dispatcher
+    if _dispatcher is not None:
+        _dispatcher = LogDispatcher(_dispatcher.sinks, background=False)
+
 
 class Logger:
     """
     Simple colored logger for console output.
+        - log(message, level, *args): args are %-formatted into message only if the level
+          is enabled; message may also be a zero-argument callable returning the text
     """
 
     LEVEL_COLORS = {
@@ -28,9 +230,24 @@ class Logger:
     def get_timestamp(self) -> str:
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    def log(self, message: str, level: str = "INFO") -> None:
-        color, label = self.LEVEL_COLORS.get(level, (Fore.WHITE, level))
+    def is_enabled(self, level: str = "DEBUG") -> bool:
+        """Guard for expensive log-only work: if logger.is_enabled("DEBUG"): ..."""
+        return LEVELS.get(level, 20) >= _threshold
+
+    def log(self, message: Union[str, Callable[[], str]], level: str = "INFO", *args) -> None:
+        if LEVELS.get(level, 20) < _threshold:
+            return
+
+        if args:
+            message = message % args
+        elif callable(message):
+            message = message()
+        _dispatcher.emit((time.time(), level, self.path, message, os.getpid()))
+
+    def debug(self, message: Union[str, Callable[[], str]], *args) -> None:
+        self.log(message, "DEBUG", *args)
+
 
-        print(
-            f"{self.get_timestamp()} {color}{Style.BRIGHT}[{label}]{Style.RESET_ALL} [{self.path}] {message}"
-        )
+configure()
+atexit.register(flush)
+os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,295 @@
+"""
+Instrumentation shared by the data pipeline stages
+    - Counters, gauges, timers and spans in one process-wide registry (metrics)
+    - Rates are derived on export: counter "stage.x" / timer "stage" -> stage.x_per_second
+    - Snapshots as JSON and as a Prometheus textfile, at the end of a run and optionally
+      every MetricsConfig.interval seconds
+    - Opt-in cProfile / tracemalloc per span, reported as JSON with repo-relative paths so
+      reports from different machines and CI runs can be diffed
+    - Worker processes have their own registry, stages count in the main process
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from src.config.config import MetricsConfig
+from src.utils.logger import Logger
+
+PROMETHEUS_PREFIX = "llm_"
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Counter:
+    """Monotonic count (articles, bytes, tokens...)."""
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Timer:
+    """Accumulated wall time and number of timed sections."""
+
+    def __init__(self) -> None:
+        self.seconds = 0.0
+        self.calls = 0
+
+    def add(self, seconds: float) -> None:
+        self.seconds += seconds
+        self.calls += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(time.perf_counter() - start)
+
+
+def _stages(setting: str) -> set:
+    return {stage.strip() for stage in setting.split(",") if stage.strip()}
+
+
+def _relative(path: str) -> str:
+    """Repo-relative path for files of this repo, file name only for everything else."""
+    if path.startswith(REPO_ROOT):
+        return os.path.relpath(path, REPO_ROOT)
+    return os.path.basename(path)
+
+
+class Metrics:
+    """
+    Registry of every metric of this process.
+        - counter / timer return the same object for the same name, so hot loops can keep it
+        - span(name) times a stage and is where the profiling hooks attach
+    """
+
+    def __init__(self) -> None:
+        self.logger = Logger(path="metrics.Metrics")
+        self.counters: Dict[str, Counter] = {}
+        self.timers: Dict[str, Timer] = {}
+        self.gauges: Dict[str, float] = {}
+        self.started = time.time()
+        self.profile_stages = _stages(MetricsConfig.profile)
+        self.tracemalloc_stages = _stages(MetricsConfig.tracemalloc)
+        self.profiling = False  # only one cProfile can be active, nested spans share it
+
+    def counter(self, name: str) -> Counter:
+        if name not in self.counters:
+            self.counters[name] = Counter()
+        return self.counters[name]
+
+    def inc(self, name: str, amount: int = 1) -> None:
+        self.counter(name).inc(amount)
+
+    def timer(self, name: str) -> Timer:
+        if name not in self.timers:
+            self.timers[name] = Timer()
+        return self.timers[name]
+
+    def set_gauge(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def reset(self) -> None:
+        """Zero every metric; objects handed out by counter / timer stay valid."""
+        for counter in self.counters.values():
+            counter.value = 0
+        for timer in self.timers.values():
+            timer.seconds, timer.calls = 0.0, 0
+        self.gauges.clear()
+        self.started = time.time()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time a stage, under cProfile / tracemalloc when enabled for it."""
+        profile = not self.profiling and (
+            name in self.profile_stages or "all" in self.profile_stages
+        )
+        trace = (
+            name in self.tracemalloc_stages or "all" in self.tracemalloc_stages
+        ) and not tracemalloc.is_tracing()
+
+        profiler = cProfile.Profile() if profile else None
+        if trace:
+            tracemalloc.start()
+        if profiler is not None:
+            self.profiling = True
+            profiler.enable()
+
+        try:
+            with self.timer(name).time():
+                yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self.profiling = False
+                self.write_profile(name, profiler)
+            if trace:
+                peak = tracemalloc.get_traced_memory()[1]
+                self.write_allocations(name, tracemalloc.take_snapshot(), peak)
+                tracemalloc.stop()
+
+    def rates(self) -> Dict[str, float]:
+        """counter / seconds of the timer whose name is the longest prefix of the counter's."""
+        rates = {}
+        for name, counter in self.counters.items():
+            parts = name.split(".")
+            for i in range(len(parts) - 1, 0, -1):
+                timer = self.timers.get(".".join(parts[:i]))
+                if timer is not None and timer.seconds > 0:
+                    rates[name + "_per_second"] = counter.value / timer.seconds
+                    break
+        return rates
+
+    def snapshot(self) -> dict:
+        return {
+            "started": self.started,
+            "time": time.time(),
+            "pid": os.getpid(),
+            "counters": {name: c.value for name, c in sorted(self.counters.items())},
+            "timers": {
+                name: {"seconds": t.seconds, "calls": t.calls}
+                for name, t in sorted(self.timers.items())
+            },
+            "gauges": dict(sorted(self.gauges.items())),
+            "rates": dict(sorted(self.rates().items())),
+        }
+
+    def prometheus(self) -> str:
+        """Snapshot in the Prometheus text exposition format (node_exporter textfile)."""
+
+        def metric_name(name: str) -> str:
+            return PROMETHEUS_PREFIX + "".join(c if c.isalnum() else "_" for c in name)
+
+        lines = []
+        for name, counter in sorted(self.counters.items()):
+            base = metric_name(name)
+            lines += [f"# TYPE {base}_total counter", f"{base}_total {counter.value}"]
+        for name, timer in sorted(self.timers.items()):
+            base = metric_name(name)
+            lines += [
+                f"# TYPE {base}_seconds_total counter",
+                f"{base}_seconds_total {timer.seconds:.6f}",
+                f"# TYPE {base}_calls_total counter",
+                f"{base}_calls_total {timer.calls}",
+            ]
+        for name, value in sorted({**self.gauges, **self.rates()}.items()):
+            lines += [f"# TYPE {metric_name(name)} gauge", f"{metric_name(name)} {value:.6g}"]
+        return "\n".join(lines) + "\n"
+
+    def export(self, run_name: str, directory: Optional[str] = MetricsConfig.dir) -> None:
+        """Write {run_name}.metrics.json and {run_name}.prom atomically."""
+        if directory is None:
+            return
+
+        os.makedirs(directory, exist_ok=True)
+        for suffix, content in (
+            (".metrics.json", json.dumps(self.snapshot(), indent=2)),
+            (".prom", self.prometheus()),
+        ):
+            path = os.path.join(directory, run_name + suffix)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(path + ".tmp", path)
+
+    def log_summary(self) -> None:
+        for name, timer in sorted(self.timers.items()):
+            self.logger.log(f"{name}: {timer.seconds:.2f}s over {timer.calls} call(s)")
+        for name, value in sorted(self.rates().items()):
+            self.logger.log(f"{name}: {value:,.1f}")
+        for name, value in sorted(self.gauges.items()):
+            self.logger.log(f"{name}: {value:.6g}")
+
+    def _report_path(self, name: str, suffix: str) -> str:
+        directory = MetricsConfig.dir or "metrics"
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, name + suffix)
+
+    def write_profile(self, name: str, profiler: cProfile.Profile) -> None:
+        """{name}.prof for snakeviz & co, {name}.profile.json with the slowest functions."""
+        profiler.dump_stats(self._report_path(name, ".prof"))
+
+        stats = pstats.Stats(profiler).stats
+        rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)  # by own time
+        report = [
+            {
+                "function": f"{_relative(file)}:{line}({function})",
+                "calls": calls,
+                "tottime": round(tottime, 4),
+                "cumtime": round(cumtime, 4),
+            }
+            for (file, line, function), (_, calls, tottime, cumtime, _) in rows[
+                : MetricsConfig.top_n
+            ]
+        ]
+        path = self._report_path(name, ".profile.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        self.logger.log(f"Profile of {name} written to {path}")
+
+    def write_allocations(self, name: str, snapshot: tracemalloc.Snapshot, peak: int) -> None:
+        """{name}.alloc.json: biggest allocation sites still alive at the end of the span."""
+        top = snapshot.statistics("lineno")[: MetricsConfig.top_n]
+        frames = [stat.traceback[0] for stat in top]
+        report = {
+            "peak_bytes": peak,
+            "top": [
+                {
+                    "location": f"{_relative(frame.filename)}:{frame.lineno}",
+                    "bytes": stat.size,
+                    "blocks": stat.count,
+                }
+                for stat, frame in zip(top, frames)
+            ],
+        }
+        path = self._report_path(name, ".alloc.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        self.logger.log(f"Allocations of {name} written to {path} (peak {peak / 1024**2:.1f} MB)")
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def instrumented_run(name: str, run_name: Optional[str] = None) -> Iterator[Metrics]:
+    """
+    Wrap a stage's entry point: times it as span name, exports snapshots as run_name
+    (default name, periodically if MetricsConfig.interval is set) and logs a summary at the end.
+    """
+    run_name = run_name or name
+    stop = threading.Event()
+    exporter = None
+    if MetricsConfig.dir is not None and MetricsConfig.interval > 0:
+
+        def export_periodically() -> None:
+            while not stop.wait(MetricsConfig.interval):
+                try:
+                    metrics.export(run_name)
+                except Exception as e:  # e.g. a metric added while exporting
+                    metrics.logger.log(f"Periodic metrics export failed: {e}", level="WARNING")
+
+        exporter = threading.Thread(
+            target=export_periodically, name="metrics-export", daemon=True
+        )
+        exporter.start()
+
+    try:
+        with metrics.span(name):
+            yield metrics
+    finally:
+        stop.set()
+        if exporter is not None:
+            exporter.join()
+        metrics.log_summary()
+        metrics.export(run_name)
@@ -0,0 +1,54 @@
+import hashlib
+
+import pytest
+
+from src.data.manifest import file_sha256
+from src.data.process_data import iter_article_batches, iter_articles
+from src.utils.compression import open_text, with_codec
+
+CONTENTS = [
+    "",
+    "one article",
+    "first\n\nsecond\n\nthird",
+    "\n\nleading and trailing\n\n",
+    "odd\n\n\nnewlines\n\n\n\nhere\nand\n\n",
+    "unicode é\n\nü€ text\n\n" * 5,
+]
+
+
+def write(tmp_path, content: str, codec=None):
+    path = with_codec(str(tmp_path / "raw.txt"), codec)
+    with open_text(path, "w") as f:
+        f.write(content)
+    return path
+
+
+@pytest.mark.parametrize("content", CONTENTS)
+@pytest.mark.parametrize("buffer_size", [1, 2, 3, 5, 8192])
+def test_matches_split_across_read_chunks(tmp_path, content: str, buffer_size: int):
+    path = write(tmp_path, content)
+    assert list(iter_articles(path, buffer_size)) == content.split("\n\n")
+
+
+@pytest.mark.parametrize("codec", ["gzip", "bz2", "lzma"])
+def test_compressed_files(tmp_path, codec: str):
+    content = CONTENTS[-1]
+    path = write(tmp_path, content, codec)
+    assert list(iter_articles(path, buffer_size=3)) == content.split("\n\n")
+
+
+def test_batches_keep_every_article_in_order(tmp_path):
+    content = "\n\n".join(f"article {i}" for i in range(25))
+    path = write(tmp_path, content)
+    batches = list(iter_article_batches(path, batch_size=10))
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert [a for batch in batches for a in batch] == content.split("\n\n")
+
+
+@pytest.mark.parametrize("codec", [None, "gzip"])
+def test_digest_of_the_raw_bytes(tmp_path, codec):
+    content = CONTENTS[-1]
+    path = write(tmp_path, content, codec)
+    digest = hashlib.sha256()
+    assert list(iter_articles(path, buffer_size=3, digest=digest)) == content.split("\n\n")
+    assert digest.hexdigest() == file_sha256(path)
@@ -0,0 +1,75 @@
+import math
+
+import pytest
+import torch
+
+from src.arch.attention import Attention
+from src.arch.kv_cache import LayerKVCache
+
+HIDDEN_DIM = 128
+NUM_HEADS = 8
+
+
+def eager_attention(attention: Attention, x: torch.Tensor, cache=None, start_position=0):
+    """Attention.forward with a materialized mask, softmax and repeated key / value heads."""
+    batch_size, sequence_length, hidden_dim = x.shape
+    qkv = attention.qkv(x).view(batch_size, sequence_length, -1, attention.head_dim)
+    q, k, v = qkv.transpose(1, 2).split(
+        [attention.num_heads, attention.num_kv_heads, attention.num_kv_heads], dim=1
+    )
+    q, k = attention.rope(q, k, start_position=start_position)
+    if cache is not None:
+        k, v = cache.update(k, v, start_position)
+
+    group = attention.num_heads // attention.num_kv_heads
+    k = k.repeat_interleave(group, dim=1)
+    v = v.repeat_interleave(group, dim=1)
+    scores = q @ k.transpose(-2, -1) / math.sqrt(attention.head_dim)
+    key_length = k.shape[-2]
+    mask = torch.ones(sequence_length, key_length, dtype=torch.bool).triu(
+        key_length - sequence_length + 1
+    )
+    weights = torch.softmax(scores.masked_fill(mask, float("-inf")), dim=-1)
+    output = (weights @ v).transpose(1, 2).reshape(batch_size, sequence_length, hidden_dim)
+    return attention.out(output)
+
+
+def make_cache(attention: Attention, max_length: int = 256) -> LayerKVCache:
+    return LayerKVCache(1, attention.num_kv_heads, attention.head_dim, max_length)
+
+
+@pytest.fixture(params=[NUM_HEADS, 2, 1], ids=["mha", "gqa", "mqa"])
+def attention(request) -> Attention:
+    torch.manual_seed(0)
+    return Attention(HIDDEN_DIM, NUM_HEADS, request.param, max_sequence_length=256)
+
+
+@torch.no_grad()
+def test_causal_prefill_matches_eager(attention: Attention):
+    x = torch.randn(2, 64, HIDDEN_DIM)
+    torch.testing.assert_close(attention(x), eager_attention(attention, x), atol=1e-5, rtol=1e-4)
+
+
+@torch.no_grad()
+def test_chunk_and_decode_after_cache_match_eager(attention: Attention):
+    x = torch.randn(1, 64, HIDDEN_DIM)
+    cache, reference = make_cache(attention), make_cache(attention)
+    attention(x[:, :48], cache, 0)
+    eager_attention(attention, x[:, :48], reference, 0)
+
+    chunk = attention(x[:, 48:60], cache, 48)
+    torch.testing.assert_close(
+        chunk, eager_attention(attention, x[:, 48:60], reference, 48), atol=1e-5, rtol=1e-4
+    )
+    torch.testing.assert_close(chunk, attention(x[:, :60])[:, 48:], atol=1e-5, rtol=1e-4)
+    torch.testing.assert_close(
+        attention(x[:, 60:61], cache, 60),
+        eager_attention(attention, x[:, 60:61], reference, 60),
+        atol=1e-5,
+        rtol=1e-4,
+    )
+
+
+def test_heads_must_divide():
+    with pytest.raises(ValueError):
+        Attention(HIDDEN_DIM, NUM_HEADS, 3)
@@ -0,0 +1,158 @@
+import os
+import shutil
+
+import pytest
+import torch
+
+from src.training.checkpoint import (
+    STATE_FILE,
+    AsyncCheckpointWriter,
+    CheckpointReader,
+    load_optimizer,
+    optimizer_tensors,
+    save_tensors,
+)
+from src.training.train import latest_checkpoint
+
+
+def sample_tensors() -> dict:
+    torch.manual_seed(0)
+    return {
+        "bf16": torch.randn(100, 7).bfloat16(),
+        "fp32": torch.randn(3000),
+        "int64": torch.arange(5),
+        "bool": torch.tensor(True),
+        "empty": torch.empty(0, 4),
+        "fp16": torch.randn(5).half(),
+    }
+
+
+@pytest.mark.parametrize("max_shard_bytes", [4096, 1 << 30])
+def test_round_trip(tmp_path, max_shard_bytes: int):
+    tensors = sample_tensors()
+    save_tensors(str(tmp_path), tensors, max_shard_bytes=max_shard_bytes)
+    reader = CheckpointReader(str(tmp_path))
+
+    assert sorted(reader.keys()) == sorted(tensors)
+    for name, tensor in tensors.items():
+        loaded = reader[name]
+        assert loaded.dtype == tensor.dtype
+        assert torch.equal(loaded, tensor)
+        if loaded.numel():
+            assert loaded.data_ptr() % loaded.element_size() == 0
+    assert len(set(reader.weight_map.values())) == (3 if max_shard_bytes == 4096 else 1)
+
+
+def test_writes_to_mapped_tensors_stay_private(tmp_path):
+    tensors = sample_tensors()
+    save_tensors(str(tmp_path), tensors)
+    loaded = CheckpointReader(str(tmp_path))["fp32"]
+    loaded += 1
+    assert torch.equal(CheckpointReader(str(tmp_path))["fp32"], tensors["fp32"])
+
+
+def test_assign_loads_mapped_parameters(tmp_path):
+    model = torch.nn.Linear(8, 4)
+    save_tensors(str(tmp_path), model.state_dict())
+    target = torch.nn.Linear(8, 4)
+    target.load_state_dict(CheckpointReader(str(tmp_path)).state_dict(), assign=True)
+    assert torch.equal(target.weight, model.weight)
+
+
+def test_optimizer_round_trip(tmp_path):
+    torch.manual_seed(0)
+    model = torch.nn.Sequential(torch.nn.Linear(8, 8), torch.nn.Linear(8, 2))
+    optimizer = torch.optim.AdamW(model.parameters(), lr=1e-3)
+    model(torch.randn(4, 8)).sum().backward()
+    optimizer.step()
+
+    names = {parameter: name for name, parameter in model.named_parameters()}
+    tensors, state = optimizer_tensors(optimizer, names)
+    save_tensors(str(tmp_path), tensors, prefix="optimizer")
+
+    restored = torch.optim.AdamW(model.parameters(), lr=1.0)
+    load_optimizer(restored, names, CheckpointReader(str(tmp_path), "optimizer"), state)
+    assert restored.param_groups[0]["lr"] == 1e-3
+    for parameter in model.parameters():
+        for key, value in optimizer.state[parameter].items():
+            assert torch.equal(restored.state[parameter][key], value)
+
+
+@pytest.mark.parametrize("background", [True, False])
+def test_async_writer_overwrites_a_step(tmp_path, background: bool):
+    directory = str(tmp_path / "step_00000001")
+    writer = AsyncCheckpointWriter(background=background)
+    writer.save(directory, {"model": {"x": torch.zeros(4)}}, {"step": 1})
+    writer.save(directory, {"model": {"x": torch.ones(4)}}, {"step": 1})
+    writer.wait()
+
+    assert torch.equal(CheckpointReader(directory)["x"], torch.ones(4))
+    assert sorted(os.listdir(tmp_path)) == ["step_00000001"]
+
+
+def test_async_writer_snapshots_before_returning(tmp_path):
+    directory = str(tmp_path / "step_00000001")
+    tensor = torch.zeros(1000)
+    writer = AsyncCheckpointWriter(background=True)
+    writer.save(directory, {"model": {"x": tensor}}, {"step": 1})
+    tensor += 1  # training goes on while the files are written
+    writer.wait()
+    assert torch.equal(CheckpointReader(directory)["x"], torch.zeros(1000))
+
+
+def test_async_writer_reraises_errors(tmp_path):
+    writer = AsyncCheckpointWriter(background=True)
+    writer.save(str(tmp_path / "step"), {"model": {"x": torch.zeros(2, dtype=torch.complex64)}}, {})
+    with pytest.raises(RuntimeError):
+        writer.wait()
+
+
+def test_latest_checkpoint_skips_incomplete_saves(tmp_path):
+    writer = AsyncCheckpointWriter(background=False)
+    writer.save(str(tmp_path / "step_00000010"), {"model": {"x": torch.zeros(2)}}, {"step": 10})
+
+    # Saves that never wrote their state, before or after the rename
+    (tmp_path / "step_00000020.tmp").mkdir()
+    (tmp_path / "step_00000030").mkdir()
+
+    assert latest_checkpoint(str(tmp_path)) == str(tmp_path / "step_00000010")
+    assert latest_checkpoint(str(tmp_path / "missing")) is None
+
+
+def test_latest_checkpoint_prefers_the_live_directory(tmp_path):
+    for name in ["step_00000010", "step_00000010.tmp", "step_00000010.old"]:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / STATE_FILE).write_text("{}")
+    assert latest_checkpoint(str(tmp_path)) == str(tmp_path / "step_00000010")
+
+
+@pytest.mark.parametrize("failing_replace", [1, 2])
+def test_crash_between_renames_falls_back(tmp_path, monkeypatch, failing_replace: int):
+    directory = str(tmp_path / "step_00000010")
+    writer = AsyncCheckpointWriter(background=False)
+    writer.save(directory, {"model": {"x": torch.zeros(4)}}, {"step": 10})
+
+    replace, calls = os.replace, []
+
+    def crashing_replace(source, target):
+        calls.append(source)
+        if len(calls) == failing_replace:
+            raise OSError("crash")
+        replace(source, target)
+
+    monkeypatch.setattr(os, "replace", crashing_replace)
+    with pytest.raises(RuntimeError):
+        writer.save(directory, {"model": {"x": torch.ones(4)}}, {"step": 10})
+    monkeypatch.undo()
+
+    # Crash while moving the old save away: it is still live. Crash after: the new save is
+    # complete in .tmp and used, the old one waits in .old
+    expected = directory if failing_replace == 1 else directory + ".tmp"
+    assert latest_checkpoint(str(tmp_path)) == expected
+    x = CheckpointReader(expected)["x"]
+    assert torch.equal(x, torch.zeros(4) if failing_replace == 1 else torch.ones(4))
+
+    shutil.rmtree(directory + ".tmp")
+    assert latest_checkpoint(str(tmp_path)) == (
+        directory if failing_replace == 1 else directory + ".old"
+    )
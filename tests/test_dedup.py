@@ -0,0 +1,57 @@
+import hashlib
+
+import pytest
+
+from src.data.dedup import DigestIndex
+
+
+def digests(count: int, salt: str = "") -> list:
+    return [hashlib.sha256(f"{salt}{i}".encode()).hexdigest() for i in range(count)]
+
+
+@pytest.mark.parametrize("digest_bits", [64, 128])
+def test_grows_and_keeps_every_digest(digest_bits: int):
+    index = DigestIndex(digest_bits=digest_bits, capacity=4)
+    added = digests(1000)
+
+    assert all(index.add(text_hash) for text_hash in added)
+    assert not any(index.add(text_hash) for text_hash in added)
+    assert len(index) == 1000
+    assert len(index.table) == 2048 and index.count <= index.max_load * len(index.table)
+    assert all(text_hash in index for text_hash in added)
+    assert not any(text_hash in index for text_hash in digests(1000, salt="other"))
+
+
+def test_colliding_slots_are_probed():
+    index = DigestIndex(digest_bits=64, capacity=16)
+    # Same low bits, so every key starts probing from the same slot
+    keys = [f"{(i << 8) | 5:016x}" for i in range(1, 12)]
+    assert all(index.add(key) for key in keys)
+    assert all(key in index for key in keys)
+    assert f"{(99 << 8) | 5:016x}" not in index
+
+
+@pytest.mark.parametrize("digest_bits", [64, 128])
+def test_save_load_round_trip(tmp_path, digest_bits: int):
+    index = DigestIndex(digest_bits=digest_bits, capacity=8)
+    added = digests(300)
+    for text_hash in added:
+        index.add(text_hash)
+
+    path = str(tmp_path / "dedup.idx")
+    index.save(path)
+    loaded = DigestIndex.load(path)
+
+    assert loaded.digest_bits == digest_bits
+    assert len(loaded) == len(index)
+    assert (loaded.table == index.table).all()
+    assert all(text_hash in loaded for text_hash in added)
+    assert loaded.add(digests(1, salt="new")[0])
+    assert not loaded.add(added[0])
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        DigestIndex.load(str(path))
@@ -0,0 +1,89 @@
+import pytest
+import torch
+
+from src.arch.generation import Generator
+from src.arch.kv_cache import PrefixCache
+from src.arch.model import Transformer
+
+VOCAB_SIZE = 100
+
+
+def small_model(max_sequence_length: int = 64, **kwargs) -> Transformer:
+    torch.manual_seed(0)
+    return Transformer(
+        vocab_size=VOCAB_SIZE,
+        hidden_dim=64,
+        num_layers=2,
+        num_heads=4,
+        num_kv_heads=2,
+        ffn_dim=128,
+        max_sequence_length=max_sequence_length,
+        **kwargs,
+    ).eval()
+
+
+@torch.no_grad()
+def greedy_without_cache(model: Transformer, prompt: list, max_new_tokens: int) -> list:
+    sequence = list(prompt)
+    for _ in range(max_new_tokens):
+        logits = model(torch.tensor([sequence]), last_token_only=True)
+        sequence.append(int(logits[0, -1].argmax()))
+    return sequence[len(prompt) :]
+
+
+@torch.no_grad()
+def test_cached_forward_matches_full_pass():
+    model = small_model()
+    input_ids = torch.randint(0, VOCAB_SIZE, (1, 24))
+    full = model(input_ids)
+
+    cache = model.new_cache()
+    chunks = [model(input_ids[:, :10], cache)]  # prefill, then one token at a time
+    chunks += [model(input_ids[:, i : i + 1], cache) for i in range(10, 24)]
+    torch.testing.assert_close(torch.cat(chunks, dim=1), full, rtol=1e-4, atol=1e-4)
+    assert cache.length == 24
+
+
+def test_generation_matches_uncached_decoding():
+    model = small_model()
+    prompt = torch.randint(0, VOCAB_SIZE, (20,)).tolist()
+    assert Generator(model).generate(prompt, max_new_tokens=12) == greedy_without_cache(
+        model, prompt, 12
+    )
+
+
+def test_prefix_cache_reuse_gives_same_tokens():
+    model = small_model()
+    prompt = torch.randint(0, VOCAB_SIZE, (30,)).tolist()
+    follow_up = prompt[:-5] + torch.randint(0, VOCAB_SIZE, (5,)).tolist()
+
+    generator = Generator(model, prefix_cache=PrefixCache())
+    generator.generate(prompt, max_new_tokens=4)
+    tokens = generator.generate(follow_up, max_new_tokens=8)
+    assert generator.stats["reused_tokens"] == 25
+    assert tokens == greedy_without_cache(model, follow_up, 8)
+
+
+@pytest.mark.parametrize("scaling", ["linear", "ntk", "yarn"])
+def test_rope_scaling_extends_the_context(scaling: str):
+    model = small_model(max_sequence_length=32, rope_scaling=scaling, rope_scaling_factor=2.0)
+    assert model.context_length == 64
+    assert all(block.attention.rope.scaling == scaling for block in model.blocks)
+
+    prompt = torch.randint(0, VOCAB_SIZE, (40,)).tolist()
+    assert Generator(model).generate(prompt, max_new_tokens=8) == greedy_without_cache(
+        model, prompt, 8
+    )
+
+
+def test_set_rope_scaling_resizes_the_generator_cache():
+    model = small_model(max_sequence_length=32)
+    generator = Generator(model, prefix_cache=PrefixCache())
+    prompt = torch.randint(0, VOCAB_SIZE, (40,)).tolist()
+    with pytest.raises(ValueError):
+        generator.generate(prompt, max_new_tokens=4)
+
+    model.set_rope_scaling("yarn", 2.0)
+    assert model.rope_scaling == ("yarn", 2.0)
+    assert generator.generate(prompt, max_new_tokens=4) == greedy_without_cache(model, prompt, 4)
+    assert generator.cache.max_length == 64
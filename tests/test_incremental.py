@@ -0,0 +1,101 @@
+import gzip
+import json
+import os
+import random
+
+import pytest
+
+from src.config.config import Paths
+from src.data.manifest import file_sha256
+from src.data.process_data import main
+
+
+def raw_article(rng: random.Random) -> str:
+    return " ".join(f"word{rng.randrange(1000)}" for _ in range(rng.randrange(30, 80)))
+
+
+def write_raw(name: str, seed: int, articles: int = 40) -> None:
+    rng = random.Random(seed)
+    texts = [raw_article(rng) for _ in range(articles)]
+    texts += texts[:3]  # duplicates inside the file
+    with open(os.path.join(Paths.RAW_DATA_DIR, name), "w", encoding="utf-8") as f:
+        f.write("\n\n".join(texts))
+
+
+def shard_bytes() -> dict:
+    return {
+        name: open(os.path.join(Paths.PROCESSED_DATA_DIR, name), "rb").read()
+        for name in sorted(os.listdir(Paths.PROCESSED_DATA_DIR))
+        if name.startswith("shard_")
+    }
+
+
+def manifest_files() -> dict:
+    with open(Paths.MANIFEST_FILE, encoding="utf-8") as f:
+        return json.load(f)["files"]
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(Paths.RAW_DATA_DIR)
+    return tmp_path
+
+
+def test_resume_matches_full_run(data_dir):
+    for i, name in enumerate(["a.txt", "b.txt", "c.txt"]):
+        write_raw(name, seed=i)
+    main(workers=1)
+    full = shard_bytes()
+    assert full
+
+    os.rename(Paths.PROCESSED_DATA_DIR, data_dir / "full")
+    os.rename(os.path.join(Paths.RAW_DATA_DIR, "c.txt"), data_dir / "c.txt")
+    main(workers=1, incremental=True)
+    assert sorted(manifest_files()) == ["a.txt", "b.txt"]
+
+    os.rename(data_dir / "c.txt", os.path.join(Paths.RAW_DATA_DIR, "c.txt"))
+    main(workers=1, incremental=True)
+    assert shard_bytes() == full
+
+    files = manifest_files()
+    assert sorted(files) == ["a.txt", "b.txt", "c.txt"]
+    for name, entry in files.items():
+        assert entry["sha256"] == file_sha256(os.path.join(Paths.RAW_DATA_DIR, name))
+
+
+def test_file_failing_mid_read_is_not_recorded(data_dir):
+    write_raw("a.txt", seed=0)
+    with open(os.path.join(Paths.RAW_DATA_DIR, "b.txt"), "wb") as f:
+        f.write(b"not utf-8 \xff\xfe")
+    main(workers=1, incremental=True)
+    assert sorted(manifest_files()) == ["a.txt"]
+
+    write_raw("b.txt", seed=1)
+    main(workers=1, incremental=True)
+    assert sorted(manifest_files()) == ["a.txt", "b.txt"]
+
+
+def test_codec_change_starts_over(data_dir):
+    write_raw("a.txt", seed=0)
+    main(workers=1)
+    plain = shard_bytes()
+    assert sorted(plain) == ["shard_0000.idx", "shard_0000.txt"]
+
+    main(workers=1, incremental=True, compression="gzip")
+    compressed = shard_bytes()
+    assert sorted(compressed) == ["shard_0000.idx", "shard_0000.txt.gz"]
+    assert compressed["shard_0000.idx"] == plain["shard_0000.idx"]
+    assert gzip.decompress(compressed["shard_0000.txt.gz"]) == plain["shard_0000.txt"]
+    with open(Paths.MANIFEST_FILE, encoding="utf-8") as f:
+        assert json.load(f)["compression"] == "gzip"
+
+
+def test_fresh_run_removes_every_old_shard(data_dir):
+    os.makedirs(Paths.PROCESSED_DATA_DIR)
+    for name in ["shard_0000.txt.bz2", "shard_0005.txt", "shard_0005.idx"]:
+        with open(os.path.join(Paths.PROCESSED_DATA_DIR, name), "wb") as f:
+            f.write(b"stale")
+    write_raw("a.txt", seed=0)
+    main(workers=1)
+    assert sorted(shard_bytes()) == ["shard_0000.idx", "shard_0000.txt"]
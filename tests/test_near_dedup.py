@@ -0,0 +1,65 @@
+import random
+
+import numpy as np
+import pytest
+
+from src.data.near_dedup import MinHasher, NearDuplicateFilter, band_keys_batch
+
+
+def article(seed: int, words: int = 300) -> str:
+    rng = random.Random(seed)
+    return " ".join(f"word{rng.randrange(5000)}" for _ in range(words))
+
+
+def edited(text: str, every: int = 100) -> str:
+    words = text.split()
+    return " ".join("edited" if i % every == 0 else word for i, word in enumerate(words))
+
+
+@pytest.fixture(scope="module")
+def hasher() -> MinHasher:
+    return MinHasher()
+
+
+def test_band_keys_are_batch_independent(hasher: MinHasher):
+    texts = [article(0), "too short", article(1)]
+    keys = hasher.band_keys(texts)
+    assert keys.shape == (3, hasher.bands)
+    assert not keys[1].any()
+    for i, text in enumerate(texts):
+        assert np.array_equal(hasher.band_keys([text])[0], keys[i])
+
+
+def test_catches_near_duplicate_and_passes_distinct(hasher: MinHasher):
+    near_dedup = NearDuplicateFilter(hasher)
+    original = article(0)
+
+    assert near_dedup.add(text=original)
+    assert not near_dedup.add(text=edited(original))
+    assert near_dedup.add(text=article(1))
+    assert near_dedup.add(text="too short")
+    assert near_dedup.add(text="too short")  # unhashable texts are never dropped
+    assert (near_dedup.checked, near_dedup.dropped, near_dedup.hashed_inline) == (5, 1, 5)
+    assert near_dedup.hash_seconds > 0 and near_dedup.lookup_seconds > 0
+
+
+def test_worker_keys_count_their_hashing_time(hasher: MinHasher):
+    near_dedup = NearDuplicateFilter(hasher)
+    original = article(0)
+    articles, keys, hash_seconds = band_keys_batch([original, edited(original)], hasher)
+    near_dedup.record_hashing(hash_seconds)
+
+    assert [near_dedup.add(band_keys) for band_keys in keys] == [True, False]
+    assert near_dedup.hashed_inline == 0
+    assert near_dedup.hash_seconds == hash_seconds > 0
+
+
+def test_save_load_keeps_seen_articles(tmp_path, hasher: MinHasher):
+    near_dedup = NearDuplicateFilter(hasher)
+    near_dedup.add(text=article(0))
+    near_dedup.save(str(tmp_path / "near_dedup.idx"))
+
+    restored = NearDuplicateFilter(hasher)
+    restored.load(str(tmp_path / "near_dedup.idx"))
+    assert not restored.add(text=edited(article(0)))
+    assert restored.params() == near_dedup.params()
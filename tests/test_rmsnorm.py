@@ -0,0 +1,63 @@
+import pytest
+import torch
+
+from src.arch.layers import NORM_IMPLS, RMSNorm, RMSNormFunction, rms_norm_, rms_norm_reference
+
+EPSILON = 1e-6
+
+
+def test_custom_backward_gradcheck():
+    x = torch.randn(3, 5, 16, dtype=torch.float64, requires_grad=True)
+    weight = torch.randn(16, dtype=torch.float64, requires_grad=True)
+    assert torch.autograd.gradcheck(
+        lambda x, w: RMSNormFunction.apply(x, w, EPSILON), (x, weight)
+    )
+
+
+@pytest.mark.parametrize("impl", NORM_IMPLS)
+@pytest.mark.parametrize("hidden_dim", [64, 1024])
+def test_matches_reference(impl: str, hidden_dim: int):
+    torch.manual_seed(0)
+    weight = torch.rand(hidden_dim) + 0.5
+    x = torch.randn(4, 32, hidden_dim) * 3
+    grad_output = torch.randn_like(x)
+
+    reference_weight = weight.clone().requires_grad_(True)
+    reference_x = x.clone().requires_grad_(True)
+    expected = rms_norm_reference(reference_x, reference_weight, EPSILON)
+    expected.backward(grad_output)
+
+    norm = RMSNorm(hidden_dim, EPSILON, impl=impl)
+    norm.weight.data.copy_(weight)
+    xi = x.clone().requires_grad_(True)
+    output = norm(xi)
+    output.backward(grad_output)
+
+    torch.testing.assert_close(output, expected.detach(), rtol=1e-4, atol=1e-4)
+    torch.testing.assert_close(xi.grad, reference_x.grad, rtol=1e-4, atol=1e-4)
+    torch.testing.assert_close(norm.weight.grad, reference_weight.grad, rtol=1e-4, atol=1e-4)
+
+
+@pytest.mark.parametrize("hidden_dim", [64, 1024])
+def test_in_place_matches_reference(hidden_dim: int):
+    torch.manual_seed(0)
+    weight = torch.rand(hidden_dim) + 0.5
+    x = torch.randn(4, 32, hidden_dim) * 3
+    expected = rms_norm_reference(x, weight, EPSILON)
+
+    inplace = x.clone()
+    result = rms_norm_(inplace, weight, EPSILON)
+    assert result.data_ptr() == inplace.data_ptr()
+    torch.testing.assert_close(inplace, expected, rtol=1e-4, atol=1e-4)
+
+
+def test_bfloat16_keeps_dtype():
+    norm = RMSNorm(64, EPSILON, impl="autograd")
+    x = torch.randn(2, 8, 64, dtype=torch.bfloat16, requires_grad=True)
+    output = norm(x)
+    output.sum().backward()
+    assert output.dtype == torch.bfloat16
+    assert x.grad.dtype == torch.bfloat16
+    torch.testing.assert_close(
+        output.float(), rms_norm_reference(x.float(), norm.weight, EPSILON), rtol=2e-2, atol=2e-2
+    )
@@ -0,0 +1,52 @@
+import pytest
+import torch
+
+from src.arch.positionel_embedding import RoPE
+
+
+def rope_reference(x: torch.Tensor, start_position: int, base: float) -> torch.Tensor:
+    """Complex rotation of the pairs (i, i + d / 2) by position * theta_i, in float64."""
+    half = x.shape[-1] // 2
+    theta = 1.0 / base ** (torch.arange(0, 2 * half, 2, dtype=torch.float64) / (2 * half))
+    positions = torch.arange(start_position, start_position + x.shape[-2], dtype=torch.float64)
+    angles = torch.outer(positions, theta)
+    rotation = torch.polar(torch.ones_like(angles), angles)
+    pairs = torch.complex(x[..., :half].double(), x[..., half:].double()) * rotation
+    return torch.cat((pairs.real, pairs.imag), dim=-1).to(x.dtype)
+
+
+@pytest.mark.parametrize("head_dim", [64, 128])
+@pytest.mark.parametrize("start_position", [0, 37])
+def test_matches_complex_rotation(head_dim: int, start_position: int):
+    rope = RoPE(head_dim, max_sequence_length=512, base=10000.0, scaling=None)
+    q = torch.randn(2, 4, 100, head_dim)
+    k = torch.randn(2, 4, 100, head_dim)
+    rotated_q, rotated_k = rope(q, k, start_position=start_position)
+    torch.testing.assert_close(rotated_q, rope_reference(q, start_position, 10000.0))
+    torch.testing.assert_close(rotated_k, rope_reference(k, start_position, 10000.0))
+
+
+def test_offset_chunks_match_full_sequence():
+    """Rotating positions in pieces (decoding) gives the same result as all at once."""
+    rope = RoPE(64, max_sequence_length=256, base=10000.0, scaling=None)
+    q = torch.randn(1, 2, 200, 64)
+    full, _ = rope(q, q)
+    pieces = [
+        rope(q[:, :, s : s + 50], q[:, :, s : s + 50], start_position=s)[0]
+        for s in range(0, 200, 50)
+    ]
+    torch.testing.assert_close(torch.cat(pieces, dim=-2), full)
+
+
+def test_bfloat16_keeps_dtype():
+    rope = RoPE(64, max_sequence_length=64, base=10000.0, scaling=None)
+    q = torch.randn(1, 2, 16, 64, dtype=torch.bfloat16)
+    rotated, _ = rope(q, q)
+    assert rotated.dtype == torch.bfloat16
+
+
+def test_position_beyond_context_raises():
+    rope = RoPE(64, max_sequence_length=32, base=10000.0, scaling=None)
+    q = torch.randn(1, 1, 8, 64)
+    with pytest.raises(ValueError):
+        rope(q, q, start_position=30)
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.data.process_data import StreamingShardWriter, iter_articles
+from src.data.shard_index import (
+    ProcessedShard,
+    get_processed_shards,
+    index_path,
+    partition,
+    partition_shards,
+)
+
+ARTICLES = [f"article {i} " + "é" * i for i in range(20)]
+
+
+def write_shards(output_dir, compression=None, shard_size=1 << 20) -> list:
+    with StreamingShardWriter(
+        shard_size=shard_size, output_dir=str(output_dir), compression=compression
+    ) as writer:
+        for article in ARTICLES:
+            writer.add_text(article)
+    return writer.written_paths
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+@pytest.mark.parametrize("indexed", [True, False])
+def test_article_reads_by_index(tmp_path, compression, indexed: bool):
+    (shard_path,) = write_shards(tmp_path, compression)
+    if not indexed:
+        os.remove(index_path(shard_path))
+
+    shard = ProcessedShard(shard_path)
+    assert len(shard) == len(ARTICLES)
+    assert shard.num_bytes() == sum(len(article.encode("utf-8")) for article in ARTICLES)
+    for i in [5, 0, 19, -1, 3]:
+        assert shard.article(i) == ARTICLES[i]
+    assert list(shard.articles(4, 9)) == ARTICLES[4:9]
+    assert list(shard.articles()) == ARTICLES
+    with pytest.raises(IndexError):
+        shard.article(len(ARTICLES))
+    shard.close()
+
+
+@pytest.mark.parametrize("parts", [1, 2, 3, 7, 30])
+def test_partition_covers_every_article_in_balanced_ranges(parts: int):
+    lengths = np.random.default_rng(0).integers(1, 100, 50)
+    ranges = partition(lengths, parts)
+
+    assert len(ranges) == parts
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(lengths)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+    if parts <= 7:
+        sizes = [int(lengths[start:end].sum()) for start, end in ranges]
+        assert max(sizes) - min(sizes) <= 2 * lengths.max()
+
+
+def test_partition_of_nothing():
+    assert partition(np.empty(0, dtype=np.uint64), 3) == [(0, 0)] * 3
+    with pytest.raises(ValueError):
+        partition(np.ones(3), 0)
+
+
+@pytest.mark.parametrize("parts", [1, 4, 9])
+def test_partition_shards_reads_every_article_once_in_order(tmp_path, parts: int):
+    shard_paths = write_shards(tmp_path, shard_size=60)
+    shards = get_processed_shards(str(tmp_path))
+    assert len(shards) == len(shard_paths) > 2
+
+    read = [
+        article
+        for part in partition_shards(shards, parts)
+        for i, start, end in part
+        for article in shards[i].articles(start, end)
+    ]
+    assert read == [a for path in shard_paths for a in iter_articles(path)] == ARTICLES
@@ -0,0 +1,64 @@
+import pickle
+import random
+import re
+
+import pytest
+
+from src.data.process_data import clean_text
+from src.data.text_cleaner import CleaningRule, TextCleaner
+
+
+def clean_text_regex(text: str) -> str:
+    """clean_text before the rule engine: three re.sub passes."""
+    text = re.sub(r"<[^>]+>", "", text)
+    text = re.sub(r"\[\[.*?\]\]", "", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+def fuzz_strings(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    alphabet = ["<", ">", "[", "]", "[[", "]]", "\n", " ", "\t", "a", "b", "é", "\xa0", "\x1c"]
+    return ["".join(rng.choices(alphabet, k=rng.randint(0, 40))) for _ in range(count)]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "   ",
+        "plain text",
+        "a <ref>cite</ref> b [[Category:Foo]] c",
+        "<b>[[</b>x]] [[unclosed <br /> tail",
+        "<[[a]]>",
+        "multi\nline\t\xa0 text with\x1cseparators  ",
+        "[[File:x.png|thumb|<i>caption</i>]] kept",
+    ],
+)
+def test_matches_regex_chain(text: str):
+    assert clean_text(text) == clean_text_regex(text)
+
+
+def test_matches_regex_chain_on_fuzz_strings():
+    for text in fuzz_strings(20000):
+        assert clean_text(text) == clean_text_regex(text), repr(text)
+
+
+def test_fused_group_sees_its_own_backreferences():
+    cleaner = TextCleaner(
+        [
+            CleaningRule(r"(\w+)@", r"\1 at ", trigger="@", group="symbols"),
+            CleaningRule(r"#(\d+)", lambda m: f"number {m.group(1)}", trigger="#", group="symbols"),
+        ]
+    )
+    assert len(cleaner.passes) == 1
+    assert cleaner("mail me@ host  #42") == "mail me at host number 42"
+    assert cleaner("nothing to do") == "nothing to do"
+
+
+def test_rules_run_in_order_and_survive_pickling():
+    cleaner = TextCleaner([CleaningRule("a", "b"), CleaningRule("b", "c")], False).extend(
+        [CleaningRule(" ", "_", trigger=" ")]
+    )
+    restored = pickle.loads(pickle.dumps(cleaner))
+    assert cleaner("ab  ab") == restored("ab  ab") == "cc__cc"
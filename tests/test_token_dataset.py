@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+import torch
+
+from src.data.token_dataset import PackedSampler, PackedTokenDataset, rank_shards
+from src.tokenization.token_shards import TokenShardWriter, token_shard_paths
+
+SHARD_TOKENS = [100, 7, 150]
+
+
+@pytest.fixture
+def dataset(tmp_path) -> PackedTokenDataset:
+    paths = []
+    start = 0
+    for index, count in enumerate(SHARD_TOKENS):
+        writer = TokenShardWriter(index, 1000, str(tmp_path))
+        writer.append(np.arange(start, start + count, dtype=np.uint16), [count])
+        writer.close()
+        paths.append(token_shard_paths(index, str(tmp_path))[0])
+        start += count
+    return PackedTokenDataset(paths, sequence_length=16)
+
+
+def test_windows_pack_every_shard(dataset: PackedTokenDataset):
+    assert len(dataset) == (sum(SHARD_TOKENS) - 1) // 16
+    for index in range(len(dataset)):
+        inputs, targets = dataset[index]
+        expected = torch.arange(index * 16, index * 16 + 17)
+        assert torch.equal(inputs.long(), expected[:-1])
+        assert torch.equal(targets.long(), expected[1:])
+    with pytest.raises(IndexError):
+        dataset[len(dataset)]
+
+
+def test_same_seed_and_epoch_same_order(dataset: PackedTokenDataset):
+    first, second = PackedSampler(dataset, seed=1), PackedSampler(dataset, seed=1)
+    assert list(first) == list(second)
+    assert sorted(first) == list(range(len(dataset)))
+
+    second.set_epoch(1)
+    assert list(first) != list(second)
+    assert list(PackedSampler(dataset, seed=2)) != list(first)
+
+
+def test_start_index_resumes_mid_epoch(dataset: PackedTokenDataset):
+    sampler = PackedSampler(dataset, seed=1)
+    sampler.set_epoch(3)
+    order = list(sampler)
+
+    resumed = PackedSampler(dataset, seed=1)
+    resumed.load_state_dict(sampler.state_dict(samples_consumed=5))
+    assert list(resumed) == order[5:]
+    assert len(resumed) == len(order) - 5
+
+    resumed.set_epoch(4)
+    assert len(list(resumed)) == len(order)
+
+
+@pytest.mark.parametrize("shuffle", [True, False])
+def test_ranks_split_an_epoch(dataset: PackedTokenDataset, shuffle: bool):
+    world_size = 3
+    samplers = [
+        PackedSampler(dataset, shuffle=shuffle, seed=1, rank=rank, world_size=world_size)
+        for rank in range(world_size)
+    ]
+    orders = [list(sampler) for sampler in samplers]
+
+    assert len({len(order) for order in orders}) == 1
+    assert len(orders[0]) == len(dataset) // world_size
+    seen = [index for order in orders for index in order]
+    assert len(set(seen)) == len(seen)
+
+    with pytest.raises(ValueError):
+        PackedSampler(dataset, rank=world_size, world_size=world_size)
+
+
+def test_num_samples_caps_each_rank(dataset: PackedTokenDataset):
+    sampler = PackedSampler(dataset, seed=1, rank=0, world_size=2, num_samples=3)
+    assert len(list(sampler)) == len(sampler) == 3
+
+
+def write_sized_files(directory, sizes: list) -> list:
+    paths = []
+    for i, size in enumerate(sizes):
+        path = directory / f"tokens_{i:04d}.bin"
+        path.write_bytes(bytes(size))
+        paths.append(str(path))
+    return paths
+
+
+@pytest.mark.parametrize("world_size", [1, 2, 3, 4])
+def test_rank_shards_split_is_balanced_and_deterministic(tmp_path, world_size: int):
+    sizes = [900, 100, 500, 500, 300, 300, 200, 700, 100, 400]
+    paths = write_sized_files(tmp_path, sizes)
+    size_of = dict(zip(paths, sizes))
+
+    splits = [rank_shards(paths, rank, world_size) for rank in range(world_size)]
+    assert splits == [rank_shards(paths[::-1], rank, world_size) for rank in range(world_size)]
+    assert sorted(path for split in splits for path in split) == sorted(paths)
+
+    loads = [sum(size_of[path] for path in split) for split in splits]
+    assert max(loads) - min(loads) <= max(sizes)
+    if world_size == 2:
+        assert loads == [2000, 2000]
+
+
+def test_rank_shards_needs_a_shard_per_rank(tmp_path):
+    paths = write_sized_files(tmp_path, [10, 20])
+    with pytest.raises(ValueError):
+        rank_shards(paths, 0, 3)
@@ -0,0 +1,117 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+from src.config.config import TokenShardConfig
+from src.data.process_data import StreamingShardWriter, iter_articles
+from src.tokenization.token_shards import (
+    TokenShard,
+    TokenShardWriter,
+    get_token_shards,
+    token_shard_paths,
+    tokenize_shards,
+)
+from src.tokenization.tokenizing import BPETokenizer
+
+VOCAB_SIZE = 300
+
+
+def test_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    documents = [rng.integers(0, VOCAB_SIZE, size, dtype=np.uint16) for size in [5, 0, 17, 1]]
+
+    writer = TokenShardWriter(3, VOCAB_SIZE, str(tmp_path))
+    writer.append(np.concatenate(documents[:2]), [len(d) for d in documents[:2]])
+    writer.append(np.concatenate(documents[2:]), [len(d) for d in documents[2:]])
+    writer.close()
+
+    bin_path, _ = token_shard_paths(3, str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ["tokens_0003.bin", "tokens_0003.idx"]
+    shard = TokenShard(bin_path)
+    assert (shard.vocab_size, shard.num_docs, len(shard)) == (VOCAB_SIZE, 4, 23)
+    for i, document in enumerate(documents):
+        assert np.array_equal(shard.document(i), document)
+
+
+def test_empty_shard(tmp_path):
+    writer = TokenShardWriter(0, VOCAB_SIZE, str(tmp_path))
+    writer.close()
+    shard = TokenShard(token_shard_paths(0, str(tmp_path))[0])
+    assert (shard.num_docs, len(shard)) == (0, 0)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "tokens_0000.bin"
+    path.write_bytes(bytes(64))
+    with pytest.raises(ValueError):
+        TokenShard(str(path))
+
+
+@pytest.fixture
+def tokenizer_path(tmp_path, monkeypatch) -> str:
+    monkeypatch.chdir(tmp_path)
+    rng = random.Random(0)
+    corpus = tmp_path / "corpus.txt"
+    corpus.write_text(
+        "\n\n".join(
+            " ".join(rng.choice(["alpha", "beta", "gamma", "delta"]) for _ in range(20))
+            for _ in range(50)
+        )
+    )
+    tokenizer = BPETokenizer()
+    tokenizer.train(str(corpus), vocab_size=VOCAB_SIZE)
+    return tokenizer.save(str(tmp_path / "tokenizer.json"))
+
+
+def test_tokenize_shards_skips_empty_shards_and_stale_shards(tmp_path, tokenizer_path):
+    input_dir, output_dir = tmp_path / "processed", tmp_path / "tokens"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    (input_dir / "shard_0000.txt").write_text("alpha beta\n\ngamma delta")
+    (input_dir / "shard_0001.txt").write_text("")
+
+    for index in (1, 2):  # left over by an earlier run with more shards
+        writer = TokenShardWriter(index, VOCAB_SIZE, str(output_dir))
+        writer.append(np.arange(4, dtype=np.uint16), [4])
+        writer.close()
+
+    total = tokenize_shards(1, tokenizer_path, str(input_dir), str(output_dir))
+
+    assert sorted(os.listdir(output_dir)) == ["tokens_0000.bin", "tokens_0000.idx"]
+    shard = TokenShard(str(output_dir / "tokens_0000.bin"))
+    assert shard.num_docs == 2 and total == len(shard)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_tokenize_shards_matches_encoding_every_article(
+    tmp_path, monkeypatch, tokenizer_path, workers: int
+):
+    input_dir, output_dir = tmp_path / "processed", tmp_path / "tokens"
+    rng = random.Random(1)
+    articles = [
+        " ".join(rng.choice(["alpha", "beta", "gamma"]) for _ in range(rng.randrange(1, 30)))
+        for _ in range(40)
+    ]
+    with StreamingShardWriter(
+        shard_size=300, output_dir=str(input_dir), compression="gzip"
+    ) as writer:
+        for i, article in enumerate(articles):
+            writer.add_text(f"{i} {article}")
+    shard_paths = writer.written_paths
+
+    monkeypatch.setattr(TokenShardConfig, "batch_size", 4)  # parts spanning two shards
+    tokenize_shards(workers, tokenizer_path, str(input_dir), str(output_dir))
+
+    tokenizer = BPETokenizer()
+    tokenizer.load(tokenizer_path)
+    tokenizer.tokenizer.no_truncation()
+    paths = get_token_shards(str(output_dir))
+    assert len(paths) == len(shard_paths) > 1
+    for shard_path, bin_path in zip(shard_paths, paths):
+        expected = tokenizer.encode_batch(list(iter_articles(shard_path)))
+        shard = TokenShard(bin_path)
+        assert [shard.document(i).tolist() for i in range(shard.num_docs)] == [
+            list(ids) for ids in expected
+        ]
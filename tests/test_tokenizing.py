@@ -0,0 +1,50 @@
+import os
+import random
+
+import pytest
+
+from src.data.process_data import StreamingShardWriter, iter_articles
+from src.data.shard_index import index_path
+from src.tokenization.tokenizing import BPETokenizer
+
+
+def reference_sample(files, sample_bytes: int, seed: int) -> list:
+    """Per-article sampling straight from the raw shards, the way iter_sample picks."""
+    articles = {f: [a for a in iter_articles(f) if a] for f in files}
+    total = sum(len(a.encode("utf-8")) for f in files for a in articles[f])
+    keep = min(1.0, sample_bytes / total)
+
+    sample, taken = [], 0
+    for f in files:
+        rng = random.Random(f"{seed}:{os.path.basename(f)}")
+        for article in articles[f]:
+            if rng.random() >= keep:
+                continue
+            sample.append(article)
+            taken += len(article.encode("utf-8"))
+            if taken >= sample_bytes:
+                return sample
+    return sample
+
+
+@pytest.fixture
+def shard_paths(tmp_path, monkeypatch) -> list:
+    monkeypatch.chdir(tmp_path)
+    rng = random.Random(0)
+    paths = []
+    for compression in (None, "gzip"):
+        with StreamingShardWriter(
+            shard_size=2000, output_dir=str(tmp_path / str(compression)), compression=compression
+        ) as writer:
+            for i in range(100):
+                writer.add_text(f"{i} " + "word " * rng.randrange(5, 40))
+        paths += writer.written_paths
+    os.remove(index_path(paths[0]))  # scanned instead
+    return paths
+
+
+@pytest.mark.parametrize("sample_bytes", [500, 5000, 1 << 30])
+def test_sample_keeps_the_same_articles(shard_paths, sample_bytes: int):
+    sample = list(BPETokenizer().iter_sample(shard_paths, sample_bytes, seed=3))
+    assert sample == reference_sample(shard_paths, sample_bytes, seed=3)
+    assert sample